@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Read image files, run them through a chain of imaq operations and write
+the results, on a pool of worker processes.
+
+Each --op is a Python expression evaluated in the nivision namespace with
+img bound to the current image; if it returns an Image, that becomes the
+current image.  --chain module:function calls function(img) the same way.
+For example, to threshold and dilate every PNG in a directory::
+
+    batchproc.py -o out --type U8 \\
+        --op "imaqThreshold(img, img, 128, 255, 1, 255)" \\
+        --op "imaqMorphology(img, img, IMAQ_DILATE, None)" archive/*.png
+"""
+import argparse
+import concurrent.futures
+import glob
+import importlib
+import os
+import sys
+import time
+import nivision
+
+extensions = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".aipd")
+
+# per worker process state, set up by init()
+_namespace = None
+_ops = None
+_chain = None
+_image = None
+_quality = None
+
+def init(ops, chain, imagetype, quality):
+    global _namespace, _ops, _chain, _image, _quality
+    # the generated wrappers aren't in vars(nivision) until they're bound
+    _namespace = {name: getattr(nivision, name) for name in nivision.__all__}
+    _ops = [compile(op, "--op", "eval") for op in ops]
+    if chain:
+        module, sep, func = chain.partition(":")
+        _chain = getattr(importlib.import_module(module), func or "process")
+    _image = nivision.imaqCreateImage(getattr(nivision, "IMAQ_IMAGE_" + imagetype))
+    _quality = quality
+
+def output_path(relpath, outdir, format):
+    """Output file for an input at relpath (relative to its input root)."""
+    base, ext = os.path.splitext(relpath)
+    return os.path.join(outdir, base + (format or ext))
+
+def plan_outputs(files, outdir, format):
+    """Return the output paths for (path, relpath) pairs from find_files().
+    Raises ValueError if two inputs would be written to the same file."""
+    outputs = {}
+    for path, relpath in files:
+        output = os.path.normcase(os.path.normpath(
+                output_path(relpath, outdir, format)))
+        if output in outputs:
+            raise ValueError("%s and %s would both be written to %s" %
+                             (outputs[output], path, output))
+        outputs[output] = path
+    return [output_path(relpath, outdir, format) for path, relpath in files]
+
+def write(image, path, quality):
+    ext = os.path.splitext(path)[1].lower()
+    filename = path.encode("utf-8")
+    if ext in (".jpg", ".jpeg"):
+        nivision.imaqWriteJPEGFile(image, filename, quality, None)
+    elif ext == ".png":
+        nivision.imaqWritePNGFile2(image, filename, quality, None, 0)
+    else:
+        nivision.imaqWriteFile(image, filename, None)
+
+def process(path, output):
+    """Process one file; returns (path, error message or None)."""
+    try:
+        img = _image
+        nivision.imaqReadFile(img, path.encode("utf-8"))
+        for op in _ops:
+            rv = eval(op, _namespace, {"img": img})
+            if isinstance(rv, nivision.Image):
+                img = rv
+        if _chain is not None:
+            rv = _chain(img)
+            if isinstance(rv, nivision.Image):
+                img = rv
+        write(img, output, _quality)
+    except Exception as e:
+        return path, "%s: %s" % (e.__class__.__name__, e)
+    return path, None
+
+def find_files(inputs):
+    """Expand directories and globs to a sorted list of image files, as
+    (path, path relative to the input root) pairs.  Files found in a
+    directory keep their path below it; other files are relative to their
+    own directory."""
+    files = {}
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for root, dirs, names in os.walk(pattern):
+                for name in names:
+                    if name.lower().endswith(extensions):
+                        path = os.path.join(root, name)
+                        files[path] = os.path.relpath(path, pattern)
+        else:
+            for path in glob.glob(pattern) or [pattern]:
+                files.setdefault(path, os.path.basename(path))
+    return sorted(files.items())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+",
+                        help="image files, directories or globs")
+    parser.add_argument("-o", "--outdir", required=True,
+                        help="directory to write the results to")
+    parser.add_argument("-f", "--format",
+                        help="output file extension (default: same as input)")
+    parser.add_argument("--type", default="RGB",
+                        choices=["U8", "U16", "I16", "SGL", "RGB", "HSL",
+                                 "RGB_U64"],
+                        help="image type to read files as (default: RGB)")
+    parser.add_argument("--op", action="append", default=[],
+                        help="imaq operation expression on img (repeatable)")
+    parser.add_argument("--chain", help="module:function to call on img")
+    parser.add_argument("--quality", type=int, default=750,
+                        help="JPEG quality or PNG compression speed (0-1000)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of worker processes")
+    args = parser.parse_args(argv)
+    if args.format and not args.format.startswith("."):
+        args.format = "." + args.format
+
+    files = find_files(args.inputs)
+    if not files:
+        print("No input files", file=sys.stderr)
+        return 1
+    try:
+        outputs = plan_outputs(files, args.outdir, args.format)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    for dirname in set(os.path.dirname(output) for output in outputs):
+        os.makedirs(dirname, exist_ok=True)
+    paths = [path for path, relpath in files]
+
+    failed = []
+    start = last = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(args.jobs, initializer=init,
+            initargs=(args.op, args.chain, args.type, args.quality)) \
+            as executor:
+        chunksize = max(1, min(64, len(files) // (args.jobs*4)))
+        for n, (path, error) in enumerate(executor.map(process, paths,
+                outputs, chunksize=chunksize), 1):
+            if error is not None:
+                failed.append((path, error))
+            now = time.perf_counter()
+            if now - last >= 1.0 or n == len(files):
+                last = now
+                print("\r%d/%d files, %.1f files/s" % (n, len(files),
+                      n / (now - start)), end="", file=sys.stderr, flush=True)
+    elapsed = time.perf_counter() - start
+    print(file=sys.stderr)
+    for path, error in failed:
+        print("%s: %s" % (path, error), file=sys.stderr)
+    print("Processed %d files (%d failed) in %.1f s, %.1f files/s" %
+          (len(files), len(failed), elapsed, len(files) / elapsed))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
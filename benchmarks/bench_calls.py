@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Measure the per-call overhead of cheap wrapped functions with the default
+(ctypes paramflags/errcheck) and direct ("gen_wrap.py --direct") wrappers,
+against stub NI libraries built by stublib.py.
+
+Usage: bench_calls.py <path to nivision.h and NIIMAQdx.h> [calls]"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import stublib
+from bench_import import generate
+
+# (label, setup, statement)
+CALLS = [
+    ("imaqGetImageSize", "", "nivision.imaqGetImageSize(img)"),
+    ("imaqGetImageType", "", "nivision.imaqGetImageType(img)"),
+    ("imaqGetPixel", "pt = nivision.Point(0, 0)",
+        "nivision.imaqGetPixel(img, pt)"),
+    ("imaqSetImageSize", "", "nivision.imaqSetImageSize(img, 640, 480)"),
+]
+
+def time_calls(pkgdir, libdir, calls):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = pkgdir
+    env["LD_LIBRARY_PATH"] = os.pathsep.join(
+            [libdir, env.get("LD_LIBRARY_PATH", "")])
+    results = {}
+    for label, setup, stmt in CALLS:
+        code = ("import timeit, nivision; img = nivision.Image(); %s; "
+                "print(min(timeit.repeat(%r, number=%d, repeat=5, "
+                "globals=globals())) / %d)" % (setup or "pass", stmt, calls,
+                calls))
+        out = subprocess.check_output([sys.executable, "-c", code], env=env)
+        results[label] = float(out)
+    return results
+
+def main(hdrpath, calls):
+    tmpdir = tempfile.mkdtemp(prefix="nivision_bench_")
+    try:
+        libdir = os.path.join(tmpdir, "lib")
+        stublib.build(hdrpath, libdir)
+        results = {}
+        for mode in ("default", "direct"):
+            pkgdir = os.path.join(tmpdir, mode)
+            generate(hdrpath, pkgdir, True, mode == "direct")
+            results[mode] = time_calls(pkgdir, libdir, calls)
+        print("%-20s %12s %12s %8s" % ("", "default", "direct", "speedup"))
+        for label, setup, stmt in CALLS:
+            default = results["default"][label]
+            direct = results["direct"][label]
+            print("%-20s %9.3f us %9.3f us %7.1fx" % (label, default*1e6,
+                    direct*1e6, default/direct))
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("Usage: bench_calls.py <path to nivision.h and NIIMAQdx.h> [calls]")
+        sys.exit(1)
+    main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) == 3 else 100000)
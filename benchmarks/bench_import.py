@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Measure the time taken to import nivision with lazily and eagerly bound
+wrappers, against stub NI libraries built by stublib.py.
+
+Usage: bench_import.py <path to nivision.h and NIIMAQdx.h> [runs]"""
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+import stublib
+
+topdir = stublib.topdir
+
+def generate(hdrpath, outdir, lazy, direct=False):
+    """Generate a nivision package with core.py into outdir."""
+    pkgdir = os.path.join(outdir, "nivision")
+    shutil.copytree(os.path.join(topdir, "nivision"), pkgdir,
+            ignore=shutil.ignore_patterns("core.py", "__pycache__"))
+    code = ("import gen_wrap; "
+            "gen_wrap.generate(%r, %r, %r, lazy=%r, direct=%r)") % (
+            topdir + os.sep, pkgdir,
+            [(os.path.join(hdrpath, "nivision.h"),
+              os.path.join(topdir, "nivision_2011.ini")),
+             (os.path.join(hdrpath, "NIIMAQdx.h"),
+              os.path.join(topdir, "imaqdx.ini"))], lazy, direct)
+    subprocess.check_call([sys.executable, "-c", code], cwd=topdir,
+            stdout=subprocess.DEVNULL)
+    # byte-compile so only the import itself is measured
+    subprocess.check_call([sys.executable, "-m", "compileall", "-q", pkgdir])
+
+def time_import(pkgdir, libdir, runs):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = pkgdir
+    env["LD_LIBRARY_PATH"] = os.pathsep.join(
+            [libdir, env.get("LD_LIBRARY_PATH", "")])
+    code = ("import time; t = time.perf_counter(); import nivision; "
+            "print(time.perf_counter() - t)")
+    times = []
+    for i in range(runs):
+        out = subprocess.check_output([sys.executable, "-c", code], env=env)
+        times.append(float(out))
+    return times
+
+def main(hdrpath, runs):
+    tmpdir = tempfile.mkdtemp(prefix="nivision_bench_")
+    try:
+        libdir = os.path.join(tmpdir, "lib")
+        stublib.build(hdrpath, libdir)
+        results = {}
+        for mode in ("eager", "lazy"):
+            pkgdir = os.path.join(tmpdir, mode)
+            generate(hdrpath, pkgdir, mode == "lazy")
+            results[mode] = time_import(pkgdir, libdir, runs)
+        for mode, times in results.items():
+            print("%-6s min %7.2f ms  median %7.2f ms  (%d runs)" % (mode,
+                    min(times)*1000, statistics.median(times)*1000, runs))
+        print("speedup (median): %.1fx" % (statistics.median(results["eager"]) /
+                statistics.median(results["lazy"])))
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("Usage: bench_import.py <path to nivision.h and NIIMAQdx.h> [runs]")
+        sys.exit(1)
+    main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) == 3 else 20)
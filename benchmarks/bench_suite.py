@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""Run the benchmark suite against stub NI libraries built by stublib.py and
+compare the results with a stored baseline.
+
+Measures the per-call overhead of the wrappers, array marshalling, the JPEG
+decode paths, the cost of creating and disposing objects and import time, in
+seconds per operation.  Save a baseline with --save on a known good revision
+(results are merged into an existing baseline, so -k updates only the
+benchmarks it runs), then run the suite again to check for regressions; the
+exit status is 1 if any benchmark failed or is slower than the baseline by
+more than the threshold.  Timings are only comparable on the same machine:
+the committed baseline is for reference, so before checking a change save a
+local one (e.g. --save --baseline local.json) on the unchanged revision.
+
+Usage: bench_suite.py [options] <path to nivision.h and NIIMAQdx.h>"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+import stublib
+from bench_import import generate, time_import
+
+default_baseline = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "baseline.json")
+
+# made by the stub Priv_ReadJPEGString_C into a 640x480 image
+STUB_JPEG = stublib.stub_jpeg(640, 480)
+# a real JPEG, for the decoders that don't go through the stubs
+PIL_JPEG = ("import io, PIL.Image; f = io.BytesIO(); "
+            "PIL.Image.new('RGB', (640, 480), (40, 80, 120)).save(f, 'JPEG'); "
+            "data = f.getvalue()")
+
+def _decode(decoder, data):
+    return ("jpeg." + decoder,
+            "%s; rgb = nivision.imaqCreateImage(nivision.IMAQ_IMAGE_RGB); "
+            "nivision.selectJPEGDecoder(%r, nivision.IMAQ_IMAGE_RGB)" % (
+            data, decoder),
+            "nivision.Priv_ReadJPEGString(rgb, data)")
+
+# (name, setup, statement); img is a 640x480 U8 image.  Benchmarks whose
+# setup fails (e.g. an optional module is missing) are skipped.
+BENCHMARKS = [
+    ("calls.imaqGetImageSize", "", "nivision.imaqGetImageSize(img)"),
+    ("calls.imaqGetImageType", "", "nivision.imaqGetImageType(img)"),
+    ("calls.imaqGetPixel", "pt = nivision.Point(0, 0)",
+        "nivision.imaqGetPixel(img, pt)"),
+    ("calls.imaqSetImageSize", "", "nivision.imaqSetImageSize(img, 640, 480)"),
+    ("calls.IMAQdxGetAttribute", "",
+        "nivision.IMAQdxGetAttribute(0, b'Width')"),
+    ("calls.IMAQdxAttributeCache.get",
+        "attrs = nivision.IMAQdxAttributeCache(0)", "attrs.get('Width')"),
+    ("arrays.imaqImageToArray", "", "nivision.imaqImageToArray(img)"),
+    ("arrays.imaqArrayToImage.bytes", "data = bytes(640*480)",
+        "nivision.imaqArrayToImage(img, data, 640, 480)"),
+    ("arrays.imaqArrayToImage.bytearray", "data = bytearray(640*480)",
+        "nivision.imaqArrayToImage(img, data, 640, 480)"),
+    ("arrays.imaqArrayToImage.resize",
+        "data = bytes(640*480); "
+        "dest = nivision.imaqCreateImage(nivision.IMAQ_IMAGE_U8)",
+        "nivision.imaqSetImageSize(dest, 0, 0); "
+        "nivision.imaqArrayToImage(dest, data, 640, 480)"),
+    ("arrays.imaqImageToNdarray", "import numpy",
+        "nivision.imaqImageToNdarray(img)"),
+    ("arrays.imaqFlatten", "",
+        "nivision.imaqFlatten(img, nivision.IMAQ_FLATTEN_IMAGE, "
+        "nivision.IMAQ_COMPRESSION_NONE, 0)"),
+    ("arrays.imaqUnflatten",
+        "data = bytes(nivision.imaqFlatten(img, nivision.IMAQ_FLATTEN_IMAGE, "
+        "nivision.IMAQ_COMPRESSION_NONE, 0))",
+        "nivision.imaqUnflatten(img, data)"),
+    _decode("native", "data = %r" % STUB_JPEG),
+    _decode("turbojpeg", PIL_JPEG),
+    _decode("pil", PIL_JPEG),
+    ("dispose.imaqCreateImage", "",
+        "nivision.imaqCreateImage(nivision.IMAQ_IMAGE_U8)"),
+    ("dispose.imaqDispose", "",
+        "nivision.imaqDispose(nivision.imaqCreateImage(nivision.IMAQ_IMAGE_U8))"),
+]
+
+RUNNER = """\
+import timeit, nivision
+img = nivision.imaqCreateImage(nivision.IMAQ_IMAGE_U8)
+nivision.imaqSetImageSize(img, 640, 480)
+try:
+    exec(%r)
+except Exception as e:
+    print("skip: %%s: %%s" %% (e.__class__.__name__, e))
+    raise SystemExit
+timer = timeit.Timer(%r, globals=globals())
+number = timer.autorange()[0]
+print(min(timer.repeat(%d, number)) / number)
+"""
+
+FAILED = "failed: "
+
+def failed(result):
+    return isinstance(result, str) and result.startswith(FAILED)
+
+def run_benchmark(pkgdir, libdir, setup, stmt, repeat=5):
+    """Return seconds per execution of stmt, or a string saying why the
+    benchmark was skipped or, starting with FAILED, why it failed."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = pkgdir
+    env["LD_LIBRARY_PATH"] = os.pathsep.join(
+            [libdir, env.get("LD_LIBRARY_PATH", "")])
+    result = subprocess.run([sys.executable, "-c",
+            RUNNER % (setup or "pass", stmt, repeat)], env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True)
+    if result.returncode != 0:
+        # the last line of a traceback, or nothing if a stub crashed
+        lines = result.stderr.strip().splitlines()
+        return FAILED + (lines[-1] if lines else
+                         "exit status %d" % result.returncode)
+    out = result.stdout.strip()
+    if out.startswith("skip:"):
+        return out[5:].strip()
+    return float(out)
+
+def run_suite(hdrpath, pattern=None, direct=False, imports=20):
+    """Build the stubs and a generated package and run the benchmarks whose
+    names contain pattern.  Returns a dict of name to seconds, or to the
+    reason the benchmark was skipped or failed."""
+    tmpdir = tempfile.mkdtemp(prefix="nivision_bench_")
+    try:
+        libdir = os.path.join(tmpdir, "lib")
+        stublib.build(hdrpath, libdir)
+        pkgdir = os.path.join(tmpdir, "pkg")
+        generate(hdrpath, pkgdir, True, direct)
+        results = {}
+        for name, setup, stmt in BENCHMARKS:
+            if pattern and pattern not in name:
+                continue
+            results[name] = run_benchmark(pkgdir, libdir, setup, stmt)
+            report(name, results[name])
+        if imports and (not pattern or pattern in "import.nivision"):
+            try:
+                results["import.nivision"] = statistics.median(
+                        time_import(pkgdir, libdir, imports))
+            except subprocess.CalledProcessError as e:
+                results["import.nivision"] = FAILED + str(e)
+            report("import.nivision", results["import.nivision"])
+        return results
+    finally:
+        shutil.rmtree(tmpdir)
+
+def format_time(seconds):
+    if seconds < 1e-3:
+        return "%9.3f us" % (seconds*1e6)
+    return "%9.3f ms" % (seconds*1e3)
+
+def report(name, result):
+    if failed(result):
+        print("%-36s %12s  (%s)" % (name, "FAILED", result[len(FAILED):]))
+    elif isinstance(result, str):
+        print("%-36s %12s  (%s)" % (name, "skipped", result))
+    else:
+        print("%-36s %s" % (name, format_time(result)))
+    sys.stdout.flush()
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+def save_baseline(path, results):
+    """Merge the measured results into the baseline at path, keeping the
+    entries of benchmarks that weren't run or were skipped or failed.  A
+    baseline from another kind of machine is replaced instead."""
+    saved = {}
+    if os.path.exists(path):
+        baseline = load_baseline(path)
+        if baseline.get("machine") == platform.machine():
+            saved = baseline["results"]
+    saved.update((name, result) for name, result in results.items()
+                 if not isinstance(result, str))
+    baseline = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": saved,
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=1, sort_keys=True)
+        f.write("\n")
+
+def compare(results, baseline, threshold):
+    """Print the change of each result against the baseline and return the
+    names of those slower by more than threshold (a fraction)."""
+    regressions = []
+    print()
+    print("%-36s %12s %12s %8s" % ("", "baseline", "current", "change"))
+    for name, result in results.items():
+        base = baseline["results"].get(name)
+        if base is None or isinstance(result, str):
+            continue
+        change = result/base - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print("%-36s %s %s %+7.1f%%%s" % (name, format_time(base),
+                format_time(result), change*100, flag))
+    if baseline.get("python") != platform.python_version():
+        print("note: baseline was measured with Python %s" %
+              baseline.get("python"))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("hdrpath",
+                        help="directory with nivision.h and NIIMAQdx.h")
+    parser.add_argument("--baseline", default=default_baseline,
+                        help="baseline file (default: %(default)s)")
+    parser.add_argument("--save", action="store_true",
+                        help="save the results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="slowdown counted as a regression "
+                             "(default: %(default)s)")
+    parser.add_argument("-k", dest="pattern",
+                        help="only run benchmarks whose names contain this")
+    parser.add_argument("--direct", action="store_true",
+                        help="benchmark the direct (gen_wrap.py --direct) "
+                             "wrappers")
+    parser.add_argument("--imports", type=int, default=20,
+                        help="number of imports to time (default: "
+                             "%(default)s)")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.hdrpath, args.pattern, args.direct, args.imports)
+    failures = [name for name, result in results.items() if failed(result)]
+    status = 0
+    if args.save:
+        save_baseline(args.baseline, results)
+        print("Saved baseline to %s" % args.baseline)
+    elif not os.path.exists(args.baseline):
+        print("No baseline at %s; run with --save to create one" %
+              args.baseline)
+    else:
+        baseline = load_baseline(args.baseline)
+        regressions = []
+        if baseline.get("machine") != platform.machine():
+            print("Baseline %s was measured on %s, not %s; not comparing.  "
+                  "Run with --save on a known good revision to measure a "
+                  "baseline on this machine." % (args.baseline,
+                  baseline.get("machine"), platform.machine()))
+        else:
+            regressions = compare(results, baseline, args.threshold)
+            if args.baseline == default_baseline:
+                print("note: this is the committed baseline; timings differ "
+                      "between computers, so save a local one to check a "
+                      "change")
+        if regressions:
+            print("%d benchmark(s) regressed by more than %d%%" % (
+                  len(regressions), args.threshold*100))
+            status = 1
+    if failures:
+        print("%d benchmark(s) failed: %s" % (len(failures),
+              ", ".join(failures)))
+        status = 1
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""Build stub libnivision/libniimaqdx shared libraries for benchmarking.
+
+Every function declared in the given headers is exported as a C stub so the
+generated wrappers can be loaded and called without an NI Vision install.
+Only Linux (or any system with a "cc" that understands -shared -fPIC) is
+supported."""
+import codecs
+import os
+import subprocess
+import sys
+
+topdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, topdir)
+import nivision_parse
+
+class _FunctionCollector:
+    """parse_file() emitter that just records the function names."""
+    def __init__(self):
+        self.functions = []
+    def function(self, name, restype, params):
+        self.functions.append(name)
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+def header_functions(fname):
+    """Return the names of the functions declared in a header."""
+    collector = _FunctionCollector()
+    with codecs.open(fname, "r", "iso-8859-1") as inf:
+        nivision_parse.prescan_file(inf)
+        inf.seek(0)
+        nivision_parse.parse_file(collector, inf, set())
+    return collector.functions
+
+# IMAQdxRegisterFrameDoneEvent fires the callback from a native thread, one
+# buffer per millisecond, until it returns 0 or is unregistered
+FRAME_DONE_FRAMES = 100
+frame_done_source = r"""
+#include <pthread.h>
+#include <stdlib.h>
+#include <unistd.h>
+typedef unsigned int (*FrameDoneEventCallbackPtr)(unsigned int id,
+        unsigned int bufferNumber, void* callbackData);
+struct frame_done {
+    unsigned int id, interval;
+    FrameDoneEventCallbackPtr callback;
+    void* data;
+    volatile int stop;
+    pthread_t thread;
+};
+static struct frame_done* frame_done_events[16];
+static void* frame_done_thread(void* arg) {
+    struct frame_done* ev = arg;
+    unsigned int n;
+    for (n = 0; n < %d && !ev->stop; n += ev->interval) {
+        usleep(1000);
+        if (!ev->callback(ev->id, n, ev->data))
+            break;
+    }
+    return NULL;
+}
+int IMAQdxRegisterFrameDoneEvent(unsigned int id, unsigned int interval,
+        FrameDoneEventCallbackPtr callback, void* data) {
+    struct frame_done* ev = frame_done_events[id %% 16];
+    if (ev) {
+        ev->stop = 1;
+        pthread_join(ev->thread, NULL);
+        free(ev);
+        frame_done_events[id %% 16] = NULL;
+    }
+    if (!callback)
+        return 0;
+    ev = calloc(1, sizeof(*ev));
+    ev->id = id;
+    ev->interval = interval ? interval : 1;
+    ev->callback = callback;
+    ev->data = data;
+    frame_done_events[id %% 16] = ev;
+    pthread_create(&ev->thread, NULL, frame_done_thread, ev);
+    return 0;
+}
+""" % FRAME_DONE_FRAMES
+
+# A minimal in-memory image model, so that the wrappers that marshal pixel
+# data, dispose results or decode JPEGs do realistic work.  Every block
+# handed out (images, arrays, flattened data) has a header recording what it
+# is, so imaqDispose() can free it; the dummy pointers returned by the plain
+# stubs are ignored.  imaqSetImageSize() fails on a negative size, setting
+# the last error like NI Vision does, so error paths can be exercised.
+image_source = r"""
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#define STUB_MAGIC 0x5354554bu
+#define STUB_ERR_INVALID_SIZE (-1074396120)
+enum { STUB_BLOCK, STUB_IMAGE };
+struct stub_block { unsigned int magic, kind; size_t pad; };
+struct stub_image { int type, width, height, bpp; unsigned char* pixels; };
+/* mirrors ImageInfo in nivision.h */
+struct stub_image_info {
+    int imageUnit; float stepX, stepY; int imageType, xRes, yRes, xOffset,
+    yOffset, border, pixelsPerLine; void *reserved0, *reserved1, *imageStart;
+};
+struct stub_rect { int top, left, height, width; };
+/* dummy pointers (e.g. NULL images) behave as an empty U8 image */
+static const struct stub_image stub_empty = {0, 0, 0, 1, NULL};
+#define STUB_VALID(p) ((uintptr_t)(p) >= 4096)
+#define STUB_IMAGE(p) (STUB_VALID(p) ? (p) : &stub_empty)
+static void* stub_alloc(size_t size, unsigned int kind) {
+    struct stub_block* b = calloc(1, sizeof(*b) + size);
+    b->magic = STUB_MAGIC;
+    b->kind = kind;
+    return b + 1;
+}
+static int stub_bpp(int type) {
+    /* U8, I16, SGL, COMPLEX, RGB, HSL, RGB_U64, U16 */
+    static const int bpp[] = {1, 2, 4, 8, 4, 4, 8, 2};
+    return type >= 0 && type < 8 ? bpp[type] : 1;
+}
+static void stub_resize(struct stub_image* img, int width, int height) {
+    if (img->width == width && img->height == height)
+        return;
+    free(img->pixels);
+    img->pixels = calloc((size_t)width*height + 1, img->bpp);
+    img->width = width;
+    img->height = height;
+}
+/* the last error, as set by a failed call or imaqSetError() */
+static int stub_error;
+static const char* stub_error_func = "";
+static int stub_fail(int code, const char* function) {
+    stub_error = code;
+    stub_error_func = function;
+    return 0;
+}
+int imaqGetLastError(void) {
+    return stub_error;
+}
+const char* imaqGetLastErrorFunc(void) {
+    return stub_error_func;
+}
+int imaqSetError(int errorCode, const char* function) {
+    static char buf[256];
+    strncpy(buf, function ? function : "", sizeof(buf) - 1);
+    stub_fail(errorCode, buf);
+    return 1;
+}
+int imaqClearError(void) {
+    stub_fail(0, "");
+    return 1;
+}
+char* imaqGetErrorText(int errorCode) {
+    char* text = stub_alloc(32, STUB_BLOCK);
+    strcpy(text, "stub error");
+    return text;
+}
+int imaqDispose(void* object) {
+    struct stub_block* b;
+    if (!STUB_VALID(object))
+        return 1;
+    b = (struct stub_block*)object - 1;
+    if (b->magic != STUB_MAGIC)
+        return 1;
+    if (b->kind == STUB_IMAGE)
+        free(((struct stub_image*)object)->pixels);
+    b->magic = 0;
+    free(b);
+    return 1;
+}
+void* imaqCreateImage(int type, int borderSize) {
+    struct stub_image* img = stub_alloc(sizeof(*img), STUB_IMAGE);
+    img->type = type;
+    img->bpp = stub_bpp(type);
+    img->pixels = calloc(1, img->bpp);
+    return img;
+}
+int imaqGetImageSize(const struct stub_image* img, int* width, int* height) {
+    img = STUB_IMAGE(img);
+    if (width) *width = img->width;
+    if (height) *height = img->height;
+    return 1;
+}
+int imaqSetImageSize(struct stub_image* img, int width, int height) {
+    if (width < 0 || height < 0)
+        return stub_fail(STUB_ERR_INVALID_SIZE, "imaqSetImageSize");
+    if (STUB_VALID(img))
+        stub_resize(img, width, height);
+    return 1;
+}
+int imaqGetImageType(const struct stub_image* img, int* type) {
+    img = STUB_IMAGE(img);
+    *type = img->type;
+    return 1;
+}
+int imaqGetBytesPerPixel(const struct stub_image* img, int* byteCount) {
+    img = STUB_IMAGE(img);
+    *byteCount = img->bpp;
+    return 1;
+}
+int imaqGetImageInfo(const struct stub_image* img,
+                     struct stub_image_info* info) {
+    img = STUB_IMAGE(img);
+    memset(info, 0, sizeof(*info));
+    info->imageType = img->type;
+    info->xRes = img->width;
+    info->yRes = img->height;
+    info->pixelsPerLine = img->width;
+    info->imageStart = img->pixels;
+    return 1;
+}
+void* imaqImageToArray(const struct stub_image* img, struct stub_rect rect,
+                       int* columns, int* rows) {
+    size_t size;
+    img = STUB_IMAGE(img);
+    size = (size_t)img->width*img->height*img->bpp;
+    void* data = stub_alloc(size, STUB_BLOCK);
+    memcpy(data, img->pixels, size);
+    if (columns) *columns = img->width;
+    if (rows) *rows = img->height;
+    return data;
+}
+int imaqArrayToImage(struct stub_image* img, const void* array, int numCols,
+                     int numRows) {
+    if (!STUB_VALID(img))
+        return 1;
+    stub_resize(img, numCols, numRows);
+    memcpy(img->pixels, array, (size_t)numCols*numRows*img->bpp);
+    return 1;
+}
+int imaqDuplicate(struct stub_image* dest, const struct stub_image* source) {
+    if (!STUB_VALID(dest))
+        return 1;
+    source = STUB_IMAGE(source);
+    if (dest->bpp != source->bpp)
+        return 0;
+    dest->type = source->type;
+    stub_resize(dest, source->width, source->height);
+    memcpy(dest->pixels, source->pixels,
+           (size_t)source->width*source->height*source->bpp);
+    return 1;
+}
+void* imaqFlatten(const struct stub_image* img, int type, int compression,
+                  int quality, unsigned int* size) {
+    size_t n;
+    unsigned char* data;
+    img = STUB_IMAGE(img);
+    n = (size_t)img->width*img->height*img->bpp;
+    data = stub_alloc(n + 16, STUB_BLOCK);
+    memcpy(data, &img->width, 4);
+    memcpy(data + 4, &img->height, 4);
+    memcpy(data + 16, img->pixels, n);
+    *size = (unsigned int)(n + 16);
+    return data;
+}
+"""
+image_functions = ["imaqGetLastError", "imaqGetLastErrorFunc",
+        "imaqSetError", "imaqClearError", "imaqGetErrorText", "imaqDispose",
+        "imaqCreateImage", "imaqGetImageSize", "imaqSetImageSize", "imaqGetImageType", "imaqGetBytesPerPixel",
+        "imaqGetImageInfo", "imaqImageToArray", "imaqArrayToImage",
+        "imaqDuplicate", "imaqFlatten"]
+
+# Priv_ReadJPEGString_C "decodes" a stand-in for a JPEG: the width and height
+# as two little endian ints, then the compressed data, which is expanded by
+# repeating it over the pixels
+jpeg_source = r"""
+#include <string.h>
+struct stub_image;
+int imaqSetImageSize(struct stub_image* img, int width, int height);
+struct stub_image_info {
+    int imageUnit; float stepX, stepY; int imageType, xRes, yRes, xOffset,
+    yOffset, border, pixelsPerLine; void *reserved0, *reserved1, *imageStart;
+};
+int imaqGetImageInfo(const struct stub_image* img,
+                     struct stub_image_info* info);
+int imaqGetBytesPerPixel(const struct stub_image* img, int* byteCount);
+int Priv_ReadJPEGString_C(struct stub_image* img, const unsigned char* data,
+                          unsigned int len) {
+    struct stub_image_info info;
+    int width, height, bpp;
+    size_t size, n, chunk;
+    if (len <= 8)
+        return 0;
+    memcpy(&width, data, 4);
+    memcpy(&height, data + 4, 4);
+    imaqSetImageSize(img, width, height);
+    imaqGetImageInfo(img, &info);
+    imaqGetBytesPerPixel(img, &bpp);
+    size = (size_t)width*height*bpp;
+    for (n = 0; n < size; n += chunk) {
+        chunk = size - n < len - 8 ? size - n : len - 8;
+        memcpy((unsigned char*)info.imageStart + n, data + 8, chunk);
+    }
+    return 1;
+}
+"""
+
+def stub_jpeg(width, height, size=4096):
+    """Data that the stub Priv_ReadJPEGString_C decodes to a width x height
+    image."""
+    import struct
+    return struct.pack("<ii", width, height) + bytes(range(256))*(size//256)
+
+def stub_source(functions, retval=0, overrides=None):
+    """C source exporting a trivial definition of every function, returning
+    retval, except those with a definition in overrides (a dict of name to
+    C source)."""
+    overrides = overrides or {}
+    lines = ["/* Autogenerated by stublib.py */"]
+    for name in functions:
+        if name not in overrides:
+            lines.append("int %s(void) { return %d; }" % (name, retval))
+    # several functions can share a definition
+    lines.extend(dict.fromkeys(source for name, source in overrides.items()
+                               if name in functions))
+    return "\n".join(lines) + "\n"
+
+def compile_library(source, path, libs=()):
+    csrc = path + ".c"
+    with open(csrc, "w") as f:
+        f.write(source)
+    # libs are found next to the library
+    args = ["-L" + os.path.dirname(os.path.abspath(path)),
+            "-Wl,-rpath,$ORIGIN"] + ["-l" + lib for lib in libs] if libs else []
+    subprocess.check_call(["cc", "-shared", "-fPIC", "-O2", "-pthread", "-o",
+                           path, csrc] + args)
+
+def build(hdrpath, outdir):
+    """Build libnivision.so, libniimaqdx.so and libnivissvc.so from the
+    nivision.h and NIIMAQdx.h in hdrpath into outdir."""
+    os.makedirs(outdir, exist_ok=True)
+    # stubs report success: nonzero for imaq functions, IMAQdxErrorSuccess
+    # for IMAQdx functions
+    for header, lib, retval, overrides in [
+            ("nivision.h", "libnivision.so", 1,
+             dict.fromkeys(image_functions, image_source)),
+            ("NIIMAQdx.h", "libniimaqdx.so", 0,
+             {"IMAQdxRegisterFrameDoneEvent": frame_done_source})]:
+        functions = header_functions(os.path.join(hdrpath, header))
+        compile_library(stub_source(functions, retval, overrides),
+                        os.path.join(outdir, lib))
+    # private.py probes nivissvc for Priv_ReadJPEGString_C
+    # and uses the image model in libnivision
+    compile_library(stub_source([]) + jpeg_source,
+                    os.path.join(outdir, "libnivissvc.so"), ["nivision"])
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: stublib.py <path to nivision.h and NIIMAQdx.h> <outdir>")
+        sys.exit(1)
+    build(sys.argv[1], sys.argv[2])
@@ -1,78 +1,104 @@
 #!/usr/bin/env python3
-import core as nivision
+import nivision
+import concurrent.futures
 import sys
 
-def main(name):
+typenames = {
+    nivision.IMAQdxAttributeTypeU32.value: "U32",
+    nivision.IMAQdxAttributeTypeI64.value: "I64",
+    nivision.IMAQdxAttributeTypeF64.value: "F64",
+    nivision.IMAQdxAttributeTypeString.value: "String",
+    nivision.IMAQdxAttributeTypeEnum.value: "Enum",
+    nivision.IMAQdxAttributeTypeBool.value: "Bool",
+    nivision.IMAQdxAttributeTypeCommand.value: "Command",
+    nivision.IMAQdxAttributeTypeBlob.value: "Blob",
+}
+
+def describe(name):
+    """Return the description of a camera's modes and attributes as a list
+    of lines."""
+    lines = []
     id = nivision.IMAQdxOpenCamera(name, nivision.IMAQdxCameraControlModeController)
+    try:
+        modes, currentMode = nivision.IMAQdxEnumerateVideoModes(id)
+        # the advanced tree includes the simple and intermediate attributes
+        attrs = nivision.IMAQdxAttributeCache(id)
+        values = attrs.snapshot()
+        lines.append("Current mode = %d" % currentMode.value)
+        lines.append("Available Modes:")
+        for mode in modes:
+            lines.append(" %d: %s" % (mode.Value, mode.Name))
+        lines.append("Attributes:")
+        for attrname in attrs.names():
+            attr = attrs.attribute(attrname)
+            atype = typenames.get(attr.type.value,
+                                  "Unknown (%d)" % attr.type.value)
+            value = values.get(attrname, "")
+            enumvalues = None
+            if attr.type == nivision.IMAQdxAttributeTypeEnum:
+                enumvalues = nivision.IMAQdxEnumerateAttributeValues(id, attr.key)
+                if attrname in values:
+                    itemnames = {item.Value: item.Name for item in enumvalues}
+                    value = "%d (%s)" % (value, itemnames.get(value))
+            lines.append(" %s (%s%s - %s) = %s" % (attrname,
+                    "R" if attr.readable else " ",
+                    "W" if attr.writable else " ", atype, value))
+            if enumvalues is not None:
+                lines.append("  Values:")
+                for item in enumvalues:
+                    lines.append("   %d: %s" % (item.Value, item.Name))
+            if atype in ("U32", "I64", "F64") and attrname in values:
+                fmt = "%f" if atype == "F64" else "%d"
+                try:
+                    lines.append(("  Min, Max, Incr: %s, %s, %s" % (fmt, fmt, fmt))
+                                 % attrs.limits(attrname))
+                except nivision.ImaqError:
+                    pass
+    finally:
+        nivision.IMAQdxCloseCamera(id)
+    return lines
 
+def main(names):
+    """Describe the named cameras, concurrently."""
     print("Enumerating...", file=sys.stderr, flush=True)
-    modes, currentMode = nivision.IMAQdxEnumerateVideoModes(id)
-    simple_attrs = nivision.IMAQdxEnumerateAttributes3(id, b"", nivision.IMAQdxAttributeVisibilitySimple)
-    intermediate_attrs = nivision.IMAQdxEnumerateAttributes3(id, b"", nivision.IMAQdxAttributeVisibilityIntermediate)
-    advanced_attrs = nivision.IMAQdxEnumerateAttributes3(id, b"", nivision.IMAQdxAttributeVisibilityAdvanced)
-    print("Current mode = %d" % currentMode.value)
-    print("Available Modes:")
-    for mode in modes:
-        print(" %d: %s" % (mode.Value, mode.Name))
-    seen_attrs = set()
-    for attrs_name, attrs in [("Simple", simple_attrs),
-                              ("Intermediate", intermediate_attrs),
-                              ("Advanced", advanced_attrs)]:
-        print("%s Attributes:" % attrs_name)
-        for attr in attrs:
-            if attr.Name in seen_attrs:
-                continue
-            seen_attrs.add(attr.Name)
-            if attr.Type == nivision.IMAQdxAttributeTypeU32:
-                atype = "U32"
-            elif attr.Type == nivision.IMAQdxAttributeTypeI64:
-                atype = "I64"
-            elif attr.Type == nivision.IMAQdxAttributeTypeF64:
-                atype = "F64"
-            elif attr.Type == nivision.IMAQdxAttributeTypeString:
-                atype = "String"
-            elif attr.Type == nivision.IMAQdxAttributeTypeEnum:
-                atype = "Enum"
-            elif attr.Type == nivision.IMAQdxAttributeTypeBool:
-                atype = "Bool"
-            elif attr.Type == nivision.IMAQdxAttributeTypeCommand:
-                atype = "Command"
-            elif attr.Type == nivision.IMAQdxAttributeTypeBlob:
-                atype = "Blob"
-            else:
-                atype = "Unknown (%d)" % attr.Type.value
-                value = ""
-            if not atype.startswith("Unknown"):
-                value = nivision.IMAQdxGetAttribute(id, attr.Name)
-                if attr.Type == nivision.IMAQdxAttributeTypeEnum:
-                    value = "%d (%s)" % (value.Value, value.Name)
-            print(" %s (%s%s - %s) = %s" % (attr.Name, "R" if attr.Readable else " ",
-                                       "W" if attr.Writable else " ",
-                                       atype, value))
-            if attr.Type == nivision.IMAQdxAttributeTypeEnum:
-                print("  Values:")
-                values = nivision.IMAQdxEnumerateAttributeValues(id, attr.Name)
-                for value in values:
-                    print("   %d: %s" % (value.Value, value.Name))
-            if attr.Type in (nivision.IMAQdxAttributeTypeU32, nivision.IMAQdxAttributeTypeI64):
-                mini = nivision.IMAQdxGetAttributeMinimum(id, attr.Name)
-                maxi = nivision.IMAQdxGetAttributeMaximum(id, attr.Name)
-                incr = nivision.IMAQdxGetAttributeIncrement(id, attr.Name)
-                print("  Min, Max, Incr: %d, %d, %d" % (mini, maxi, incr))
-            if attr.Type == nivision.IMAQdxAttributeTypeF64:
-                mini = nivision.IMAQdxGetAttributeMinimum(id, attr.Name)
-                maxi = nivision.IMAQdxGetAttributeMaximum(id, attr.Name)
-                incr = nivision.IMAQdxGetAttributeIncrement(id, attr.Name)
-                print("  Min, Max, Incr: %f, %f, %f" % (mini, maxi, incr))
+    with concurrent.futures.ThreadPoolExecutor(len(names)) as executor:
+        results = [executor.submit(describe, name) for name in names]
+        for name, result in zip(names, results):
+            if len(names) > 1:
+                print("Camera %s:" % name.decode("utf-8"))
+            print("\n".join(result.result()))
 
-    nivision.IMAQdxCloseCamera(id)
+def save(name, filename):
+    """Save a snapshot of a camera's attributes to a file."""
+    profile = nivision.IMAQdxSnapshotCameras([name])[name]
+    if isinstance(profile, Exception):
+        raise profile
+    with open(filename, "wb") as f:
+        f.write(nivision.IMAQdxDumpProfile(profile))
+    print("Saved %d attributes" % len(profile))
+
+def restore(name, filename):
+    """Restore a camera's attributes from a file saved by save()."""
+    with open(filename, "rb") as f:
+        profile = nivision.IMAQdxLoadProfile(f.read())
+    id = nivision.IMAQdxOpenCamera(name, nivision.IMAQdxCameraControlModeController)
+    try:
+        failed = nivision.IMAQdxAttributeCache(id).restore(profile)
+    finally:
+        nivision.IMAQdxCloseCamera(id)
+    for attrname, e in failed.items():
+        print("%s: %s" % (attrname, e))
 
 if __name__ == "__main__":
-    if len(sys.argv) > 2:
-        print("Usage: caminfo.py [cam#]")
-        sys.exit(1)
-    if len(sys.argv) == 2:
-        main(sys.argv[1].encode('utf-8'))
+    args = sys.argv[1:]
+    if args[:1] in (["--save"], ["--restore"]):
+        if len(args) != 3:
+            print("Usage: caminfo.py --save|--restore cam# file")
+            sys.exit(1)
+        func = save if args[0] == "--save" else restore
+        func(args[1].encode('utf-8'), args[2])
+    elif args:
+        main([arg.encode('utf-8') for arg in args])
     else:
         print("Enumerating...", file=sys.stderr, flush=True)
         cameras = nivision.IMAQdxEnumerateCameras(1)
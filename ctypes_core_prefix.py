@@ -1,5 +1,18 @@
 import ctypes
 import sys
+import threading
+
+# NumPy is optional and slow to import, so the ndarray helpers import it on
+# first use
+_numpy = None
+def _importNumpy():
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy as _numpy
+        except ImportError:
+            raise NotImplementedError("numpy is required for this function")
+    return _numpy
 
 # DLL and function type
 if sys.platform.startswith('win'):
@@ -69,11 +82,14 @@ def STDFUNC(name, *params, **kwargs):
     kwargs.setdefault("errcheck", errcheck)
     return RETFUNC(name, ctypes.c_int, *params, **kwargs)
 
+def _ptrFailed(result):
+    return (result is None or result == 0
+            or getattr(result, "value", 1) is None
+            or getattr(result, "value", 1) == 0)
+
 def STDPTRFUNC(name, restype, *params, **kwargs):
     def errcheck(result, func, args):
-        if (result is None or result == 0
-                or getattr(result, "value", 1) is None
-                or getattr(result, "value", 1) == 0):
+        if _ptrFailed(result):
             raise ImaqError
         return args
 
@@ -89,6 +105,56 @@ def DXFUNC(name, *params, **kwargs):
     kwargs.setdefault("errcheck", errcheck)
     return RETFUNC(name, ctypes.c_uint, *params, **kwargs)
 
+# Wrappers generated by "gen_wrap.py --direct" call bare prototypes (no
+# paramflags or errcheck) and check the result themselves.  Output parameters
+# of basic types are kept per thread in _scratch rather than allocated on
+# every call.
+def CFUNC(name, restype, *argtypes, library=_dll):
+    try:
+        return _functype(restype, *argtypes)((name, library))
+    except AttributeError:
+        def func(*args, **kwargs):
+            raise NotImplementedError
+        return func
+
+_scratch = threading.local()
+
+class _LazyFunc:
+    """Placeholder for a generated wrapper.  The ctypes prototype is built
+    (and the DLL symbol looked up) on first use, at which point the module
+    global is replaced by the real function so later calls go direct.
+
+    Placeholders must not be copied out of this module: other modules call
+    wrappers as core.<name>, and the nivision package binds them through its
+    module __getattr__."""
+    __slots__ = ("_name", "_factory", "_func")
+
+    def __init__(self, name, factory):
+        self._name = name
+        self._factory = factory
+        self._func = None
+
+    def _bind(self):
+        func = self._func
+        if func is None:
+            func = self._func = self._factory()
+            self._factory = None
+            if globals().get(self._name) is self:
+                globals()[self._name] = func
+        return func
+
+    def __call__(self, *args, **kwargs):
+        func = self._func
+        if func is None:
+            func = self._bind()
+        return func(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._bind(), name)
+
+    def __repr__(self):
+        return "<lazy wrapper %s>" % self._name
+
 #
 # Error Management functions
 #
@@ -133,8 +199,12 @@ def IMAQdxGetErrorString(error):
 #
 _imaqDispose = STDFUNC("imaqDispose", ("object", ctypes.c_void_p))
 def imaqDispose(obj):
-    if getattr(obj, "_contents", None) is not None:
-        _imaqDispose(ctypes.byref(obj._contents))
+    contents = getattr(obj, "_contents", None)
+    if contents is not None:
+        if isinstance(contents, ctypes._Pointer):
+            _imaqDispose(contents)
+        else:
+            _imaqDispose(ctypes.byref(contents))
         obj._contents = None
     if getattr(obj, "value", None) is not None:
         _imaqDispose(obj)
@@ -165,13 +235,47 @@ class Disposed(ctypes.c_void_p):
     __del__ = imaqDispose
 
 class ImaqArray:
-    def __init__(self, ptr, length):
+    """A sized array returned by an imaq function.  Besides indexing, the
+    elements can be viewed in bulk through the buffer protocol (Python 3.12+)
+    or NumPy's array interface, e.g. numpy.asarray(arr), with shape
+    arr.shape."""
+    def __init__(self, ptr, length, shape=None):
         self._contents = ptr
         self._length_ = length
+        self.shape = shape if shape is not None else (length,)
 
     def __len__(self):
         return self._length_
 
+    def __iter__(self):
+        return iter(self._contents[:self._length_])
+
+    def _address(self):
+        contents = self._contents
+        if isinstance(contents, ctypes.Array):
+            return ctypes.addressof(contents)
+        return ctypes.cast(contents, ctypes.c_void_p).value or 0
+
+    def _as_ctypes(self):
+        """Return a ctypes array viewing the elements without copying.
+        The view keeps this object alive."""
+        arrtype = self._contents._type_ * self._length_
+        if self._length_ == 0:
+            return arrtype()
+        arr = arrtype.from_address(self._address())
+        arr._owner = self
+        return arr
+
+    def __buffer__(self, flags):
+        return memoryview(self._as_ctypes())
+
+    @property
+    def __array_interface__(self):
+        numpy = _importNumpy()
+        dtype = numpy.dtype(self._contents._type_)
+        return {"version": 3, "shape": self.shape, "typestr": dtype.str,
+                "descr": dtype.descr, "data": (self._address(), False)}
+
     def __getitem__(self, key):
         if key < 0 or key > self._length_-1:
             raise IndexError
@@ -210,13 +314,110 @@ class DisposedPointer:
         return "DisposedPointer(%s)" % self._contents
     __del__ = imaqDispose
 
+#
+# NumPy structured dtypes for structures
+#
+def _ctypeToDtype(numpy, ctype):
+    if issubclass(ctype, (ctypes.Structure, ctypes.Union)):
+        return structDtype(ctype)
+    if issubclass(ctype, ctypes.Array):
+        if ctype._type_ is ctypes.c_char:
+            return numpy.dtype("S%d" % ctype._length_)
+        return numpy.dtype((_ctypeToDtype(numpy, ctype._type_),
+                            (ctype._length_,)))
+    if issubclass(ctype, (ctypes._Pointer, ctypes._CFuncPtr, ctypes.c_char_p,
+                          ctypes.c_wchar_p, ctypes.c_void_p)):
+        # addresses only
+        return numpy.dtype(numpy.uintp)
+    return numpy.dtype(ctype)
+
+def _buildStructDtype(type):
+    numpy = _importNumpy()
+    names = []
+    formats = []
+    offsets = []
+    for field in type._fields_:
+        names.append(field[0])
+        formats.append(_ctypeToDtype(numpy, field[1]))
+        offsets.append(getattr(type, field[0]).offset)
+    return numpy.dtype({"names": names, "formats": formats,
+                        "offsets": offsets, "itemsize": ctypes.sizeof(type)})
+
+class _StructDtype:
+    """Generated structures have a _dtype_ attribute giving the equivalent
+    NumPy structured dtype.  It is built from the ctypes layout on first use,
+    so the field offsets match the platform and numpy is only imported when
+    needed.  Pointer fields become addresses (numpy.uintp)."""
+    def __init__(self):
+        self._dtype = None
+
+    def __get__(self, obj, type):
+        if self._dtype is None:
+            self._dtype = _buildStructDtype(type)
+        return self._dtype
+
+def structDtype(type):
+    """Return the NumPy structured dtype equivalent to a ctypes structure."""
+    dtype = getattr(type, "_dtype_", None)
+    if dtype is None:
+        dtype = _buildStructDtype(type)
+    return dtype
+
+def structArrayToRecarray(array, copy=True):
+    """Convert an ImaqArray (or DisposedArray) of structures to a numpy record
+    array in one step, without per-struct field access.  With copy=False the
+    record array views the native memory and keeps array alive."""
+    numpy = _importNumpy()
+    rec = numpy.frombuffer(array._as_ctypes(),
+            structDtype(array._contents._type_)).view(numpy.recarray)
+    if copy:
+        rec = rec.copy()
+    return rec
+
+def _bufferAddress(param):
+    """Get the address of the memory of a C-contiguous buffer-protocol object.
+    Returns tuple of keepalive object, address, size in bytes."""
+    mv = memoryview(param)
+    if not mv.c_contiguous:
+        raise ValueError("buffer must be C-contiguous")
+    if not mv.readonly:
+        buf = (ctypes.c_char * mv.nbytes).from_buffer(mv)
+        return buf, ctypes.addressof(buf), mv.nbytes
+    if not isinstance(param, bytes):
+        param = mv.tobytes()
+    return param, ctypes.cast(ctypes.c_char_p(param), ctypes.c_void_p).value, \
+            mv.nbytes
+
+def _bufferToArray(param, type):
+    """Convert a C-contiguous buffer-protocol object with a matching element
+    format to a ctypes array of type without per-element conversion.
+    Writable buffers are shared rather than copied.
+    Returns None if param can't be used this way."""
+    try:
+        mv = memoryview(param)
+    except TypeError:
+        return None
+    size = ctypes.sizeof(type)
+    if not mv.c_contiguous or mv.nbytes % size != 0:
+        return None
+    fmt = mv.format.lstrip("@=<")
+    if fmt != memoryview((type*0)()).format.lstrip("@=<") and \
+            not (size == 1 and fmt in ("B", "b", "c")):
+        return None
+    arrtype = type * (mv.nbytes // size)
+    if mv.readonly:
+        return arrtype.from_buffer_copy(mv)
+    return arrtype.from_buffer(mv)
+
 def iterableToArray(param, type):
     """Convert an iterable to a ctypes array of type.
     Returns tuple of array, length."""
     length = getattr(param, "_length_", None)
     if length is None:
-        length = len(param)
-        arr = (type*length)(*param)
+        arr = _bufferToArray(param, type)
+        if arr is None:
+            arr = (type*len(param))(*param)
+        length = len(arr)
     else:
         arr = param
     return arr, length
@@ -47,6 +47,94 @@ def imaqImageToArray(image, rect=IMAQ_NO_RECT):
     imaqDispose(d)
     return data, cols.value, rows.value
 
+# custom to accept any buffer (bytes, bytearray, numpy array, etc) directly
+def imaqArrayToImage(image, array, numCols, numRows):
+    try:
+        keep, addr, size = _bufferAddress(array)
+    except TypeError:
+        # not a buffer; let ctypes convert it
+        _imaqArrayToImage(image, array, numCols, numRows)
+        return
+    bpp = imaqGetBytesPerPixel(image)
+    linebytes = numCols*bpp
+    if size < linebytes*numRows:
+        raise ValueError("array too small for %dx%d image" % (numCols, numRows))
+    info = imaqGetImageInfo(image)
+    if info.xRes != numCols or info.yRes != numRows or not info.imageStart:
+        _imaqArrayToImage(image, addr, numCols, numRows)
+        return
+    # already sized: copy straight into the pixel memory
+    if info.pixelsPerLine == numCols:
+        ctypes.memmove(info.imageStart, addr, linebytes*numRows)
+        return
+    stride = info.pixelsPerLine*bpp
+    for row in range(numRows):
+        ctypes.memmove(info.imageStart+row*stride, addr+row*linebytes, linebytes)
+
+# zero-copy alternative to imaqImageToArray; requires numpy
+def imaqImageToNdarray(image, rect=IMAQ_NO_RECT):
+    """Return a numpy ndarray (rows x cols) that views the pixel memory of
+    image directly; no data is copied.  The view keeps image alive, but is
+    invalidated if the image is resized or explicitly disposed."""
+    numpy = _importNumpy()
+    info = imaqGetImageInfo(image)
+    dtype = numpy.dtype(_type_to_ctype[info.imageType])
+    rows, cols, stride = info.yRes, info.xRes, info.pixelsPerLine
+    if rows == 0 or cols == 0 or not info.imageStart:
+        return numpy.empty((0, 0), dtype)
+    buf = (ctypes.c_char * ((stride*(rows-1)+cols)*dtype.itemsize)).from_address(
+            info.imageStart)
+    buf._image = image
+    arr = numpy.ndarray((rows, cols), dtype, buf,
+            strides=(stride*dtype.itemsize, dtype.itemsize))
+    return arr[rect.top:rect.top+rect.height, rect.left:rect.left+rect.width]
+
+def _rowsToNdarray(rows, numRows, numCols):
+    """Copy a C array of numRows pointers to numCols doubles into a new
+    numpy array, with one memmove if the rows are contiguous."""
+    if not rows:
+        return None
+    numpy = _importNumpy()
+    arr = numpy.empty((numRows, numCols), numpy.double)
+    if numRows == 0 or numCols == 0:
+        return arr
+    rowbytes = numCols*arr.itemsize
+    addrs = numpy.frombuffer((ctypes.c_size_t * numRows).from_address(
+            ctypes.cast(rows, ctypes.c_void_p).value), numpy.uintp)
+    if (numpy.diff(addrs) == rowbytes).all():
+        ctypes.memmove(arr.ctypes.data, int(addrs[0]), rowbytes*numRows)
+    else:
+        for i, addr in enumerate(addrs.tolist()):
+            ctypes.memmove(arr.ctypes.data + i*rowbytes, addr, rowbytes)
+    return arr
+
+# columnar alternative to imaqMeasureParticles; requires numpy
+def imaqMeasureParticlesNdarray(image, calibrationMode, measurements,
+                                columns=False):
+    """Like imaqMeasureParticles, but return the pixel and calibrated
+    measurements as a tuple of numpy arrays of shape (numParticles,
+    numMeasurements), with a column per requested measurement.  If columns
+    is true, each is instead a dict mapping each MeasurementType to an array
+    of that measurement for all particles.  The calibrated measurements are
+    None if the report doesn't contain them."""
+    measurements = list(measurements)
+    array, numMeasurements = iterableToArray(measurements, MeasurementType)
+    report = DisposedPointer(_imaqMeasureParticles(image, calibrationMode,
+                                                   array, numMeasurements))
+    numParticles = report.numParticles
+    numMeasurements = report.numMeasurements
+    pixel = _rowsToNdarray(report.pixelMeasurements, numParticles,
+                           numMeasurements)
+    calibrated = _rowsToNdarray(report.calibratedMeasurements, numParticles,
+                                numMeasurements)
+    imaqDispose(report)
+    if columns:
+        if pixel is not None:
+            pixel = dict(zip(measurements, pixel.T.copy()))
+        if calibrated is not None:
+            calibrated = dict(zip(measurements, calibrated.T.copy()))
+    return pixel, calibrated
+
 # custom to handle data copy
 def imaqReadCustomData(image, key):
     size = ctypes.c_uint()
@@ -55,18 +143,40 @@ def imaqReadCustomData(image, key):
     imaqDispose(d)
     return data
 
-# custom to handle c_byte <-> void translation
-#def imaqFlatten(image, type, compression, quality):
-#    size = ctypes.c_uint()
-#    rv = _imaqFlatten(image, type, compression, quality, ctypes.byref(size))
-#    return DisposedArray(ctypes.cast(rv, ctypes.POINTER(ctypes.c_byte)), size.value)
+# custom to return the flattened data without copying: a memoryview of the
+# native buffer, which is disposed once the memoryview is no longer used
+def imaqFlatten(image, type, compression, quality):
+    size = ctypes.c_uint()
+    rv = _imaqFlatten(image, type, compression, quality, ctypes.byref(size))
+    data = (ctypes.c_ubyte * size.value).from_address(rv)
+    data._owner = Disposed(rv)
+    return memoryview(data).cast("B")
+
+# custom to accept any buffer (bytes, bytearray, memoryview) directly
 def imaqUnflatten(image, data):
-    data, size = iterableToArray(data, ctypes.c_byte)
-    _imaqUnflatten(image, data, size)
+    try:
+        keep, addr, size = _bufferAddress(data)
+    except TypeError:
+        # not a buffer; let ctypes convert it
+        data, size = iterableToArray(data, ctypes.c_byte)
+        _imaqUnflatten(image, data, size)
+        return
+    _imaqUnflatten(image, addr, size)
+
+# inout dataSize; returns the data stored with the frame (up to maxDataSize
+# bytes), or None if maxDataSize is 0
+def imaqReadAVIFrame(image, session, frameNum, maxDataSize=0):
+    if not maxDataSize:
+        _imaqReadAVIFrame(image, session, frameNum, None, None)
+        return None
+    data = ctypes.create_string_buffer(maxDataSize)
+    dataSize = ctypes.c_uint(maxDataSize)
+    _imaqReadAVIFrame(image, session, frameNum, data, ctypes.byref(dataSize))
+    return data.raw[:dataSize.value]
 
 # type of pointer varies
 _type_to_ctype = {
-        IMAQ_IMAGE_U8: ctypes.c_byte,
+        IMAQ_IMAGE_U8: ctypes.c_ubyte,
         IMAQ_IMAGE_U16: ctypes.c_ushort,
         IMAQ_IMAGE_I16: ctypes.c_short,
         IMAQ_IMAGE_SGL: ctypes.c_float,
@@ -80,7 +190,7 @@ def imaqGetLine(image, start, end):
     numPoints = ctypes.c_int()
     d = _imaqGetLine(image, start, end, ctypes.byref(numPoints))
     t = _type_to_ctype[imaqGetImageType(image)]
-    return DisposedArray(ctypes.cast(d, t), numPoints)
+    return DisposedArray(ctypes.cast(d, ctypes.POINTER(t)), numPoints.value)
 
 def imaqSetLine(image, array, start, end):
     array, arraySize = iterableToArray(array,
@@ -90,15 +200,16 @@ def imaqSetLine(image, array, start, end):
 def imaqGetPixelAddress(image, pixel):
     d = _imaqGetPixelAddress(image, pixel)
     t = _type_to_ctype[imaqGetImageType(image)]
-    return ctypes.cast(d, t)
+    return ctypes.cast(d, ctypes.POINTER(t))
 
-# custom to handle rows*columns math
-# XXX: should this try to build a 2D array (e.g. with numpy) instead?
+# custom to handle rows*columns math; numpy.asarray() of the returned array
+# is rows x columns
 def imaqComplexPlaneToArray(image, plane, rect):
     rows = ctypes.c_int()
     columns = ctypes.c_int()
     rv = _imaqComplexPlaneToArray(image, plane, rect, ctypes.byref(rows), ctypes.byref(columns))
-    return DisposedArray(rv, rows.value*columns.value), rows.value, columns.value
+    return DisposedArray(rv, rows.value*columns.value,
+                         (rows.value, columns.value)), rows.value, columns.value
 
 # custom to copyin expectedPatterns to String255
 def imaqVerifyPatterns(image, set, expectedPatterns, roi):
@@ -112,18 +223,18 @@ def imaqReadFile(image, fileName):
     colorTable = (RGBValue*256)()
     numColors = ctypes.c_int()
     _imaqReadFile(image, fileName, colorTable, ctypes.byref(numColors))
-    if numColors == 0:
+    if numColors.value == 0:
         return []
-    return ImaqArray(colorTable, numColors)
+    return ImaqArray(colorTable, numColors.value)
 
 # custom for output parameter array
 def imaqReadVisionFile(image, fileName):
     colorTable = (RGBValue*256)()
     numColors = ctypes.c_int()
     _imaqReadVisionFile(image, fileName, colorTable, ctypes.byref(numColors))
-    if numColors == 0:
+    if numColors.value == 0:
         return []
-    return ImaqArray(colorTable, numColors)
+    return ImaqArray(colorTable, numColors.value)
 
 # number of patterns is for both labels and patterns
 def imaqLearnMultipleGeometricPatterns(patterns, labels):
@@ -156,8 +267,9 @@ def IMAQdxGetAttributeDisplayName(id, name):
     return ctypes.cast(displayName, ctypes.c_char_p).value.decode("utf-8")
 
 # get/set attribute in/out varies with type
-def _IMAQdxAttrGetter(id, name, func):
-    attrtype = IMAQdxGetAttributeType(id, name)
+def _IMAQdxAttrGetter(id, name, func, attrtype=None):
+    if attrtype is None:
+        attrtype = IMAQdxGetAttributeType(id, name)
     if attrtype == IMAQdxAttributeTypeU32:
         value = ctypes.c_uint32()
         func(id, name, IMAQdxValueTypeU32, ctypes.byref(value))
@@ -201,8 +313,7 @@ _IMAQdxSetAttribute_String = DXFUNC("IMAQdxSetAttribute", ("id", IMAQdxSession),
 _IMAQdxSetAttribute_Enum = DXFUNC("IMAQdxSetAttribute", ("id", IMAQdxSession), ("name", ctypes.c_char_p), ("type", IMAQdxValueType), ("value", IMAQdxEnumItem), library=_dll2)
 _IMAQdxSetAttribute_Bool = DXFUNC("IMAQdxSetAttribute", ("id", IMAQdxSession), ("name", ctypes.c_char_p), ("type", IMAQdxValueType), ("value", bool32), library=_dll2)
 
-def IMAQdxSetAttribute(id, name, value):
-    attrtype = IMAQdxGetAttributeType(id, name)
+def _IMAQdxAttrSetter(id, name, value, attrtype):
     if attrtype == IMAQdxAttributeTypeU32:
         _IMAQdxSetAttribute_U32(id, name, IMAQdxValueTypeU32, int(value))
     elif attrtype == IMAQdxAttributeTypeI64:
@@ -226,6 +337,29 @@ def IMAQdxSetAttribute(id, name, value):
     else:
         raise TypeError("can't set attribute of type %s" % attrtype)
 
+def IMAQdxSetAttribute(id, name, value):
+    _IMAQdxAttrSetter(id, name, value, IMAQdxGetAttributeType(id, name))
+
+# callback: callbackFunction(id, bufferNumber, callbackData) is called on an
+# IMAQdx thread every bufferInterval buffers, with callbackData any Python
+# object.  It should return true (or None) to keep receiving events.  The
+# ctypes callback is kept alive until replaced or unregistered (by passing
+# None as callbackFunction).
+_frameDoneCallbacks = {}
+
+def IMAQdxRegisterFrameDoneEvent(id, bufferInterval, callbackFunction, callbackData=None):
+    key = getattr(id, "value", id)
+    if callbackFunction is None:
+        _IMAQdxRegisterFrameDoneEvent(id, bufferInterval, FrameDoneEventCallbackPtr(), None)
+        _frameDoneCallbacks.pop(key, None)
+        return
+    def callback(id, bufferNumber, data):
+        rv = callbackFunction(id, bufferNumber, callbackData)
+        return 1 if rv is None else int(bool(rv))
+    cfunc = FrameDoneEventCallbackPtr(callback)
+    _IMAQdxRegisterFrameDoneEvent(id, bufferInterval, cfunc, None)
+    _frameDoneCallbacks[key] = cfunc
+
 # output array passed with inout count: call with NULL to get count.
 def IMAQdxEnumerateCameras(connectedOnly):
     count = ctypes.c_uint(0)
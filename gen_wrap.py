@@ -4,16 +4,23 @@ import os
 import re
 import configparser
 import codecs
+import hashlib
+import io
+import json
+import traceback
 
 from nivision_parse import *
 
 class CtypesEmitter:
-    def __init__(self, srcdir, outdir, config):
+    def __init__(self, srcdir, outdir, config, lazy=True, direct=False):
         self.srcdir = srcdir
         self.outdir = outdir
         self.config = config
+        self.lazy = lazy # bind DLL functions on first use
+        self.direct = direct # plain Python wrappers around bare prototypes
+        self.ir = None # IR metadata for the declaration being emitted
 
-        self.out = open(os.path.join(self.outdir, "core.py"), "wt")
+        self.out = io.StringIO()
         for line in open(os.path.join(self.srcdir, "ctypes_core_prefix.py")):
             print(line, end='', file=self.out)
         self.block_comment("Opaque Structures")
@@ -23,6 +30,17 @@ class CtypesEmitter:
     def finish(self):
         for line in open(os.path.join(self.srcdir, "ctypes_core_suffix.py")):
             print(line, end='', file=self.out)
+        # only touch core.py if it changed
+        code = self.out.getvalue()
+        fname = os.path.join(self.outdir, "core.py")
+        try:
+            with open(fname, "rt") as f:
+                if f.read() == code:
+                    return
+        except IOError:
+            pass
+        with open(fname, "wt") as f:
+            f.write(code)
 
     def block_comment(self, comment):
         print("#"*78, file=self.out)
@@ -71,6 +89,10 @@ class CtypesEmitter:
     def text(self, text):
         print(text, file=self.out)
 
+    def deferred_define(self, name, text):
+        self.text(text)
+        defined.add(name)
+
     def static_const(self, name, ctype, value):
         if hasattr(value, "__iter__"):
             print("%s = %s(%s)" % (name, ctype, ", ".join(value)), file=self.out)
@@ -208,8 +230,10 @@ class CtypesEmitter:
         funcargs = ['"%s"' % name]
         if restype == "int":
             functype = "STDFUNC"
+            rctype = "ctypes.c_int"
         elif restype == "IMAQdxError":
             functype = "DXFUNC"
+            rctype = "ctypes.c_uint"
         else:
             if restype[-1] == "*":
                 functype = "STDPTRFUNC"
@@ -219,6 +243,7 @@ class CtypesEmitter:
             if "POINTER" in ctype:
                 retpointer = True
             funcargs.append(ctype)
+            rctype = ctype
 
         custom = False # generate a custom wrapper function?
         sized_params = dict(tuple(y.strip() for y in x.split(':')) for x in
@@ -235,6 +260,7 @@ class CtypesEmitter:
                 set(x.strip() for x in config.get("outparams", "").split(','))
         outparams = []
         paramtypes = {}
+        directparams = [] # (name, ctype, default)
         if params:
             defaults = dict((y.strip() for y in x.split(':')) for x in
                     config.get("defaults", "").split(',') if x)
@@ -247,6 +273,7 @@ class CtypesEmitter:
                 #if name == "IMAQdxEnumerateCameras":
                 #    print(pname,ptype,arr,ctype)
                 paramtypes[pname] = (ptype, arr)
+                directparams.append((pname, ctype, defaults.get(pname)))
                 if pname in defaults:
                     paramstr = '("%s", %s, %s)' % (pname, ctype, defaults[pname])
                 else:
@@ -273,9 +300,20 @@ class CtypesEmitter:
         if library != "_dll":
             funcargs.append("library=%s" % library)
 
-        print('%s%s = %s(%s)' %
-                ("_" if (underscored or custom) else "", name,
-                    functype, ", ".join(funcargs)), file=self.out)
+        pyname = "%s%s" % ("_" if (underscored or custom) else "", name)
+        self.ir = {"pyname": pyname, "functype": functype,
+                "outparams": outparams, "arraysize": sized_params,
+                "retarraysize": retarraysize or None}
+        if self.direct and self.direct_function(pyname, name, functype,
+                rctype, directparams, [] if custom else outparams, library):
+            pass
+        elif self.lazy:
+            print('%s = _LazyFunc("%s", lambda: %s(%s))' %
+                    (pyname, pyname, functype, ", ".join(funcargs)),
+                    file=self.out)
+        else:
+            print('%s = %s(%s)' % (pyname, functype, ", ".join(funcargs)),
+                    file=self.out)
 
         if custom and not underscored:
             # generate list of input parameters
@@ -357,6 +395,76 @@ class CtypesEmitter:
 
         defined.add(name)
 
+    def direct_function(self, pyname, name, functype, restype, params,
+                        outparams, library):
+        """Emit pyname as a Python function calling a bare ctypes prototype,
+        bypassing ctypes paramflags and errcheck processing.  Output
+        parameters of basic ctypes types are allocated once per thread.
+        Returns False if the function can't be expressed this way."""
+        inparams = [(pname, default) for pname, ctype, default in params
+                    if pname not in outparams]
+        # Python requires defaults to be trailing
+        seen_default = False
+        for pname, default in inparams:
+            if default is None and seen_default:
+                return False
+            seen_default = seen_default or default is not None
+        if "rv" in (pname for pname, ctype, default in params):
+            return False
+
+        argtypes = [restype] + [ctype for pname, ctype, default in params]
+        if library != "_dll":
+            argtypes.append("library=%s" % library)
+        cname = "_c_%s" % name
+        if self.lazy:
+            print('%s = _LazyFunc("%s", lambda: CFUNC("%s", %s))' %
+                    (cname, cname, name, ", ".join(argtypes)), file=self.out)
+        else:
+            print('%s = CFUNC("%s", %s)' % (cname, name, ", ".join(argtypes)),
+                    file=self.out)
+
+        print("def %s(%s):" % (pyname, ", ".join(pname if default is None
+                else "%s=%s" % (pname, default)
+                for pname, default in inparams)), file=self.out)
+
+        # output parameters: basic types are reused, others (structures,
+        # enumerations) are returned to the caller so must be new each call
+        scratch = []
+        retvals = []
+        for pname, ctype, default in params:
+            if pname not in outparams:
+                continue
+            vtype = ctype[len("ctypes.POINTER("):-1]
+            if ctype.startswith("ctypes.POINTER(") and \
+                    re.match(r"ctypes\.c_\w+$", vtype):
+                scratch.append((pname, vtype))
+                retvals.append("%s.value" % pname)
+            else:
+                print("    %s = %s()" % (pname, vtype), file=self.out)
+                retvals.append(pname)
+        if scratch:
+            names = ", ".join(pname for pname, vtype in scratch)
+            values = ", ".join("%s()" % vtype for pname, vtype in scratch)
+            print("    try:", file=self.out)
+            print("        %s = _scratch.%s" % (names, name), file=self.out)
+            print("    except AttributeError:", file=self.out)
+            print("        %s = _scratch.%s = %s" % (names, name, values),
+                    file=self.out)
+
+        print("    rv = %s(%s)" % (cname, ", ".join(pname
+                for pname, ctype, default in params)), file=self.out)
+        if functype == "STDFUNC":
+            print("    if rv == 0:", file=self.out)
+            print("        raise ImaqError", file=self.out)
+        elif functype == "DXFUNC":
+            print("    if rv != 0:", file=self.out)
+            print("        raise ImaqDxError(rv)", file=self.out)
+        elif functype == "STDPTRFUNC":
+            print("    if _ptrFailed(rv):", file=self.out)
+            print("        raise ImaqError", file=self.out)
+        print("    return %s" % (", ".join(retvals) or "rv"), file=self.out)
+        return True
+
     def structunion(self, ctype, name, fields):
         if self.config.getboolean(name, "exclude", fallback=False):
             return
@@ -365,11 +473,14 @@ class CtypesEmitter:
         if name not in defined:
             print("class %s(ctypes.%s): pass" % (name, ctype), file=self.out)
             defined.add(name)
+        layout = [(fname, self.c_to_ctype(ftype, arr))
+                for fname, ftype, arr, comment in fields]
+        self.ir = {"fields": layout}
         print("%s._fields_ = [" % name, file=self.out)
-        for fname, ftype, arr, comment in fields:
-            print('    ("%s", %s),' % (fname, self.c_to_ctype(ftype, arr)),
-                    file=self.out)
+        for fname, ctype in layout:
+            print('    ("%s", %s),' % (fname, ctype), file=self.out)
         print("    ]", file=self.out)
+        print("%s._dtype_ = _StructDtype()" % name, file=self.out)
 
     def struct(self, name, fields):
         self.structunion("Structure", name, fields)
@@ -377,41 +488,146 @@ class CtypesEmitter:
     def union(self, name, fields):
         self.structunion("Union", name, fields)
 
-def generate(srcdir, outdir, inputs):
+# bump when the IR format or the meaning of parse events changes
+IR_VERSION = 1
+
+class IRRecorder:
+    """Passes parse events through to an emitter, recording each one along
+    with the code it generated.  The recorded events form an intermediate
+    representation (IR) of the header that is saved next to core.py and can
+    be replayed on the next run instead of re-parsing the header."""
+    def __init__(self, emit):
+        self.emit = emit
+        self.events = []
+
+    def __getattr__(self, kind):
+        return lambda *args: self.replay(kind, args)
+
+    def replay(self, kind, args):
+        emit = self.emit
+        out = emit.out
+        emit.out = io.StringIO()
+        emit.ir = None
+        try:
+            getattr(emit, kind)(*args)
+        finally:
+            code = emit.out.getvalue()
+            emit.out = out
+            out.write(code)
+            event = {"kind": kind, "args": list(args), "code": code}
+            if emit.ir:
+                event.update(emit.ir)
+            self.events.append(event)
+
+def load_ir(fname):
+    try:
+        with open(fname, "rt") as f:
+            ir = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if ir.get("version") != IR_VERSION:
+        return None
+    return ir
+
+def report_changes(old_ir, new_ir):
+    """Print the declarations whose generated code differs between two IRs."""
+    def declarations(ir):
+        return dict(((e["kind"], str(e["args"][0])), e["code"])
+                for inp in ir["inputs"] for e in inp["events"] if e["args"])
+    old = declarations(old_ir)
+    new = declarations(new_ir)
+    changed = sorted(key for key in set(old) | set(new)
+            if old.get(key) != new.get(key))
+    for kind, name in changed:
+        if kind not in ("block_comment", "text"):
+            print("Changed %s: %s" % (kind, name))
+    print("%d declarations changed" % len(changed))
+
+def generate(srcdir, outdir, inputs, lazy=True, direct=False):
     emit = None
+    irname = os.path.join(outdir, "core_ir.json")
+    old_ir = load_ir(irname)
+    new_ir = {"version": IR_VERSION, "inputs": []}
 
-    for fname, configpath in inputs:
+    for i, (fname, configpath) in enumerate(inputs):
         # read config file
         config = configparser.ConfigParser()
         config.read(configpath)
         block_comment_exclude = set(x.strip() for x in
                 config["Block Comment"]["exclude"].splitlines())
 
-        # open input file
-        with codecs.open(fname, "r", "iso-8859-1") as inf:
+        with open(fname, "rb") as inf:
+            digest = hashlib.sha1(inf.read()).hexdigest()
+        cached = None
+        if old_ir is not None and i < len(old_ir["inputs"]):
+            cached = old_ir["inputs"][i]
+            if (cached["sha1"] != digest or cached["block_comment_exclude"]
+                    != sorted(block_comment_exclude)):
+                cached = None
+
+        if cached is not None:
+            # header unchanged: restore the prescan and replay the parse
+            forward_structs.update(cached["forward_structs"])
+            structs.update(cached["structs"])
+            opaque_structs.update(forward_structs - structs)
+        else:
             # prescan for undefined structurs
-            prescan_file(inf)
-            inf.seek(0)
-
-            if emit is None:
-                emit = CtypesEmitter(srcdir, outdir, config)
-            else:
-                emit.config = config
+            with codecs.open(fname, "r", "iso-8859-1") as inf:
+                prescan_file(inf)
 
-            # generate
-            parse_file(emit, inf, block_comment_exclude)
+        if emit is None:
+            emit = CtypesEmitter(srcdir, outdir, config, lazy, direct)
+        else:
+            emit.config = config
+        recorder = IRRecorder(emit)
+
+        # generate
+        replay_failed = False
+        if cached is not None:
+            for event in cached["events"]:
+                try:
+                    recorder.replay(event["kind"], event["args"])
+                except Exception as e:
+                    print("exception replaying %s(%s) from IR:\n%s" % (
+                            event.get("kind"), event.get("args"),
+                            traceback.format_exc()))
+                    replay_failed = True
+        else:
+            with codecs.open(fname, "r", "iso-8859-1") as inf:
+                parse_file(recorder, inf, block_comment_exclude)
+
+        new_ir["inputs"].append({
+            "header": os.path.basename(fname),
+            # don't trust a bad IR again: re-parse the header on the next run
+            "sha1": None if replay_failed else digest,
+            "block_comment_exclude": sorted(block_comment_exclude),
+            "forward_structs": sorted(forward_structs),
+            "structs": sorted(structs),
+            "events": recorder.events,
+            })
 
     emit.finish()
 
+    if old_ir is not None:
+        report_changes(old_ir, new_ir)
+    with open(irname, "wt") as f:
+        json.dump(new_ir, f, indent=1, sort_keys=True)
+
 if __name__ == "__main__":
-    if len(sys.argv) < 3 or ((len(sys.argv)-1) % 2) != 0:
-        print("Usage: gen_wrap.py <header.h config.ini>...")
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    opts = set(arg for arg in sys.argv[1:] if arg.startswith("--"))
+    if len(args) < 2 or (len(args) % 2) != 0 or \
+            opts - set(["--eager", "--direct"]):
+        print("Usage: gen_wrap.py [--eager] [--direct] <header.h config.ini>...")
+        print("  --eager   bind all DLL functions at import time")
+        print("  --direct  generate plain Python wrappers (lower call overhead)")
         exit(0)
 
     inputs = []
-    for i in range(1, len(sys.argv), 2):
-        fname = sys.argv[i]
-        configname = sys.argv[i+1]
+    for i in range(0, len(args), 2):
+        fname = args[i]
+        configname = args[i+1]
         inputs.append((fname, configname))
 
-    generate("", "nivision", inputs)
+    generate("", "nivision", inputs, lazy="--eager" not in opts,
+             direct="--direct" in opts)
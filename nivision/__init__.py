@@ -4,10 +4,60 @@ nivision package for Python.
 
 __author__  = "Peter Johnson <robotpy@googlegroups.com>"
 
-from . import camera
+from importlib import import_module as _importModule
 from .core import *
 from .private import *
 
+# Submodules that need threads, executors, shared memory or sockets are
+# imported on first use of one of their names (camera's are only available
+# as nivision.camera.<name>), so that "import nivision" doesn't load those
+# parts of the standard library.
+_submodules = {
+    "camera": [],
+    "pool": ["ImagePool"],
+    "pipeline": ["Pipeline"],
+    "cores": ["CoreScheduler", "CORES_THROUGHPUT", "CORES_LATENCY",
+              "CORES_FIXED"],
+    "imaqdx": ["IMAQdxAttributeCache", "IMAQdxSnapshotCameras",
+               "IMAQdxDumpProfile", "IMAQdxLoadProfile",
+               "IMAQdxRingAcquisition", "IMAQdxFrameDispatcher"],
+    "framebus": ["FrameBus"],
+    "recording": ["FrameRecorder", "FrameReplayer", "RecordedFrame"],
+    "avi": ["AVIReader", "AVIWriter"],
+}
+_submoduleNames = {_name: _module for _module, _names in _submodules.items()
+                   for _name in _names}
+
+# Generated wrappers are bound on first use (see core._LazyFunc).  Rather than
+# keep the placeholders copied from core, look them up through __getattr__,
+# so that once bound nivision.<name> is the real function.
+_lazy = frozenset(_name for _name, _value in globals().items()
+                  if isinstance(_value, core._LazyFunc))
+for _name in _lazy:
+    del globals()[_name]
+__all__ = sorted(_name for _name in globals() if not _name.startswith("_"))
+__all__ += sorted(_lazy) + sorted(_submodules) + sorted(_submoduleNames)
+
+def __getattr__(name):
+    if name in _lazy:
+        value = getattr(core, name)
+        if isinstance(value, core._LazyFunc):
+            value = value._bind()
+    elif name in _submodules:
+        value = _importModule("." + name, __name__)
+    elif name in _submoduleNames:
+        value = getattr(_importModule("." + _submoduleNames[name],
+                                      __name__), name)
+    else:
+        raise AttributeError("module %r has no attribute %r" % (__name__,
+                                                                 name))
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | _lazy | set(_submodules) |
+                  set(_submoduleNames))
+
 try:
     from .version import __version__
 except ImportError:
@@ -0,0 +1,198 @@
+#
+# asyncio support
+#
+# Blocking native calls are run on an executor thread (ctypes releases the GIL
+# for the duration of the call), so the event loop keeps running while a frame
+# is being acquired.  This module is not imported by "import nivision".
+#
+import asyncio
+import concurrent.futures
+import functools
+import itertools
+from . import core
+from . import private
+from .camera import AxisCamera
+
+__all__ = ["AsyncSession", "AsyncAxisCamera"]
+
+class AsyncSession:
+    """asyncio interface to an IMAQdx camera session.
+
+    All native calls for the session run on a dedicated single thread
+    executor (unless one is passed in), as IMAQdx calls on a session should
+    not be made concurrently.  frames() is an async iterator over grabbed
+    images."""
+
+    def __init__(self, id, executor=None):
+        self.id = id
+        self._acquiring = False
+        self._own_executor = executor is None
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(1)
+        self.executor = executor
+
+    @classmethod
+    async def open(cls, name, mode=core.IMAQdxCameraControlModeController,
+                   executor=None):
+        """Open a camera (see IMAQdxOpenCamera) and return an AsyncSession."""
+        if isinstance(name, str):
+            name = name.encode("utf-8")
+        session = cls(None, executor)
+        try:
+            session.id = await session.run(core.IMAQdxOpenCamera, name, mode)
+        except BaseException:
+            session._shutdown()
+            raise
+        return session
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def run(self, func, *args):
+        """Run func(*args) on the session's executor; returns an awaitable."""
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    async def close(self):
+        try:
+            if self.id is not None:
+                try:
+                    # an acquisition left by a frames() iterator that is
+                    # only finalized later
+                    if self._acquiring:
+                        await self._stop()
+                finally:
+                    await self.run(core.IMAQdxCloseCamera, self.id)
+        finally:
+            self.id = None
+            self._shutdown()
+
+    def _shutdown(self):
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+
+    def snap(self, image):
+        return self.run(core.IMAQdxSnap, self.id, image)
+
+    def configure_grab(self):
+        return self.run(core.IMAQdxConfigureGrab, self.id)
+
+    def grab(self, image, wait=True):
+        """Grab into image; the result is the actual buffer number."""
+        return self.run(core.IMAQdxGrab, self.id, image, int(wait))
+
+    def sequence(self, images):
+        return self.run(core.IMAQdxSequence, self.id, images)
+
+    def configure_acquisition(self, continuous, buffer_count):
+        return self.run(core.IMAQdxConfigureAcquisition, self.id,
+                        int(continuous), buffer_count)
+
+    def start_acquisition(self):
+        return self.run(core.IMAQdxStartAcquisition, self.id)
+
+    def stop_acquisition(self):
+        return self.run(core.IMAQdxStopAcquisition, self.id)
+
+    def unconfigure_acquisition(self):
+        return self.run(core.IMAQdxUnconfigureAcquisition, self.id)
+
+    def get_image(self, image, mode=core.IMAQdxBufferNumberModeNext,
+                  desired_buffer=0):
+        """Get a buffer of a configured acquisition into image; the result is
+        the actual buffer number."""
+        return self.run(core.IMAQdxGetImage, self.id, image, mode,
+                        desired_buffer)
+
+    async def frames(self, imagetype=core.IMAQ_IMAGE_RGB, buffers=2):
+        """Configure a grab and yield grabbed images.  Images are reused in
+        rotation, so a yielded image is only valid until buffers-1 more
+        images have been yielded.  The acquisition is stopped when iteration
+        ends or, if the iterator is abandoned, when the session is closed."""
+        images = [core.imaqCreateImage(imagetype) for i in range(buffers)]
+        await self.configure_grab()
+        self._acquiring = True
+        try:
+            for image in itertools.cycle(images):
+                await self.grab(image)
+                yield image
+        finally:
+            # close() may have stopped it already
+            if self._acquiring:
+                await self._stop()
+
+    async def _stop(self):
+        self._acquiring = False
+        try:
+            await self.stop_acquisition()
+        finally:
+            await self.unconfigure_acquisition()
+
+class AsyncAxisCamera:
+    """asyncio interface to an AxisCamera.  Waiting for a frame happens on an
+    executor thread; async iteration yields Frames as they arrive."""
+
+    def __init__(self, camera, executor=None):
+        if not isinstance(camera, AxisCamera):
+            raise TypeError("expected an AxisCamera")
+        self.camera = camera
+        self._own_executor = executor is None
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(1)
+        self.executor = executor
+
+    async def __aenter__(self):
+        self.camera.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        """Stop the camera (joining its thread, on the executor) and raise
+        any error it stopped with."""
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.executor, self.camera.stop)
+        finally:
+            if self._own_executor:
+                self.executor.shutdown(wait=False)
+
+    async def get(self):
+        """Wait for and return the next Frame, or None if the camera is
+        stopped."""
+        frame = self.camera.get()
+        loop = asyncio.get_running_loop()
+        while frame is None and not self.camera.stopped:
+            frame = await loop.run_in_executor(self.executor, self.camera.get,
+                                               self.camera.timeout)
+        return frame
+
+    async def read(self, image):
+        """Wait for the next frame and store it into image.  Returns the
+        frame sequence number, or None if the camera is stopped."""
+        frame = await self.get()
+        if frame is None:
+            return None
+        loop = asyncio.get_running_loop()
+        if frame.image is not None:
+            await loop.run_in_executor(self.executor, core.imaqDuplicate,
+                                       image, frame.image)
+            self.camera.recycle(frame)
+        else:
+            await loop.run_in_executor(self.executor,
+                    private.Priv_ReadJPEGString, image, frame.data)
+        return frame.seq
+
+    def __aiter__(self):
+        return self._frames()
+
+    async def _frames(self):
+        while True:
+            frame = await self.get()
+            if frame is None:
+                return
+            yield frame
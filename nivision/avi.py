@@ -0,0 +1,212 @@
+#
+# Streaming AVI reading and writing
+#
+import queue
+import threading
+from . import core
+
+__all__ = ["AVIReader", "AVIWriter"]
+
+def _encodePath(path):
+    return path.encode("utf-8") if isinstance(path, str) else path
+
+class AVIReader:
+    """Iterates over the frames of an AVI file, decoding them on a
+    background thread so that disk I/O and decoding overlap with processing
+    of earlier frames::
+
+        with AVIReader("capture.avi") as reader:
+            for n, image, data in reader:
+                ...
+
+    Up to readahead frames are decoded ahead of the consumer into a fixed
+    set of recycled images, so an image is only valid until the next frame
+    is requested.  data is the user data stored with the frame, or None if
+    the file has none.  info is the file's AVIInfo."""
+
+    def __init__(self, path, readahead=4, imagetype=None, start=0,
+                 stop=None):
+        self.session = core.imaqOpenAVI(_encodePath(path))
+        self.info = core.imaqGetAVIInfo(self.session)
+        if imagetype is None:
+            imagetype = self.info.imageType
+        self.imagetype = imagetype
+        self.readahead = readahead
+        self.start = start
+        self.stop = self.info.numFrames if stop is None else stop
+        self._free = queue.Queue()
+        for i in range(readahead + 2):
+            self._free.put(core.imaqCreateImage(imagetype))
+        self._ready = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def close(self):
+        """Stop reading ahead and close the file."""
+        self._cancel()
+        if self.session is not None:
+            core.imaqCloseAVI(self.session)
+            self.session = None
+
+    def _cancel(self):
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self, start, stop):
+        session = self.session
+        maxDataSize = self.info.maxDataSize if self.info.hasData else 0
+        image = None
+        result = None
+        try:
+            for n in range(start, stop):
+                while image is None:
+                    if self._stopped.is_set():
+                        return
+                    try:
+                        image = self._free.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+                if self._stopped.is_set():
+                    return
+                data = core.imaqReadAVIFrame(image, session, n, maxDataSize)
+                self._ready.put((n, image, data))
+                image = None
+        except Exception as e:
+            result = e
+        finally:
+            if image is not None:
+                self._free.put(image)
+            # always terminate the consumer's iteration
+            self._ready.put(result)
+
+    def __iter__(self):
+        if self.session is None:
+            raise ValueError("AVI file is closed")
+        self._cancel()
+        self._stopped.clear()
+        self._ready = queue.Queue()
+        self._thread = threading.Thread(target=self._run,
+                args=(self.start, self.stop), name="AVIReader", daemon=True)
+        self._thread.start()
+        current = None
+        try:
+            while True:
+                item = self._ready.get()
+                if current is not None:
+                    self._free.put(current)
+                    current = None
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                current = item[1]
+                yield item
+        finally:
+            if current is not None:
+                self._free.put(current)
+            self._cancel()
+            # recover the images that were read ahead
+            while not self._ready.empty():
+                item = self._ready.get()
+                if isinstance(item, tuple):
+                    self._free.put(item[1])
+
+class AVIWriter:
+    """Writes frames to an AVI file on a background thread, so that
+    compression and disk I/O overlap with acquiring and processing the next
+    frames.
+
+    write() copies the image into one of buffers recycled images and
+    returns immediately, unless all of them are still waiting to be
+    written.  Errors raised by the writer thread are raised by the next
+    write() or by close()."""
+
+    def __init__(self, path, framesPerSecond, compressionFilter=None,
+                 quality=1000, maxDataSize=0, buffers=4):
+        if isinstance(compressionFilter, str):
+            compressionFilter = compressionFilter.encode("utf-8")
+        self.session = core.imaqCreateAVI(_encodePath(path),
+                compressionFilter, quality, framesPerSecond, maxDataSize)
+        self.frames = 0
+        self._images = {}                       # image type -> free images
+        self._buffers = threading.Semaphore(buffers)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="AVIWriter",
+                                        daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _raiseError(self):
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def write(self, image, data=None):
+        """Queue a copy of image (and the bytes data, if the file was created
+        with a maxDataSize) to be written as the next frame."""
+        if self.session is None:
+            raise ValueError("AVI file is closed")
+        self._raiseError()
+        imagetype = core.imaqGetImageType(image)
+        self._buffers.acquire()
+        with self._lock:
+            free = self._images.setdefault(imagetype.value, [])
+            copy = free.pop() if free else core.imaqCreateImage(imagetype)
+        core.imaqDuplicate(copy, image)
+        self._queue.put((copy, data, imagetype.value))
+        self.frames += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            image, data, imagetype = item
+            try:
+                if self._error is None:
+                    core.imaqWriteAVIFrame(image, self.session, data,
+                                           0 if data is None else len(data))
+            except Exception as e:
+                self._error = e
+            finally:
+                with self._lock:
+                    self._images[imagetype].append(image)
+                self._buffers.release()
+                self._queue.task_done()
+
+    def flush(self):
+        """Wait until all queued frames have been written."""
+        self._queue.join()
+        self._raiseError()
+
+    def close(self):
+        """Write the queued frames and close the file."""
+        if self.session is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            core.imaqCloseAVI(self.session)
+        finally:
+            self.session = None
+        self._raiseError()
@@ -1,6 +1,14 @@
+from . import core
 from . import private
+import base64
+import collections
 import socket
-import re
+import threading
+import time
+
+__all__ = ["CameraSettings", "AxisCamera", "Frame", "imaqCameraRead",
+           "CAMERA_READ", "CAMERA_REOPEN", "CAMERA_CLOSE",
+           "FRAME_DROP_OLDEST", "FRAME_DROP_NEWEST"]
 
 class CameraSettings:
     def __init__(self):
@@ -8,65 +16,331 @@ class CameraSettings:
         self.compression = 30
         self.resolution = "320x240" # other valid: 160x120, 640x480
 
-def CameraAuth(address, request):
-    socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    return socket
+# what to drop when a new frame arrives and the frame queue is full
+FRAME_DROP_OLDEST = 0
+FRAME_DROP_NEWEST = 1
+
+class Frame:
+    """A frame received from a camera.  image is the decoded Image if the
+    camera decodes frames, otherwise None."""
+    __slots__ = ("seq", "timestamp", "data", "image")
+
+    def __init__(self, seq, timestamp, data, image=None):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.data = data
+        self.image = image
+
+    def __repr__(self):
+        return "Frame(%d, %f, %d bytes)" % (self.seq, self.timestamp,
+                                            len(self.data))
+
+class AxisCamera:
+    """Streaming client for the MJPEG stream of an Axis camera (or any
+    camera serving multipart JPEG over HTTP).
+
+    A background thread keeps a single connection open, splits the stream
+    into JPEG frames using a reusable buffer, and (if decode is True)
+    decodes each one into an Image.  Up to maxframes frames are queued; when
+    a frame arrives and the queue is full, either the oldest queued frame or
+    the new frame is dropped depending on policy.  With the defaults the
+    queue always holds just the latest frame, and get()/read() never block.
+    The connection is reopened automatically if it fails.  Frames that fail
+    to decode are dropped; any other error stops the camera and is raised by
+    the next get() or read() (once the queued frames have been taken) or by
+    stop()."""
+
+    path = "/axis-cgi/mjpg/video.cgi?fps=%d&compression=%d&resolution=%s"
+
+    def __init__(self, address, settings=None, port=80, user=None,
+                 password=None, maxframes=1, policy=FRAME_DROP_OLDEST,
+                 decode=True, imagetype=core.IMAQ_IMAGE_RGB, timeout=2.0):
+        self.address = address
+        self.port = port
+        self.settings = settings if settings is not None else CameraSettings()
+        self.user = user
+        self.password = password
+        self.maxframes = maxframes
+        self.policy = policy
+        self.decode = decode
+        self.imagetype = imagetype
+        self.timeout = timeout
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.reconnects = 0
+        self._frames = collections.deque()
+        self._free_images = []
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._error = None
+        self._sock = None
+        self._buf = bytearray(64*1024)
+        self._start = 0
+        self._end = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        """Start streaming in a background thread."""
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._error = None
+        self._thread = threading.Thread(target=self._run,
+                name="AxisCamera %s" % self.address, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop streaming and close the connection."""
+        self._stopped.set()
+        self._close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._cond:
+            self._frames.clear()
+            self._cond.notify_all()
+        self._raiseError()
+
+    close = stop
+
+    def _raiseError(self):
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    @property
+    def stopped(self):
+        return self._thread is None or self._stopped.is_set()
+
+    def reopen(self, settings=None):
+        """Reconnect, e.g. to apply changed camera settings."""
+        if settings is not None:
+            self.settings = settings
+        self._close()
+
+    def get(self, timeout=0):
+        """Remove and return the oldest queued Frame (the latest frame with
+        the default settings), waiting up to timeout seconds (forever if
+        None) for one to arrive.  Returns None if no frame is available."""
+        with self._cond:
+            if not self._frames and timeout != 0:
+                self._cond.wait_for(
+                        lambda: self._frames or self._stopped.is_set(),
+                        timeout)
+            if not self._frames:
+                self._raiseError()
+                return None
+            return self._frames.popleft()
+
+    def read(self, image, timeout=0):
+        """Get a frame as per get() and store it into image.  Returns the
+        frame sequence number, or None if no frame was available."""
+        frame = self.get(timeout)
+        if frame is None:
+            return None
+        if frame.image is not None:
+            core.imaqDuplicate(image, frame.image)
+            self._recycle(frame)
+        else:
+            private.Priv_ReadJPEGString(image, frame.data)
+        return frame.seq
+
+    def recycle(self, frame):
+        """Give the decoded image of a frame obtained from get() back for
+        reuse by later frames."""
+        self._recycle(frame)
+
+    def _recycle(self, frame):
+        image, frame.image = frame.image, None
+        if image is not None and len(self._free_images) <= self.maxframes:
+            self._free_images.append(image)
+
+    def _close(self):
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def _run(self):
+        try:
+            while not self._stopped.is_set():
+                try:
+                    self._stream()
+                except (OSError, EOFError, ValueError):
+                    pass
+                self._close()
+                if self._stopped.wait(0.5):
+                    break
+                self.reconnects += 1
+        except Exception as e:
+            # e.g. no JPEG decoder for imagetype: give up and report it
+            self._error = e
+            self._stopped.set()
+            self._close()
+            with self._cond:
+                self._cond.notify_all()
+
+    def _request(self):
+        settings = self.settings
+        request = ["GET %s HTTP/1.0" % (self.path % (settings.fps,
+                        settings.compression, settings.resolution)),
+                   "Host: %s" % self.address]
+        if self.user is not None:
+            auth = "%s:%s" % (self.user, self.password or "")
+            request.append("Authorization: Basic %s" %
+                    base64.b64encode(auth.encode("utf-8")).decode("ascii"))
+        return ("\r\n".join(request) + "\r\n\r\n").encode("utf-8")
+
+    def _stream(self):
+        sock = socket.create_connection((self.address, self.port),
+                                        self.timeout)
+        self._sock = sock
+        self._start = self._end = 0
+        if self._stopped.is_set():
+            return
+        sock.sendall(self._request())
+
+        status = self._readline()
+        if status.split(None, 2)[1:2] != [b"200"]:
+            raise ValueError("camera returned %r" % status)
+        self._readheaders()
+
+        while not self._stopped.is_set():
+            # skip to the next part boundary
+            line = self._readline()
+            if not line.startswith(b"--"):
+                continue
+            headers = self._readheaders()
+            length = int(headers.get(b"content-length", 0))
+            if length:
+                data = self._read(length)
+            else:
+                data = self._read_jpeg()
+            self._deliver(data)
+
+    def _fill(self):
+        """Receive more data into the buffer, making room at the end first
+        by moving unread data to the front or growing the buffer."""
+        buf = self._buf
+        if self._end == len(buf):
+            n = self._end - self._start
+            if self._start == 0:
+                buf.extend(bytes(len(buf)))
+            else:
+                with memoryview(buf) as mv:
+                    buf[:n] = mv[self._start:self._end]
+                self._start, self._end = 0, n
+        with memoryview(buf) as mv:
+            n = self._sock.recv_into(mv[self._end:])
+        if n == 0:
+            raise EOFError("connection closed")
+        self._end += n
+
+    def _readline(self):
+        while True:
+            pos = self._buf.find(b"\r\n", self._start, self._end)
+            if pos >= 0:
+                line = bytes(self._buf[self._start:pos])
+                self._start = pos + 2
+                return line
+            self._fill()
+
+    def _readheaders(self):
+        headers = {}
+        while True:
+            line = self._readline()
+            if not line:
+                return headers
+            name, sep, value = line.partition(b":")
+            headers[name.strip().lower()] = value.strip()
+
+    def _read(self, n):
+        while self._end - self._start < n:
+            self._fill()
+        with memoryview(self._buf) as mv:
+            data = bytes(mv[self._start:self._start+n])
+        self._start += n
+        return data
+
+    def _read_jpeg(self):
+        # no Content-Length; read up to the JPEG end of image marker
+        while True:
+            pos = self._buf.find(b"\xff\xd9", self._start, self._end)
+            if pos >= 0:
+                return self._read(pos + 2 - self._start)
+            self._fill()
+
+    def _deliver(self, data):
+        # frames_received is only counted once the frame has been queued or
+        # dropped
+        frame = Frame(self.frames_received + 1, time.time(), data)
+        try:
+            self._queue(frame)
+        finally:
+            self.frames_received += 1
+
+    def _queue(self, frame):
+        data = frame.data
+        if (self.policy == FRAME_DROP_NEWEST
+                and len(self._frames) >= self.maxframes):
+            self.frames_dropped += 1
+            return
+        if self.decode:
+            try:
+                image = self._free_images.pop()
+            except IndexError:
+                image = core.imaqCreateImage(self.imagetype)
+            try:
+                private.Priv_ReadJPEGString(image, data)
+            except core.ImaqError:
+                self.frames_dropped += 1
+                self._free_images.append(image)
+                return
+            frame.image = image
+        with self._cond:
+            while len(self._frames) >= self.maxframes:
+                self.frames_dropped += 1
+                if self.policy == FRAME_DROP_NEWEST:
+                    self._recycle(frame)
+                    return
+                self._recycle(self._frames.popleft())
+            self._frames.append(frame)
+            self._cond.notify_all()
 
 CAMERA_READ = 0
 CAMERA_REOPEN = 1
 CAMERA_CLOSE = 2
 
-def imaqCameraRead(image, address, settings=None, operation=CAMERA_READ):
-    """Request that the Axis camera send an mjpg stream.  Locates the separator
-    between jpg frames, extracts and decodes the jpg image.  Reopen is used
-    when camera settings are changed."""
-    if not hasattr(imaqCameraRead, "socket"):
-        self.socket = None
-        self.f = None
+_cameras = {}
 
+def imaqCameraRead(image, address, settings=None, operation=CAMERA_READ):
+    """Request that the Axis camera send an mjpg stream and read the next
+    frame into image.  Reopen is used when camera settings are changed.
+    This is a compatibility wrapper around AxisCamera, which should be used
+    directly for non-blocking access."""
     if operation == CAMERA_CLOSE:
-        # Close the session
-        if self.socket is not None:
-            self.socket.close()
-            self.socket = None
+        # forget the camera even if stop() raises the error it stopped with
+        camera = _cameras.pop(address, None)
+        if camera is not None:
+            camera.stop()
         return
 
-    # If we don't have a connection, or are asked to reopen, close and redo the
-    # CGI request
-    if self.socket is None or operation == CAMERA_REOPEN:
-        if self.socket is not None:
-            self.socket.close()
-        request = "GET /axis-cgi/mjpg/video.cgi?fps=%d&compression=%d&resolution=%s"
-        self.socket = CameraAuth(address,
-                request % (settings.fps, settings.compression,
-                           settings.resolution))
-        if self.socket is not None:
-            self.socket.settimeout(2)
-            self.f = self.socket.makefile()
-
-    # Read through a few header lines looking for the length descriptor
-    len = 0
-    if self.socket is not None:
-        try:
-            for line in range(3):
-                s = self.f.readline()
-                m = re.search(r"Content-Length:[ ]*([0-9]+)", s)
-                if m is not None:
-                    len = int(m.group(1))
-                    break
-        except socket.timeout:
-            self.socket.close()
-            self.socket = None
-
-    data = ""
-    if self.socket is not None and len != 0:
-        try:
-            data = self.f.read(len)
-        except socket.timeout:
-            data = ""
-            self.socket.close()
-            self.socket = None
+    camera = _cameras.get(address)
 
-    if data:
-        private.Priv_ReadJPEGString(image, data)
+    if camera is None:
+        camera = _cameras[address] = AxisCamera(address, settings)
+        camera.start()
+    elif operation == CAMERA_REOPEN:
+        camera.reopen(settings)
 
+    camera.read(image, timeout=camera.timeout)
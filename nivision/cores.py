@@ -0,0 +1,165 @@
+#
+# Core budget scheduling
+#
+import concurrent.futures
+import os
+import threading
+import time
+import weakref
+from . import core
+
+__all__ = ["CoreScheduler", "CORES_THROUGHPUT", "CORES_LATENCY",
+           "CORES_FIXED"]
+
+# NI Vision runs single threaded; all cores go to frames in parallel
+CORES_THROUGHPUT = "throughput"
+# each pipeline processes one frame at a time; NI Vision gets the cores
+CORES_LATENCY = "latency"
+# NI Vision gets imaqcores cores; the rest are split between pipelines
+CORES_FIXED = "fixed"
+
+class CoreScheduler:
+    """Divides the machine's cores between NI Vision's internal
+    multithreading and the worker threads of concurrently running pipelines,
+    so that they don't oversubscribe the CPU.
+
+    The number of cores NI Vision uses (imaqSetCores) is process-global, so
+    it is set by the scheduler according to the policy.  Attached pipelines
+    share the scheduler's thread pool, and each gets a share of the
+    remaining worker budget, proportional to its weight, as its inflight
+    frame count.  Changes take effect immediately, including for pipelines
+    that are already running."""
+
+    def __init__(self, policy=CORES_THROUGHPUT, cores=None, imaqcores=None):
+        self.cores = cores or os.cpu_count() or 1
+        self.policy = policy
+        self.fixedcores = imaqcores
+        self.imaqcores = None
+        self.workers = None
+        self.executor = concurrent.futures.ThreadPoolExecutor(self.cores)
+        self._pipelines = weakref.WeakKeyDictionary()  # pipeline -> weight
+        self._lock = threading.Lock()
+        self._savedcores = core.imaqGetCores()
+        self.rebalance()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Detach all pipelines, shut down the thread pool and restore the
+        number of cores NI Vision used before."""
+        with self._lock:
+            self._pipelines.clear()
+        self.executor.shutdown()
+        core.imaqSetCores(self._savedcores)
+
+    def attach(self, pipeline, weight=1):
+        """Run pipeline on the scheduler's thread pool with a share of the
+        worker budget."""
+        if pipeline.executor is not self.executor:
+            if pipeline._own_executor and pipeline.executor is not None:
+                pipeline.executor.shutdown()
+            pipeline.executor = self.executor
+            pipeline._own_executor = False
+        with self._lock:
+            self._pipelines[pipeline] = weight
+        self.rebalance()
+
+    def detach(self, pipeline):
+        with self._lock:
+            self._pipelines.pop(pipeline, None)
+        self.rebalance()
+
+    def set_policy(self, policy, imaqcores=None):
+        """Change the policy and rebalance.  If that fails (e.g. an unknown
+        policy), the previous policy is kept."""
+        saved = (self.policy, self.fixedcores)
+        self.policy = policy
+        if imaqcores is not None:
+            self.fixedcores = imaqcores
+        try:
+            self.rebalance()
+        except Exception:
+            self.policy, self.fixedcores = saved
+            raise
+
+    def rebalance(self):
+        """Recompute the NI Vision core count and the pipeline shares."""
+        with self._lock:
+            pipelines = list(self._pipelines.items())
+            n = max(len(pipelines), 1)
+            if self.policy == CORES_THROUGHPUT:
+                imaqcores = 1
+                workers = self.cores
+            elif self.policy == CORES_LATENCY:
+                imaqcores = max(1, self.cores // n)
+                workers = n
+            elif self.policy == CORES_FIXED:
+                if self.fixedcores is None:
+                    raise ValueError("CORES_FIXED requires imaqcores")
+                imaqcores = max(1, min(self.fixedcores, self.cores))
+                workers = max(n, self.cores // imaqcores)
+            else:
+                raise ValueError("unknown policy %r" % (self.policy,))
+            self.imaqcores = imaqcores
+            self.workers = workers
+            core.imaqSetCores(imaqcores)
+            for pipeline, share in zip((p for p, w in pipelines),
+                    self._split(workers, [w for p, w in pipelines])):
+                pipeline.inflight = share
+
+    @staticmethod
+    def _split(total, weights):
+        """Split total between weights (largest remainder), at least 1 each."""
+        if not weights:
+            return []
+        wsum = sum(weights)
+        exact = [total*w/wsum for w in weights]
+        shares = [max(1, int(x)) for x in exact]
+        order = sorted(range(len(weights)), key=lambda i: int(exact[i]) - exact[i])
+        for i in order[:max(0, total - sum(shares))]:
+            shares[i] += 1
+        return shares
+
+    def benchmark(self, pipeline, frames, policies=None, select=True):
+        """Run frames (a list of images) through pipeline under each policy
+        (by default throughput, latency, and fixed splits giving NI Vision
+        2, 4, ... cores) and return a dict of policy to frames per second.
+        Fixed splits are keyed as (CORES_FIXED, imaqcores).  If select is
+        true the fastest policy is kept, otherwise the current one is
+        restored."""
+        if policies is None:
+            policies = [CORES_THROUGHPUT, CORES_LATENCY]
+            n = 2
+            while n < self.cores:
+                policies.append((CORES_FIXED, n))
+                n *= 2
+        saved = (self.policy, self.fixedcores)
+        if pipeline not in self._pipelines:
+            self.attach(pipeline)
+        results = {}
+        try:
+            for policy in policies:
+                if isinstance(policy, tuple):
+                    self.set_policy(*policy)
+                else:
+                    self.set_policy(policy)
+                for result in pipeline.map(frames[:1]):
+                    pass    # warm up
+                start = time.perf_counter()
+                for result in pipeline.map(frames):
+                    pass
+                results[policy] = len(frames) / (time.perf_counter() - start)
+        finally:
+            if select and results:
+                best = max(results, key=results.get)
+                if isinstance(best, tuple):
+                    self.set_policy(*best)
+                else:
+                    self.set_policy(best)
+            else:
+                self.set_policy(*saved)
+        return results
@@ -0,0 +1,204 @@
+#
+# Shared memory frame transport
+#
+import ctypes
+import os
+import struct
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+from . import core
+
+__all__ = ["FrameBus"]
+
+_MAGIC = b"NIFB"
+# magic, version, number of slots, slot data size, latest sequence number
+_busHeader = struct.Struct("<4sIIIQ")
+_LATEST_OFFSET = 16
+# sequence number (odd while being written), image type, width, height,
+# stride (bytes per row), data size, timestamp
+_slotHeader = struct.Struct("<QIIIIQd")
+_HEADER_SIZE = 64
+_SLOT_HEADER_SIZE = 64
+# names of the buses created by this process
+_created = set()
+
+def _align(n, alignment=64):
+    return (n + alignment - 1) // alignment * alignment
+
+class FrameBus:
+    """Publishes image pixel data through a ring of shared memory slots, so
+    that worker processes can read frames without pickling.
+
+    The publishing process creates the bus; workers attach to it by name::
+
+        bus = FrameBus(create=True, slots=8, slotsize=640*480*4)
+        seq = bus.publish(image)
+
+        bus = FrameBus(name)            # in a worker process
+        seq, image = bus.read(image, seq, timeout=1.0)
+
+    Each slot has a small header with the image type, size, stride and
+    sequence number of the frame it holds, followed by its rows of pixels.
+    Frame seq (counting from 1) is stored in slot seq % slots, so a reader
+    must keep up within slots frames of the publisher; read() detects
+    frames that were overwritten before or while they were copied.  There
+    must only be one publisher."""
+
+    def __init__(self, name=None, create=False, slots=4, slotsize=None):
+        if create:
+            if slotsize is None:
+                raise ValueError("slotsize is required to create a bus")
+            self.slots = slots
+            self.slotsize = _align(slotsize)
+            self._stride = _SLOT_HEADER_SIZE + self.slotsize
+            self.shm = shared_memory.SharedMemory(name, create=True,
+                    size=_HEADER_SIZE + self._stride*slots)
+            _busHeader.pack_into(self.shm.buf, 0, _MAGIC, 1, slots,
+                                 self.slotsize, 0)
+            _created.add(self.shm.name)
+        else:
+            # the creator is responsible for unlinking
+            try:
+                self.shm = shared_memory.SharedMemory(name, track=False)
+            except TypeError:
+                # before Python 3.13 attaching registers the segment with
+                # the resource tracker, which unlinks it (and warns about a
+                # leak) when the tracker's processes exit.  That is the
+                # creator's tracker in the creating process and its
+                # multiprocessing children; undo it in any other process.
+                self.shm = shared_memory.SharedMemory(name)
+                if (os.name == "posix" and self.shm.name not in _created
+                        and multiprocessing.parent_process() is None):
+                    from multiprocessing import resource_tracker
+                    resource_tracker.unregister(self.shm._name,
+                                                "shared_memory")
+            magic, version, self.slots, self.slotsize, latest = \
+                    _busHeader.unpack_from(self.shm.buf, 0)
+            if magic != _MAGIC or version != 1:
+                self.shm.close()
+                raise ValueError("%s is not a frame bus" % name)
+            self._stride = _SLOT_HEADER_SIZE + self.slotsize
+        self.name = self.shm.name
+        self._owner = create
+        self._seq = 0
+        self._base = ctypes.c_char.from_buffer(self.shm.buf)
+        self._address = ctypes.addressof(self._base)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Detach from the shared memory, and remove it if this is the
+        publishing side.  Views returned by view() must be released
+        first."""
+        if self.shm is None:
+            return
+        self._base = None
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+            _created.discard(self.name)
+        self.shm = None
+
+    @property
+    def latest(self):
+        """The sequence number of the most recently published frame (0 if
+        none)."""
+        return _busHeader.unpack_from(self.shm.buf, 0)[4]
+
+    def _slotOffset(self, seq):
+        return _HEADER_SIZE + (seq % self.slots)*self._stride
+
+    def publish(self, image, timestamp=None):
+        """Copy the pixels of image into the next slot and return its
+        sequence number."""
+        info = core.imaqGetImageInfo(image)
+        bpp = core.imaqGetBytesPerPixel(image)
+        cols, rows = info.xRes, info.yRes
+        linebytes = cols*bpp
+        size = linebytes*rows
+        if size > self.slotsize:
+            raise ValueError("%dx%d image does not fit in a %d byte slot" %
+                             (cols, rows, self.slotsize))
+        seq = self._seq + 1
+        buf = self.shm.buf
+        offset = self._slotOffset(seq)
+        dest = self._address + offset + _SLOT_HEADER_SIZE
+        # odd sequence number marks the slot as being written
+        struct.pack_into("<Q", buf, offset, 2*seq - 1)
+        stride = info.pixelsPerLine*bpp
+        if stride == linebytes:
+            ctypes.memmove(dest, info.imageStart, size)
+        else:
+            for row in range(rows):
+                ctypes.memmove(dest + row*linebytes,
+                               info.imageStart + row*stride, linebytes)
+        _slotHeader.pack_into(buf, offset, 2*seq, info.imageType.value, cols,
+                rows, linebytes, size,
+                time.time() if timestamp is None else timestamp)
+        struct.pack_into("<Q", buf, _LATEST_OFFSET, seq)
+        self._seq = seq
+        return seq
+
+    def header(self, seq):
+        """Return (image type, width, height, stride, size, timestamp) of
+        frame seq, or None if the slot doesn't (or no longer) hold it."""
+        fields = _slotHeader.unpack_from(self.shm.buf, self._slotOffset(seq))
+        if fields[0] != 2*seq:
+            return None
+        return (core.ImageType(fields[1]),) + fields[2:]
+
+    def _wait(self, seq, timeout):
+        if seq is None:
+            return self.latest or None
+        if self.latest < seq and timeout != 0:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self.latest < seq:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return None
+                time.sleep(0.0005)
+        return seq if self.latest >= seq else None
+
+    def read(self, image=None, seq=None, timeout=0):
+        """Copy frame seq (by default the latest) into image, resizing it,
+        waiting up to timeout seconds (forever if None) for the frame to be
+        published.  If image is None, an image of the frame's type is
+        created.  Returns (seq, image), or None if the frame is not
+        available or was overwritten."""
+        seq = self._wait(seq, timeout)
+        if seq is None:
+            return None
+        header = self.header(seq)
+        if header is None:
+            return None
+        imagetype, cols, rows, stride, size, timestamp = header
+        if image is None:
+            image = core.imaqCreateImage(imagetype)
+        elif core.imaqGetImageType(image) != imagetype:
+            raise ValueError("frame is of type %r" % (imagetype,))
+        offset = self._slotOffset(seq) + _SLOT_HEADER_SIZE
+        with self.shm.buf[offset:offset+size] as data:
+            core.imaqArrayToImage(image, data, cols, rows)
+        if self.header(seq) is None:
+            # overwritten while copying
+            return None
+        return seq, image
+
+    def view(self, seq=None):
+        """Return (seq, header, memoryview of the pixel rows) for frame seq
+        (by default the latest) without copying, or None if it's not
+        available.  The data may be overwritten by the publisher at any
+        time; check that header(seq) is not None after using it.  Release
+        the view before closing the bus."""
+        seq = self._wait(seq, 0)
+        if seq is None:
+            return None
+        header = self.header(seq)
+        if header is None:
+            return None
+        offset = self._slotOffset(seq) + _SLOT_HEADER_SIZE
+        return seq, header, self.shm.buf[offset:offset+header[4]]
@@ -0,0 +1,546 @@
+#
+# IMAQdx helpers
+#
+import collections
+import concurrent.futures
+import json
+import queue
+import threading
+import time
+import traceback
+from . import core
+
+__all__ = ["IMAQdxAttributeCache", "IMAQdxSnapshotCameras",
+           "IMAQdxDumpProfile", "IMAQdxLoadProfile", "IMAQdxRingAcquisition",
+           "IMAQdxFrameDispatcher"]
+
+# attribute types that have a minimum, maximum and increment
+_numericTypes = frozenset(t.value for t in (core.IMAQdxAttributeTypeU32,
+                                            core.IMAQdxAttributeTypeI64,
+                                            core.IMAQdxAttributeTypeF64))
+# attribute types that have a value (not commands or blobs)
+_valueTypes = _numericTypes | frozenset(t.value for t in (
+        core.IMAQdxAttributeTypeString, core.IMAQdxAttributeTypeEnum,
+        core.IMAQdxAttributeTypeBool))
+
+def _plainValue(attrtype, value):
+    """Convert an attribute value to a JSON-compatible value that can be
+    passed back to IMAQdxSetAttribute."""
+    if attrtype == core.IMAQdxAttributeTypeEnum:
+        return value.Value
+    elif attrtype == core.IMAQdxAttributeTypeString:
+        return value.decode("utf-8")
+    elif attrtype == core.IMAQdxAttributeTypeBool:
+        return bool(value)
+    return value
+
+class _Attribute:
+    __slots__ = ("name", "key", "type", "readable", "writable", "limits")
+
+    def __init__(self, name, key, type, readable=True, writable=True):
+        self.name = name
+        self.key = key
+        self.type = type
+        self.readable = readable
+        self.writable = writable
+        self.limits = None
+
+    def __repr__(self):
+        return "<attribute %s (%s%s) %r>" % (self.name,
+                "R" if self.readable else " ", "W" if self.writable else " ",
+                self.type)
+
+class IMAQdxAttributeCache:
+    """Attribute information of an IMAQdx session, so that getting or
+    setting an attribute is a single native call.
+
+    IMAQdxGetAttribute() and IMAQdxSetAttribute() look up the type of the
+    attribute before every read or write.  The cache enumerates the
+    session's attributes once (IMAQdxEnumerateAttributes3) and keeps each
+    attribute's type, readable/writable flags and UTF-8 encoded name; the
+    minimum, maximum and increment of numeric attributes are read the first
+    time limits() is asked for them.  Attribute names may be given as str or
+    bytes.  Attributes that were not enumerated have their type looked up
+    once, on first use::
+
+        attrs = IMAQdxAttributeCache(id)
+        attrs.set_many({"CameraAttributes::Shutter::Value": shutter,
+                        "CameraAttributes::Gain::Value": gain})
+
+    Some cameras change the limits of an attribute when other attributes
+    change (e.g. the maximum exposure with the frame rate); call
+    invalidate() to discard cached limits, or refresh() to enumerate the
+    attributes again (e.g. after changing the video mode)."""
+
+    def __init__(self, id, root=b"",
+                 visibility=core.IMAQdxAttributeVisibilityAdvanced):
+        self.id = id
+        self.root = root.encode("utf-8") if isinstance(root, str) else root
+        self.visibility = visibility
+        self._attrs = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """Enumerate the session's attributes again."""
+        attrs = {}
+        for info in core.IMAQdxEnumerateAttributes3(self.id, self.root,
+                                                    self.visibility):
+            key = info.Name
+            name = key.decode("utf-8")
+            attrs[name] = attrs[key] = _Attribute(name, key, info.Type,
+                    bool(info.Readable), bool(info.Writable))
+        with self._lock:
+            self._attrs = attrs
+
+    def invalidate(self):
+        """Discard the cached limits of all attributes."""
+        for attr in list(self._attrs.values()):
+            attr.limits = None
+
+    def attribute(self, name):
+        """Return the cached information about an attribute, an object with
+        name, key (the encoded name), type, readable and writable
+        attributes."""
+        try:
+            return self._attrs[name]
+        except KeyError:
+            pass
+        if isinstance(name, str):
+            key = name.encode("utf-8")
+        else:
+            key = bytes(name)
+            name = key.decode("utf-8")
+        attr = _Attribute(name, key, core.IMAQdxGetAttributeType(self.id, key))
+        with self._lock:
+            attr = self._attrs.setdefault(key, attr)
+            self._attrs.setdefault(name, attr)
+        return attr
+
+    def names(self):
+        """Return the names of the known attributes."""
+        return [name for name in self._attrs if isinstance(name, str)]
+
+    def __contains__(self, name):
+        return name in self._attrs
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def __setitem__(self, name, value):
+        self.set(name, value)
+
+    def type(self, name):
+        return self.attribute(name).type
+
+    def get(self, name):
+        """Get the value of an attribute (see IMAQdxGetAttribute)."""
+        attr = self.attribute(name)
+        return core._IMAQdxAttrGetter(self.id, attr.key,
+                core._IMAQdxGetAttribute, attr.type)
+
+    def set(self, name, value):
+        """Set the value of an attribute (see IMAQdxSetAttribute)."""
+        attr = self.attribute(name)
+        core._IMAQdxAttrSetter(self.id, attr.key, value, attr.type)
+
+    def limits(self, name):
+        """Return the (minimum, maximum, increment) of a numeric
+        attribute."""
+        attr = self.attribute(name)
+        limits = attr.limits
+        if limits is None:
+            if attr.type.value not in _numericTypes:
+                raise TypeError("attribute %s of type %s has no limits" %
+                                (attr.name, attr.type))
+            limits = tuple(core._IMAQdxAttrGetter(self.id, attr.key, func,
+                                                  attr.type)
+                    for func in (core._IMAQdxGetAttributeMinimum,
+                                 core._IMAQdxGetAttributeMaximum,
+                                 core._IMAQdxGetAttributeIncrement))
+            attr.limits = limits
+        return limits
+
+    def get_many(self, names):
+        """Get the values of several attributes.  Returns a dict of name to
+        value."""
+        id = self.id
+        getter = core._IMAQdxAttrGetter
+        func = core._IMAQdxGetAttribute
+        values = {}
+        for name in names:
+            attr = self.attribute(name)
+            values[name] = getter(id, attr.key, func, attr.type)
+        return values
+
+    def set_many(self, values):
+        """Set several attributes, in order, from a dict (or an iterable of
+        (name, value) pairs)."""
+        if hasattr(values, "items"):
+            values = values.items()
+        id = self.id
+        setter = core._IMAQdxAttrSetter
+        for name, value in values:
+            attr = self.attribute(name)
+            setter(id, attr.key, value, attr.type)
+
+    def snapshot(self):
+        """Read every readable attribute once and return a profile: a dict
+        of attribute name to value (enum attributes as their integer value)
+        in enumeration order.  Attributes that can't be read in the
+        session's current state are left out."""
+        id = self.id
+        getter = core._IMAQdxAttrGetter
+        func = core._IMAQdxGetAttribute
+        profile = {}
+        for name, attr in list(self._attrs.items()):
+            if (not isinstance(name, str) or not attr.readable
+                    or attr.type.value not in _valueTypes):
+                continue
+            try:
+                value = getter(id, attr.key, func, attr.type)
+            except core.ImaqError:
+                continue
+            profile[name] = _plainValue(attr.type, value)
+        return profile
+
+    def restore(self, profile):
+        """Set the attributes of a profile returned by snapshot(), skipping
+        those that already have the profile's value.  Attributes are set in
+        profile order; ones that fail (e.g. because they depend on a later
+        attribute) are retried until no more succeed.  Returns a dict of the
+        attributes that could not be restored to the exception raised."""
+        current = self.snapshot()
+        pending = []
+        for name, value in profile.items():
+            if current.get(name) == value:
+                continue
+            attr = self._attrs.get(name)
+            if attr is None or not attr.writable:
+                continue
+            if attr.type == core.IMAQdxAttributeTypeString:
+                value = value.encode("utf-8")
+            pending.append((attr, value))
+        failed = {}
+        while pending:
+            retry = []
+            for attr, value in pending:
+                try:
+                    core._IMAQdxAttrSetter(self.id, attr.key, value,
+                                           attr.type)
+                except core.ImaqError as e:
+                    failed[attr.name] = e
+                    retry.append((attr, value))
+                else:
+                    failed.pop(attr.name, None)
+            if len(retry) == len(pending):
+                break
+            pending = retry
+        return failed
+
+def IMAQdxDumpProfile(profile):
+    """Serialize a profile returned by IMAQdxAttributeCache.snapshot() to
+    compact UTF-8 encoded JSON."""
+    return json.dumps(profile, separators=(",", ":")).encode("utf-8")
+
+def IMAQdxLoadProfile(data):
+    """Load a profile serialized by IMAQdxDumpProfile()."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode("utf-8")
+    return json.loads(data)
+
+def _snapshotCamera(name, mode):
+    if isinstance(name, str):
+        name = name.encode("utf-8")
+    id = core.IMAQdxOpenCamera(name, mode)
+    try:
+        return IMAQdxAttributeCache(id).snapshot()
+    finally:
+        core.IMAQdxCloseCamera(id)
+
+def IMAQdxSnapshotCameras(names, workers=None,
+                          mode=core.IMAQdxCameraControlModeController):
+    """Open each of the named cameras, snapshot its attributes and close it
+    again, for several cameras concurrently (the native calls release the
+    GIL).  Returns a dict of camera name to profile, or to the exception
+    raised if the camera could not be snapshotted."""
+    names = list(names)
+    profiles = {}
+    with concurrent.futures.ThreadPoolExecutor(
+            workers or max(len(names), 1)) as executor:
+        futures = [(name, executor.submit(_snapshotCamera, name, mode))
+                   for name in names]
+        for name, future in futures:
+            try:
+                profiles[name] = future.result()
+            except core.ImaqError as e:
+                profiles[name] = e
+    return profiles
+
+class IMAQdxRingAcquisition:
+    """Continuous acquisition from an IMAQdx session into a fixed ring of
+    preallocated Images, with statistics on dropped frames and latency.
+
+    A background thread configures a continuous acquisition with buffers
+    driver buffers and repeatedly calls IMAQdxGetImage with the buffer
+    number mode (IMAQdxBufferNumberModeNext for every buffer in order,
+    IMAQdxBufferNumberModeLast for the newest buffer, or
+    IMAQdxBufferNumberModeBufferNumber to request the buffer after the last
+    one explicitly), copying each buffer into the next free Image of the
+    ring.  get() returns the oldest queued (buffer number, image) pair; the
+    image is only valid until the next call to get().  When the consumer
+    falls behind and no Image is free, the oldest queued frame is
+    overwritten.
+
+    Dropped frames are counted in two places: dropped counts buffers the
+    driver skipped or overwrote before they were read (gaps in the buffer
+    numbers), and overwritten counts frames that were read but overwritten
+    in the ring before get() returned them.  stats() also reports the queue
+    depth and percentiles of the latency from IMAQdxGetImage returning to
+    get() returning the frame.  No other IMAQdx calls should be made on the
+    session while the acquisition is running."""
+
+    def __init__(self, id, ring=4, buffers=None,
+                 imagetype=core.IMAQ_IMAGE_RGB,
+                 mode=core.IMAQdxBufferNumberModeNext, latencies=1000):
+        if ring < 2:
+            raise ValueError("ring must hold at least 2 images")
+        self.id = id
+        self.buffers = buffers or ring
+        self.mode = mode
+        self.images = [core.imaqCreateImage(imagetype) for i in range(ring)]
+        self._free = list(self.images)
+        self._queue = collections.deque()   # (buffer number, image, time)
+        self._current = None
+        self._latencies = collections.deque(maxlen=latencies)
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._error = None
+        self.reset_stats()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_stats(self):
+        with self._cond:
+            self.frames = 0
+            self.dropped = 0
+            self.overwritten = 0
+            self._latencies.clear()
+
+    def start(self):
+        """Configure and start the acquisition, and start the acquisition
+        thread."""
+        if self._thread is not None:
+            return
+        core.IMAQdxConfigureAcquisition(self.id, 1, self.buffers)
+        try:
+            core.IMAQdxStartAcquisition(self.id)
+        except BaseException:
+            core.IMAQdxUnconfigureAcquisition(self.id)
+            raise
+        self._stopped.clear()
+        self._error = None
+        self._thread = threading.Thread(target=self._run,
+                name="IMAQdxRingAcquisition %s" % self.id, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop and unconfigure the acquisition.  Queued frames are
+        discarded."""
+        if self._thread is None:
+            return
+        self._stopped.set()
+        try:
+            # makes a pending IMAQdxGetImage return
+            core.IMAQdxStopAcquisition(self.id)
+        finally:
+            self._thread.join()
+            self._thread = None
+            core.IMAQdxUnconfigureAcquisition(self.id)
+            with self._cond:
+                self._free.extend(image for n, image, t in self._queue)
+                self._queue.clear()
+                self._cond.notify_all()
+
+    close = stop
+
+    def _run(self):
+        last = None
+        # after getting the same buffer again, block until the next one
+        wait_next = False
+        getImage = core.IMAQdxGetImage
+        id = self.id
+        mode = self.mode
+        cond = self._cond
+        queue = self._queue
+        free = self._free
+        while not self._stopped.is_set():
+            with cond:
+                if free:
+                    image = free.pop()
+                else:
+                    # consumer is behind: overwrite the oldest queued frame
+                    n, image, t = queue.popleft()
+                    self.overwritten += 1
+            try:
+                if wait_next:
+                    actual = getImage(id, image,
+                            core.IMAQdxBufferNumberModeBufferNumber, last + 1)
+                else:
+                    actual = getImage(id, image, mode,
+                                      0 if last is None else last + 1)
+            except core.ImaqError as e:
+                with cond:
+                    free.append(image)
+                    if not self._stopped.is_set():
+                        self._error = e
+                        self._stopped.set()
+                    cond.notify_all()
+                return
+            now = time.perf_counter()
+            with cond:
+                if last is not None and actual <= last:
+                    # the newest buffer again (IMAQdxBufferNumberModeLast)
+                    free.append(image)
+                    wait_next = True
+                    continue
+                wait_next = False
+                self.frames += 1
+                if last is not None and actual > last + 1:
+                    self.dropped += actual - last - 1
+                last = actual
+                queue.append((actual, image, now))
+                cond.notify()
+
+    def get(self, timeout=None):
+        """Return the oldest queued frame as (buffer number, image),
+        waiting up to timeout seconds (forever if None).  Returns None if no
+        frame is available.  Raises the error that stopped the acquisition
+        thread, if any."""
+        with self._cond:
+            if self._current is not None:
+                self._free.append(self._current)
+                self._current = None
+            if not self._queue and timeout != 0:
+                self._cond.wait_for(
+                        lambda: self._queue or self._stopped.is_set(),
+                        timeout)
+            if not self._queue:
+                if self._error is not None:
+                    raise self._error
+                return None
+            n, image, t = self._queue.popleft()
+            self._current = image
+            self._latencies.append(time.perf_counter() - t)
+            return n, image
+
+    def __iter__(self):
+        while True:
+            frame = self.get()
+            if frame is None:
+                return
+            yield frame
+
+    @property
+    def queued(self):
+        """The number of frames waiting to be returned by get()."""
+        return len(self._queue)
+
+    def stats(self, percentiles=(50, 90, 99, 100)):
+        """Return a dict with the frames, dropped and overwritten counts,
+        the current queue depth (queued), and latency, a dict of each
+        percentile to the latency in seconds of the frames most recently
+        returned by get()."""
+        with self._cond:
+            latencies = sorted(self._latencies)
+            stats = {"frames": self.frames, "dropped": self.dropped,
+                     "overwritten": self.overwritten,
+                     "queued": len(self._queue)}
+        latency = {}
+        if latencies:
+            for p in percentiles:
+                i = min(len(latencies) - 1, int(len(latencies) * p / 100))
+                latency[p] = latencies[i]
+        stats["latency"] = latency
+        return stats
+
+class IMAQdxFrameDispatcher:
+    """Delivers the frame done events (IMAQdxRegisterFrameDoneEvent) of any
+    number of IMAQdx sessions to Python handlers on a single dispatcher
+    thread, instead of a thread per camera polling IMAQdxGrab.
+
+    The native callback only queues the event; handler(id, bufferNumber)
+    is then called on the dispatcher thread, or submitted to executor if
+    one is given.  A handler typically reads the buffer with
+    IMAQdxGetImage(id, image, IMAQdxBufferNumberModeBufferNumber,
+    bufferNumber).  The acquisition must be configured and started by the
+    caller.  events counts the events received."""
+
+    def __init__(self, executor=None):
+        self.executor = executor
+        self.events = 0
+        self._handlers = {}     # session id -> handler
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run,
+                name="IMAQdxFrameDispatcher", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def register(self, id, handler, interval=1):
+        """Call handler(id, bufferNumber) every interval buffers acquired
+        by the session."""
+        self._handlers[getattr(id, "value", id)] = handler
+        core.IMAQdxRegisterFrameDoneEvent(id, interval, self._callback)
+
+    def unregister(self, id):
+        core.IMAQdxRegisterFrameDoneEvent(id, 1, None)
+        self._handlers.pop(getattr(id, "value", id), None)
+
+    def close(self):
+        """Unregister all sessions and stop the dispatcher thread once the
+        events already queued have been handled."""
+        for id in list(self._handlers):
+            self.unregister(id)
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def queued(self):
+        """The number of events waiting to be dispatched."""
+        return self._queue.qsize()
+
+    def _callback(self, id, bufferNumber, callbackData):
+        # runs on an IMAQdx thread: do as little as possible
+        self._queue.put((id, bufferNumber))
+        return 1
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                return
+            self.events += 1
+            id, bufferNumber = event
+            handler = self._handlers.get(id)
+            if handler is None:
+                continue
+            if self.executor is not None:
+                self.executor.submit(handler, id, bufferNumber)
+                continue
+            try:
+                handler(id, bufferNumber)
+            except Exception:
+                traceback.print_exc()
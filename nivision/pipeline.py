@@ -0,0 +1,192 @@
+#
+# Vision pipelines
+#
+import collections
+import concurrent.futures
+import os
+import threading
+from . import core
+
+__all__ = ["Pipeline"]
+
+class _Placeholder:
+    def __init__(self, name):
+        self.name = name
+    def __repr__(self):
+        return "Pipeline.%s" % self.name
+
+class _Step:
+    __slots__ = ("func", "args", "kwargs", "imagetype")
+
+    def __init__(self, func, args, kwargs, imagetype):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.imagetype = imagetype
+
+class Pipeline:
+    """An ordered sequence of imaq operations run on each frame.
+
+    Each step is a function and its arguments, in which the placeholders
+    Pipeline.SOURCE (the frame being processed), Pipeline.PREV (the image
+    output by the previous step, initially the frame) and Pipeline.DEST (a
+    new intermediate image of type imagetype, by default the type of PREV)
+    stand for images::
+
+        pipe = Pipeline(sourcetype=IMAQ_IMAGE_RGB)
+        pipe.step(imaqColorThreshold, Pipeline.DEST, Pipeline.SOURCE, 1,
+                  IMAQ_RGB, red, green, blue, imagetype=IMAQ_IMAGE_U8)
+        pipe.step(imaqMorphology, Pipeline.DEST, Pipeline.PREV, IMAQ_DILATE,
+                  None)
+        pipe.step(imaqMeasureParticles, Pipeline.PREV,
+                  IMAQ_CALIBRATION_MODE_PIXEL, [IMAQ_MT_AREA])
+        for report in pipe.map(frames):
+            ...
+
+    The intermediate images are allocated once, when the pipeline is built:
+    two per image type, which successive DEST steps alternate between.  Up
+    to inflight frames are processed concurrently on a pool of worker
+    threads (ctypes releases the GIL during imaq calls), each with its own
+    set of intermediate images.  inflight may be changed at any time, e.g.
+    by a CoreScheduler; more intermediate images are allocated if needed.
+    Pass executor to share a thread pool between pipelines.
+
+    The result for a frame is the output image of the last step if it has a
+    DEST, otherwise its return value.  A result image is only valid until
+    the next result is requested.  A pipeline processes one stream of frames
+    at a time; don't call map() or run() from several threads at once."""
+
+    SOURCE = _Placeholder("SOURCE")
+    PREV = _Placeholder("PREV")
+    DEST = _Placeholder("DEST")
+
+    def __init__(self, sourcetype=None, workers=None, inflight=None,
+                 executor=None):
+        self.sourcetype = sourcetype
+        self.workers = workers or os.cpu_count() or 1
+        self.inflight = inflight or self.workers
+        self.executor = executor
+        self._own_executor = executor is None
+        self._steps = []
+        self._plan = None
+        self._types = None
+        self._contexts = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Shut down the worker threads and dispose the intermediate
+        images."""
+        if self._own_executor and self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        self._contexts = None
+
+    def step(self, func, *args, imagetype=None, **kwargs):
+        """Append a step calling func(*args, **kwargs) with the placeholders
+        substituted.  Returns self so steps can be chained."""
+        self._steps.append(_Step(func, args, kwargs, imagetype))
+        self._plan = None
+        self._contexts = None
+        return self
+
+    def build(self):
+        """Resolve the image placeholders and allocate the intermediate
+        images.  Called automatically by run() and map()."""
+        # images are ("source", None) or (image type value, 0 or 1)
+        prev = ("source", None)
+        prevtype = self.sourcetype
+        types = {}
+        plan = []
+        for step in self._steps:
+            dest = None
+            if any(arg is self.DEST for arg in step.args):
+                imagetype = step.imagetype
+                if imagetype is None:
+                    imagetype = prevtype
+                if imagetype is None:
+                    raise ValueError("imagetype needed for step %s" %
+                                     getattr(step.func, "__name__", step.func))
+                types[imagetype.value] = imagetype
+                dest = (imagetype.value, 1 if prev == (imagetype.value, 0) else 0)
+            args = []
+            for arg in step.args:
+                if arg is self.SOURCE:
+                    arg = ("source", None)
+                elif arg is self.PREV:
+                    arg = prev
+                elif arg is self.DEST:
+                    arg = dest
+                else:
+                    args.append((False, arg))
+                    continue
+                args.append((True, arg))
+            plan.append((step.func, args, step.kwargs, dest))
+            if dest is not None:
+                prev = dest
+                prevtype = types[dest[0]]
+        self._plan = plan
+        self._types = types
+        self._contexts = collections.deque(
+                self._newContext() for n in range(self.inflight))
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(self.workers)
+
+    def _newContext(self):
+        return {(t, i): core.imaqCreateImage(imagetype)
+                for t, imagetype in self._types.items() for i in (0, 1)}
+
+    @staticmethod
+    def _process(plan, images, frame):
+        images = dict(images)
+        images[("source", None)] = frame
+        rv = None
+        for func, args, kwargs, dest in plan:
+            rv = func(*[images[arg] if isimage else arg
+                        for isimage, arg in args], **kwargs)
+            if dest is not None:
+                rv = images[dest]
+        return rv
+
+    def run(self, frame):
+        """Process a single frame synchronously and return its result."""
+        return next(self.map([frame]))
+
+    def map(self, frames):
+        """Process frames (an iterable of images, which may be endless),
+        yielding their results in order."""
+        with self._lock:
+            if self._plan is None or self._contexts is None:
+                self.build()
+            plan = self._plan
+            contexts = self._contexts
+            executor = self.executor
+        pending = collections.deque()
+        try:
+            for frame in frames:
+                while pending and len(pending) >= self.inflight:
+                    yield self._finish(pending.popleft(), contexts)
+                images = contexts.popleft() if contexts else self._newContext()
+                pending.append((images,
+                    executor.submit(self._process, plan, images, frame)))
+            while pending:
+                yield self._finish(pending.popleft(), contexts)
+        finally:
+            # abandoned early; wait for the frames still in flight
+            for images, future in pending:
+                concurrent.futures.wait([future])
+                contexts.append(images)
+
+    @staticmethod
+    def _finish(item, contexts):
+        images, future = item
+        try:
+            return future.result()
+        finally:
+            # reused for a later frame only once the next result is requested
+            contexts.append(images)
@@ -0,0 +1,120 @@
+#
+# Image pool
+#
+import collections
+import threading
+from . import core
+from .core import Image
+
+__all__ = ["ImagePool"]
+
+class PooledImage(Image):
+    """An Image that is returned to its ImagePool rather than disposed when
+    it is garbage collected."""
+    def __del__(self):
+        pool = getattr(self, "_pool", None)
+        if pool is not None and self.value is not None:
+            try:
+                pool.release(self)
+                return
+            except Exception:
+                pass
+        core.imaqDispose(self)
+
+class ImagePool:
+    """Pool of Images keyed by (type, width, height, border).
+
+    Images obtained with acquire() go back to the pool when they are garbage
+    collected (or passed to release()) instead of being disposed, so a
+    processing loop can reuse the same native buffers every frame.  At most
+    maxsize idle images are kept; beyond that the least recently used ones
+    are disposed.  Hit, miss and eviction counts are kept in the hits, misses
+    and evictions attributes."""
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._free = collections.OrderedDict() # key -> list of addresses
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __repr__(self):
+        return "ImagePool(%d idle, %d hits, %d misses, %d evictions)" % \
+                (self._count, self.hits, self.misses, self.evictions)
+
+    def acquire(self, type, width, height, border=0):
+        """Get an Image of the given type, size and border size, reusing an
+        idle one if available.  type may be an ImageType or an int.  Pixel
+        contents are not cleared."""
+        if not isinstance(type, core.ImageType):
+            type = core.ImageType(type)
+        key = (type.value, width, height, border)
+        addr = None
+        with self._lock:
+            addrs = self._free.get(key)
+            if addrs:
+                addr = addrs.pop()
+                self._count -= 1
+                if addrs:
+                    # recently used, so its other idle images are kept
+                    self._free.move_to_end(key)
+                else:
+                    del self._free[key]
+                self.hits += 1
+            else:
+                self.misses += 1
+        if addr is None:
+            img = core.imaqCreateImage(type, border)
+            core.imaqSetImageSize(img, width, height)
+            # take ownership of the native image
+            addr = img.value
+            img.value = None
+        image = PooledImage(addr)
+        image._pool = self
+        return image
+
+    def release(self, image):
+        """Return an image to the pool.  The image object must not be used
+        afterwards.  The image is pooled by its current type, size and
+        border, so images resized after acquire() are handled correctly."""
+        if image.value is None:
+            return
+        info = core.imaqGetImageInfo(image)
+        key = (info.imageType.value, info.xRes, info.yRes, info.border)
+        addr = image.value
+        image.value = None
+        evicted = []
+        with self._lock:
+            self._free.setdefault(key, []).append(addr)
+            self._free.move_to_end(key)
+            self._count += 1
+            while self._count > self.maxsize:
+                oldest = next(iter(self._free))
+                addrs = self._free[oldest]
+                evicted.append(addrs.pop(0))
+                if not addrs:
+                    del self._free[oldest]
+                self._count -= 1
+                self.evictions += 1
+        for addr in evicted:
+            core.imaqDispose(Image(addr))
+
+    def clear(self):
+        """Dispose all idle images."""
+        with self._lock:
+            addrs = [addr for l in self._free.values() for addr in l]
+            self._free.clear()
+            self._count = 0
+        for addr in addrs:
+            core.imaqDispose(Image(addr))
+
+    def __del__(self):
+        try:
+            self.clear()
+        except Exception:
+            pass
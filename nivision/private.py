@@ -1,13 +1,19 @@
 #
 # Private functions
 #
+import collections
 import ctypes
+import os
 import sys
+import threading
+import time
 from . import core
 from .core import Image, STDFUNC, imaqArrayToImage, imaqGetImageType, \
-        ImaqError, ERR_INVALID_IMAGE_TYPE
+        imaqSetError, ImaqError, ERR_INVALID_IMAGE_TYPE
 
-__all__ = ["Priv_ReadJPEGString", "Priv_ReadJPEGString_C"]
+__all__ = ["Priv_ReadJPEGString", "Priv_ReadJPEGString_C", "JPEGDecodePool",
+           "registerJPEGDecoder", "getJPEGDecoders", "selectJPEGDecoder",
+           "benchmarkJPEGDecoders"]
 
 try:
     WindowsError
@@ -15,10 +21,122 @@ except NameError:
     class WindowsError(Exception):
         pass
 
-# ReadJPEGString: try to use the LabView one first... but currently this isn't
-# exported on Windows.
-Priv_ReadJPEGString = None
-_Priv_ReadJPEGString_C = None
+#
+# JPEG decoders
+#
+# Decoders are registered with a priority.  For each image type, the highest
+# priority decoder that supports it is used, unless another one has been
+# selected with selectJPEGDecoder() or benchmarkJPEGDecoders().
+#
+_decoders = {}      # name -> (priority, func, set of image type values or None)
+_selected = {}      # image type value -> name
+_typeDecoders = {}  # image type value -> func; None -> func for all types
+
+def registerJPEGDecoder(name, func, priority=0, types=None):
+    """Register func(image, data) as JPEG decoder name.  types is a sequence
+    of the image types it can decode into, or None for all types."""
+    if types is not None:
+        types = frozenset(t.value for t in types)
+    _decoders[name] = (priority, func, types)
+    _typeDecoders.clear()
+
+def getJPEGDecoders(imagetype=None):
+    """Return the names of the registered decoders, highest priority first.
+    If imagetype is given, only decoders supporting it are returned."""
+    names = sorted(_decoders, key=lambda name: -_decoders[name][0])
+    if imagetype is None:
+        return names
+    return [name for name in names if _decoders[name][2] is None
+            or imagetype.value in _decoders[name][2]]
+
+def selectJPEGDecoder(name, imagetype=None):
+    """Use decoder name for imagetype (or for all types).  A name of None
+    goes back to choosing by priority."""
+    if name is not None and name not in _decoders:
+        raise KeyError(name)
+    if imagetype is None:
+        _selected.clear()
+        if name is not None:
+            for t in _decoders[name][2] or ():
+                _selected[t] = name
+            if _decoders[name][2] is None:
+                _selected[None] = name
+    elif name is None:
+        _selected.pop(imagetype.value, None)
+    else:
+        _selected[imagetype.value] = name
+    _typeDecoders.clear()
+
+def _decoderFor(t):
+    name = _selected.get(t, _selected.get(None))
+    if name is None:
+        for name in getJPEGDecoders(core.ImageType(t)):
+            break
+        else:
+            raise NotImplementedError("no JPEG decoder for %s" %
+                                      core.ImageType(t))
+    func = _typeDecoders[t] = _decoders[name][1]
+    return func
+
+def _anyTypeDecoder():
+    # the decoder used for every image type, or False if it depends on the type
+    if any(t is not None for t in _selected):
+        return False
+    name = _selected.get(None)
+    if name is None:
+        names = getJPEGDecoders()
+        if not names:
+            return False
+        name = names[0]
+    if _decoders[name][2] is not None:
+        return False
+    return _decoders[name][1]
+
+def Priv_ReadJPEGString(image, data):
+    # skip looking up the image type if the decoder doesn't depend on it
+    func = _typeDecoders.get(None)
+    if func is None:
+        func = _typeDecoders[None] = _anyTypeDecoder()
+    if not func:
+        t = imaqGetImageType(image).value
+        func = _typeDecoders.get(t)
+        if func is None:
+            func = _decoderFor(t)
+    func(image, data)
+
+# alias for code ported from C
+Priv_ReadJPEGString_C = Priv_ReadJPEGString
+
+def benchmarkJPEGDecoders(data, imagetype=core.IMAQ_IMAGE_RGB, runs=10,
+                          select=True):
+    """Time each decoder that supports imagetype on data (a sample JPEG string
+    or a list of them) and return a dict of decoder name to seconds per
+    frame.  Decoders that fail on the data are left out.  If select is true,
+    the fastest decoder is selected for imagetype."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = [data]
+    image = core.imaqCreateImage(imagetype)
+    results = {}
+    for name in getJPEGDecoders(imagetype):
+        func = _decoders[name][1]
+        try:
+            func(image, data[0])
+            start = time.perf_counter()
+            for i in range(runs):
+                for d in data:
+                    func(image, d)
+            results[name] = (time.perf_counter() - start) / (runs*len(data))
+        except (ImaqError, NotImplementedError, ValueError, OSError):
+            pass
+    if select and results:
+        selectJPEGDecoder(min(results, key=results.get), imagetype)
+    return results
+
+def _invalidImageType():
+    imaqSetError(ERR_INVALID_IMAGE_TYPE, b"Priv_ReadJPEGString")
+    raise ImaqError
+
+# The LabVIEW decoder, but currently this isn't exported on Windows.
 for lib in ["nivision", "nivissvc"]:
     try:
         if sys.platform.startswith('win'):
@@ -28,70 +146,172 @@ for lib in ["nivision", "nivissvc"]:
         _Priv_ReadJPEGString_C = STDFUNC("Priv_ReadJPEGString_C",
                 ("image", Image), ("data", ctypes.c_char_p),
                 ("len", ctypes.c_uint), library=dll, handle_missing=False)
-    except (AttributeError, WindowsError):
-        pass
-if _Priv_ReadJPEGString_C is not None:
-    def Priv_ReadJPEGString(image, data):
+    except (AttributeError, OSError, WindowsError):
+        continue
+    def _readJPEGNative(image, data):
         _Priv_ReadJPEGString_C(image, data, len(data))
+    registerJPEGDecoder("native", _readJPEGNative, 100)
+    break
 
-# Fall back to GDI+ JPEG decoder
-if Priv_ReadJPEGString is None:
-    try:
-        from . import gdiplus
-        def Priv_ReadJPEGString(image, data):
-            t = imaqGetImageType(image)
-            if t == core.IMAQ_IMAGE_U16:
-                pf = gdiplus.PixelFormat16bppGrayScale
-            elif t == core.IMAQ_IMAGE_RGB:
-                pf = gdiplus.PixelFormat32bppARGB
-            elif t == core.IMAQ_IMAGE_RGB_U64:
-                pf = gdiplus.PixelFormat64bppARGB
-            else:
-                raise ImaqError(ERR_INVALID_IMAGE_TYPE)
+# GDI+ (Windows)
+try:
+    from . import gdiplus
+except (ImportError, WindowsError, NameError):
+    gdiplus = None
+if gdiplus is not None:
+    def _readJPEGGdiplus(image, data):
+        t = imaqGetImageType(image)
+        if t == core.IMAQ_IMAGE_U16:
+            pf = gdiplus.PixelFormat16bppGrayScale
+        elif t == core.IMAQ_IMAGE_RGB:
+            pf = gdiplus.PixelFormat32bppARGB
+        elif t == core.IMAQ_IMAGE_RGB_U64:
+            pf = gdiplus.PixelFormat64bppARGB
+        else:
+            _invalidImageType()
 
-            def cb(pixels, cols, rows):
-                imaqArrayToImage(image, pixels, cols, rows)
-            gdiplus.decode(data, cb, pf)
+        def cb(pixels, cols, rows):
+            imaqArrayToImage(image, pixels, cols, rows)
+        gdiplus.decode(data, cb, pf)
+    registerJPEGDecoder("gdiplus", _readJPEGGdiplus, 50,
+            (core.IMAQ_IMAGE_U16, core.IMAQ_IMAGE_RGB, core.IMAQ_IMAGE_RGB_U64))
 
-    except (ImportError, WindowsError, NameError):
-        pass
+# libjpeg-turbo via PyTurboJPEG (https://github.com/lilohuang/PyTurboJPEG)
+try:
+    import turbojpeg as _turbojpeg
+    _turbo = _turbojpeg.TurboJPEG()
+except (ImportError, RuntimeError, OSError):
+    _turbo = None
+if _turbo is not None:
+    def _readJPEGTurbo(image, data):
+        t = imaqGetImageType(image)
+        if t == core.IMAQ_IMAGE_RGB:
+            pf = _turbojpeg.TJPF_BGRA   # RGBValue is stored as B, G, R, alpha
+        elif t == core.IMAQ_IMAGE_U8:
+            pf = _turbojpeg.TJPF_GRAY
+        else:
+            _invalidImageType()
+        pixels = _turbo.decode(data, pixel_format=pf)
+        rows, cols = pixels.shape[:2]
+        imaqArrayToImage(image, pixels, cols, rows)
+    registerJPEGDecoder("turbojpeg", _readJPEGTurbo, 75,
+            (core.IMAQ_IMAGE_U8, core.IMAQ_IMAGE_RGB))
 
-# Fall back to PIL (http://www.lfd.uci.edu/~gohlke/pythonlibs/#pil)
-if Priv_ReadJPEGString is None:
+# PIL (http://www.lfd.uci.edu/~gohlke/pythonlibs/#pil)
+try:
+    from PIL import Image as _PILImage
+except ImportError:
     try:
-        from PIL import Image as _PILImage
+        import Image as _PILImage
     except ImportError:
-        try:
-            import Image as _PILImage
-        except ImportError:
-            _PILImage = None
-    if _PILImage is not None:
-        import io
-        def Priv_ReadJPEGString(image, data):
-            im = _PILImage.open(io.BytesIO(data))
-            # only works with RGB for now
-            if imaqGetImageType(image) != core.IMAQ_IMAGE_RGB:
-                raise ImaqError(ERR_INVALID_IMAGE_TYPE)
-            if im.mode == "RGB":
-                pixels = im.tobytes("raw", "RGBX")
-            elif im.mode == "RGBA":
-                pixels = im.tobytes("raw", "RGBA")
-            cols, rows = im.size
-            imaqArrayToImage(image, pixels, cols, rows)
+        _PILImage = None
+if _PILImage is not None:
+    import io
+    def _pixelsPIL(image, mode, cols, rows, bpp):
+        """Size image to cols x rows and return a PIL image of mode that
+        shares its pixel memory."""
+        core.imaqSetImageSize(image, cols, rows)
+        info = core.imaqGetImageInfo(image)
+        stride = info.pixelsPerLine*bpp
+        buf = (ctypes.c_char * (stride*rows)).from_address(info.imageStart)
+        return _PILImage.frombuffer(mode, (cols, rows), buf, "raw", mode,
+                                    stride, 1)
+
+    def _readJPEGPIL(image, data):
+        t = imaqGetImageType(image)
+        im = _PILImage.open(io.BytesIO(data))
+        cols, rows = im.size
+        # U8 and RGB decode straight into the pixel memory; libjpeg can't
+        # convert e.g. CMYK to those, so such images are converted by PIL
+        if t == core.IMAQ_IMAGE_U8:
+            dest = _pixelsPIL(image, "L", cols, rows, 1)
+            try:
+                dest.frombytes(data, "jpeg", ("L", ""))
+                return
+            except (ValueError, OSError):
+                pixels = im.convert("L").tobytes()
+        elif t == core.IMAQ_IMAGE_U16:
+            pixels = im.convert("L").convert("I;16").tobytes()
+        elif t == core.IMAQ_IMAGE_RGB:
+            # RGBValue is stored as B, G, R, alpha, and libjpeg only outputs
+            # R, G, B: decode as RGBX (alpha 255), then swap the red and blue
+            # bands in place (with the band operations PIL's putalpha uses)
+            dest = _pixelsPIL(image, "RGBX", cols, rows, 4)
+            try:
+                dest.frombytes(data, "jpeg", ("RGB", ""))
+            except (ValueError, OSError):
+                pixels = im.convert("RGB").tobytes("raw", "BGRX")
+            else:
+                red = dest.im.getband(0)
+                dest.im.putband(dest.im.getband(2), 0)
+                dest.im.putband(red, 2)
+                return
+        else:
+            _invalidImageType()
+        # copies straight into the pixels if image is already this size
+        imaqArrayToImage(image, pixels, cols, rows)
+    registerJPEGDecoder("pil", _readJPEGPIL, 25,
+            (core.IMAQ_IMAGE_U8, core.IMAQ_IMAGE_U16, core.IMAQ_IMAGE_RGB))
 
-# Fall back to Qt4
-#if Priv_ReadJPEGString is None:
-#    try:
-#        from PyQt4 import QtGui as _QtGui
-#        if "jpg" in _QtGui.QImageReader.supportedImageFormats():
-#            def Priv_ReadJPEGString(image, data):
-#                img = _QtGui.QImage.fromData(data, "JPG")
-#    except ImportError:
-#        pass
+# Qt4
+#try:
+#    from PyQt4 import QtGui as _QtGui
+#    if "jpg" in _QtGui.QImageReader.supportedImageFormats():
+#        def _readJPEGQt(image, data):
+#            img = _QtGui.QImage.fromData(data, "JPG")
+#except ImportError:
+#    pass
 
-if Priv_ReadJPEGString is None:
-    def Priv_ReadJPEGString(image, data):
-        raise NotImplementedError
+class JPEGDecodePool:
+    """Decode many JPEG strings concurrently on a pool of worker threads.
 
-# alias for code ported from C
-Priv_ReadJPEGString_C = Priv_ReadJPEGString
+    The native and PIL decoders release the GIL while decoding, so threads
+    run in parallel.  For map(), each worker decodes into its own Image,
+    created once and reused for every frame, so no Images are created or
+    resized per frame once the pool is warm."""
+
+    def __init__(self, workers=None, imagetype=core.IMAQ_IMAGE_RGB):
+        self.workers = workers or os.cpu_count() or 1
+        self.imagetype = imagetype
+        # imported here rather than by "import nivision"
+        import concurrent.futures
+        self._executor = concurrent.futures.ThreadPoolExecutor(self.workers)
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown()
+
+    def _decode(self, func, data):
+        image = getattr(self._local, "image", None)
+        if image is None:
+            image = self._local.image = core.imaqCreateImage(self.imagetype)
+        Priv_ReadJPEGString(image, data)
+        return func(image)
+
+    def map(self, func, datas):
+        """Decode each JPEG string in datas and call func(image) on the worker
+        thread with the result, yielding func's return values in order.  The
+        image belongs to the worker and is only valid during the call.  At
+        most two frames per worker are in flight, so datas may be an endless
+        iterator."""
+        pending = collections.deque()
+        for data in datas:
+            if len(pending) >= 2*self.workers:
+                yield pending.popleft().result()
+            pending.append(self._executor.submit(self._decode, func, data))
+        while pending:
+            yield pending.popleft().result()
+
+    def decode_into(self, images, datas):
+        """Decode datas[i] into images[i] for all i concurrently, and wait
+        for all of them to finish."""
+        futures = [self._executor.submit(Priv_ReadJPEGString, image, data)
+                for image, data in zip(images, datas)]
+        for future in futures:
+            future.result()
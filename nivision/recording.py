@@ -0,0 +1,218 @@
+#
+# Frame recording and replay
+#
+import ctypes
+import mmap
+import struct
+import time
+from . import core
+
+__all__ = ["FrameRecorder", "FrameReplayer", "RecordedFrame"]
+
+# file layout: header, frame chunks, index chunk, trailer
+_MAGIC = b"NIVREC\0\0"
+# magic, version
+_fileHeader = struct.Struct("<8sI")
+# magic, image type, width, height, stride (bytes per row), size, timestamp
+_chunkHeader = struct.Struct("<4sIIIIQd")
+# offset of pixel data, timestamp, image type, width, height, stride, size
+_indexEntry = struct.Struct("<QdIIIIQ")
+# magic, offset of index chunk, number of frames
+_trailer = struct.Struct("<8sQQ")
+_FRAME = b"FRAM"
+_INDEX = b"INDX"
+_TRAILER = b"NIVRIDX\0"
+_ALIGN = 64
+
+def _align(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+class RecordedFrame:
+    """Index entry of a recorded frame."""
+    __slots__ = ("offset", "timestamp", "imagetype", "width", "height",
+                 "stride", "size")
+
+    def __init__(self, offset, timestamp, imagetype, width, height, stride,
+                 size):
+        self.offset = offset
+        self.timestamp = timestamp
+        self.imagetype = imagetype
+        self.width = width
+        self.height = height
+        self.stride = stride
+        self.size = size
+
+    def __repr__(self):
+        return "RecordedFrame(%f, %dx%d, %d bytes)" % (self.timestamp,
+                self.width, self.height, self.size)
+
+class FrameRecorder:
+    """Records the pixel data of images to a file, one chunk per frame, as
+    fast as the disk allows: pixel rows are written straight from the
+    image's memory with no encoding.
+
+    Each chunk has a header with the image type, size, stride and timestamp
+    of the frame, so a recording that was not closed properly can still be
+    replayed; close() appends an index of all frames."""
+
+    def __init__(self, path, buffering=1024*1024):
+        self.path = path
+        self._file = open(path, "wb", buffering=buffering)
+        self._index = []
+        header = _fileHeader.pack(_MAGIC, 1)
+        self._file.write(header + bytes(_align(len(header)) - len(header)))
+        self._offset = _align(len(header))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self._index)
+
+    def write(self, image, timestamp=None):
+        """Append the pixels of image and return its frame number."""
+        if timestamp is None:
+            timestamp = time.time()
+        info = core.imaqGetImageInfo(image)
+        bpp = core.imaqGetBytesPerPixel(image)
+        cols, rows = info.xRes, info.yRes
+        linebytes = cols*bpp
+        size = linebytes*rows
+        imagetype = info.imageType.value
+        f = self._file
+        header = _chunkHeader.pack(_FRAME, imagetype, cols, rows, linebytes,
+                                   size, timestamp)
+        f.write(header + bytes(_ALIGN - len(header)))
+        stride = info.pixelsPerLine*bpp
+        if size:
+            if stride == linebytes:
+                f.write((ctypes.c_char * size).from_address(info.imageStart))
+            else:
+                for row in range(rows):
+                    f.write((ctypes.c_char * linebytes).from_address(
+                            info.imageStart + row*stride))
+        f.write(bytes(_align(size) - size))
+        self._index.append((self._offset + _ALIGN, timestamp, imagetype,
+                            cols, rows, linebytes, size))
+        self._offset += _ALIGN + _align(size)
+        return len(self._index) - 1
+
+    def close(self):
+        """Write the index and close the file."""
+        if self._file is None:
+            return
+        f = self._file
+        f.write(_chunkHeader.pack(_INDEX, 0, 0, 0, 0,
+                                  len(self._index)*_indexEntry.size, 0))
+        for entry in self._index:
+            f.write(_indexEntry.pack(*entry))
+        f.write(_trailer.pack(_TRAILER, self._offset, len(self._index)))
+        f.close()
+        self._file = None
+
+class FrameReplayer:
+    """Replays a recording made by FrameRecorder from a memory map of the
+    file, so frames are copied into images straight from the page cache.
+
+    Frames can be accessed by number, or iterated with frames() at the
+    recorded rate (scaled by speed) or as fast as possible::
+
+        with FrameReplayer("run.nivrec") as replay:
+            for n, image in replay.frames():
+                ...
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            # copy-on-write so that the data is exposed as a writable buffer
+            # and can be passed to imaq functions without copying
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, version = _fileHeader.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or version != 1:
+            self._mmap.close()
+            raise ValueError("%s is not a frame recording" % path)
+        self.index = self._readIndex()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, n):
+        return self.index[n]
+
+    def _readIndex(self):
+        m = self._mmap
+        if len(m) >= _trailer.size:
+            magic, offset, count = _trailer.unpack_from(m,
+                                                        len(m)-_trailer.size)
+            if magic == _TRAILER:
+                return [RecordedFrame(*entry) for entry in
+                        _indexEntry.iter_unpack(
+                            m[offset+_chunkHeader.size:
+                              offset+_chunkHeader.size+count*_indexEntry.size])]
+        # not closed properly: rebuild the index from the chunk headers
+        index = []
+        offset = _align(_fileHeader.size)
+        while offset + _ALIGN <= len(m):
+            magic, imagetype, cols, rows, stride, size, timestamp = \
+                    _chunkHeader.unpack_from(m, offset)
+            if magic != _FRAME or offset + _ALIGN + size > len(m):
+                break
+            index.append(RecordedFrame(offset + _ALIGN, timestamp, imagetype,
+                                       cols, rows, stride, size))
+            offset += _ALIGN + _align(size)
+        return index
+
+    def view(self, n):
+        """Return a memoryview of the pixel rows of frame n, without
+        copying.  Release it before closing the replayer."""
+        frame = self.index[n]
+        return memoryview(self._mmap)[frame.offset:frame.offset+frame.size]
+
+    def read(self, n, image=None):
+        """Copy frame n into image (resizing it), or into a new image of
+        the frame's type if image is None.  Returns the image."""
+        frame = self.index[n]
+        if image is None:
+            image = core.imaqCreateImage(core.ImageType(frame.imagetype))
+        with self.view(n) as data:
+            core.imaqArrayToImage(image, data, frame.width, frame.height)
+        return image
+
+    def frames(self, start=0, stop=None, realtime=False, speed=1.0):
+        """Yield (frame number, image) for frames start to stop, at the
+        recorded frame rate divided by speed if realtime is true, otherwise
+        as fast as possible.  One image per image type is reused, so an
+        image is only valid until the next frame is requested."""
+        images = {}
+        begin = None
+        for n in range(start, len(self.index) if stop is None else stop):
+            frame = self.index[n]
+            if realtime:
+                now = time.perf_counter()
+                if begin is None:
+                    begin = (now, frame.timestamp)
+                else:
+                    delay = (begin[0] + (frame.timestamp - begin[1])/speed
+                             - now)
+                    if delay > 0:
+                        time.sleep(delay)
+            image = images.get(frame.imagetype)
+            if image is None:
+                image = images[frame.imagetype] = core.imaqCreateImage(
+                        core.ImageType(frame.imagetype))
+            yield n, self.read(n, image)
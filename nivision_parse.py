@@ -93,10 +93,9 @@ def parse_file(emit, f, block_comment_exclude):
                 if cur_block == "Globals":
                     for dname, dtext in define_after_struct:
                         try:
-                            emit.text(dtext)
+                            emit.deferred_define(dname, dtext)
                         except Exception as e:
-                            print("%d: exception in text():\n%s" % (lineno+1, traceback.format_exc()))
-                        defined.add(dname)
+                            print("%d: exception in deferred_define():\n%s" % (lineno+1, traceback.format_exc()))
                 continue
             if not code and comment is not None:
                 # remember current block
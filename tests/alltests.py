@@ -19,6 +19,20 @@ def suite():
 
     modules_to_test = [
         'tests.test_dispose',
+        'tests.test_lazy',
+        'tests.test_direct',
+        'tests.test_array',
+        'tests.test_pool',
+        'tests.test_jpeg',
+        'tests.test_camera',
+        'tests.test_aio',
+        'tests.test_pipeline',
+        'tests.test_cores',
+        'tests.test_imaqdx',
+        'tests.test_framebus',
+        'tests.test_recording',
+        'tests.test_avi',
+        'tests.test_batchproc',
         ]
     alltests = unittest.TestSuite()
     for module in map(my_import, modules_to_test):
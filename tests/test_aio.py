@@ -0,0 +1,122 @@
+import unittest
+import asyncio
+import concurrent.futures
+import threading
+from nivision import *
+from nivision import core
+from nivision.aio import AsyncSession, AsyncAxisCamera
+from nivision.camera import AxisCamera
+
+class RecordingSession(AsyncSession):
+    """Records the functions run instead of calling them."""
+    def __init__(self):
+        AsyncSession.__init__(self, 1)
+        self.calls = []
+
+    def run(self, func, *args):
+        self.calls.append(func)
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(0)
+        return future
+
+class AsyncSessionTestCase(unittest.TestCase):
+    def assertCalls(self, session, names):
+        self.assertEqual(session.calls, [getattr(core, name)
+                                         for name in names])
+
+    def test_run(self):
+        async def run():
+            session = AsyncSession(None)
+            try:
+                threads = [await session.run(threading.get_ident)
+                           for i in range(3)]
+                total = await session.run(sum, [1, 2, 3])
+            finally:
+                await session.close()
+            return threads, total
+        threads, total = asyncio.run(run())
+        self.assertEqual(total, 6)
+        # every call runs on the session's single executor thread
+        self.assertEqual(len(set(threads)), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+    def test_open_failure(self):
+        executor = concurrent.futures.ThreadPoolExecutor(1)
+        self.addCleanup(executor.shutdown)
+        async def run():
+            await AsyncSession.open("no such camera", executor=executor)
+        self.assertRaises(ImaqError, asyncio.run, run())
+        # a passed in executor is left running
+        self.assertEqual(executor.submit(sum, [1, 2]).result(), 3)
+
+    def test_frames(self):
+        async def run():
+            try:
+                session = await AsyncSession.open("cam0")
+            except ImaqError:
+                return None
+            sizes = []
+            async with session:
+                async for image in session.frames(IMAQ_IMAGE_U8):
+                    sizes.append(imaqGetImageSize(image))
+                    if len(sizes) == 3:
+                        break
+            return sizes
+        sizes = asyncio.run(run())
+        if sizes is None:
+            self.skipTest("no IMAQdx camera")
+        self.assertEqual(len(sizes), 3)
+        for width, height in sizes:
+            self.assertGreater(width*height, 0)
+
+    def test_frames_abandoned(self):
+        session = RecordingSession()
+        async def run():
+            async with session:
+                async for image in session.frames(IMAQ_IMAGE_U8):
+                    break
+        asyncio.run(run())
+        # stopped before the camera is closed, and not again when the
+        # iterator is finalized
+        self.assertCalls(session, ["IMAQdxConfigureGrab", "IMAQdxGrab",
+                "IMAQdxStopAcquisition", "IMAQdxUnconfigureAcquisition",
+                "IMAQdxCloseCamera"])
+
+    def test_frames_closed(self):
+        session = RecordingSession()
+        async def run():
+            frames = session.frames(IMAQ_IMAGE_U8)
+            await frames.__anext__()
+            await frames.aclose()
+            await session.close()
+        asyncio.run(run())
+        self.assertCalls(session, ["IMAQdxConfigureGrab", "IMAQdxGrab",
+                "IMAQdxStopAcquisition", "IMAQdxUnconfigureAcquisition",
+                "IMAQdxCloseCamera"])
+
+class RecordingCamera(AxisCamera):
+    def stop(self):
+        self.stop_thread = threading.get_ident()
+        AxisCamera.stop(self)
+
+class AsyncAxisCameraTestCase(unittest.TestCase):
+    def test_close(self):
+        camera = RecordingCamera("127.0.0.1")
+        asyncio.run(AsyncAxisCamera(camera).close())
+        # the thread join doesn't block the event loop
+        self.assertNotEqual(camera.stop_thread, threading.get_ident())
+
+    def test_close_error(self):
+        camera = RecordingCamera("127.0.0.1")
+        camera._error = OSError("connection failed")
+        async_camera = AsyncAxisCamera(camera)
+        self.assertRaises(OSError, asyncio.run, async_camera.close())
+        self.assertRaises(RuntimeError, async_camera.executor.submit, sum, [])
+
+def suite():
+    suite = unittest.makeSuite(AsyncSessionTestCase)
+    suite.addTest(unittest.makeSuite(AsyncAxisCameraTestCase))
+    return suite
+
+if __name__ == "__main__":
+    unittest.TextTestRunner().run(suite())
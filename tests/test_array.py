@@ -0,0 +1,112 @@
+import unittest
+from nivision import *
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class ArrayTestCase(unittest.TestCase):
+    def test_array_to_image_bytes(self):
+        img = imaqCreateImage(IMAQ_IMAGE_U8)
+        imaqArrayToImage(img, bytes(range(12)), 4, 3)
+        self.assertEqual(imaqGetImageSize(img), (4, 3))
+        data, cols, rows = imaqImageToArray(img)
+        self.assertEqual(data, bytes(range(12)))
+
+    def test_array_to_image_sized(self):
+        img = imaqCreateImage(IMAQ_IMAGE_U8, 3)
+        imaqSetImageSize(img, 4, 3)
+        imaqArrayToImage(img, bytearray(range(12)), 4, 3)
+        data, cols, rows = imaqImageToArray(img)
+        self.assertEqual(data, bytes(range(12)))
+
+    def test_array_to_image_too_small(self):
+        img = imaqCreateImage(IMAQ_IMAGE_U8)
+        imaqSetImageSize(img, 4, 3)
+        self.assertRaises(ValueError, imaqArrayToImage, img, bytes(4), 4, 3)
+
+    def test_array_to_image_too_small_resize(self):
+        # checked before the image is resized by the native call too
+        img = imaqCreateImage(IMAQ_IMAGE_RGB)
+        for data in (bytes(12), bytearray(47), memoryview(bytes(47))):
+            self.assertRaises(ValueError, imaqArrayToImage, img, data, 4, 3)
+        self.assertEqual(imaqGetImageSize(img), (0, 0))
+
+    @unittest.skipIf(numpy is None, "numpy not installed")
+    def test_ndarray_roundtrip(self):
+        img = imaqCreateImage(IMAQ_IMAGE_U16, 2)
+        a = numpy.arange(12, dtype=numpy.uint16).reshape(3, 4)
+        imaqArrayToImage(img, a, 4, 3)
+        view = imaqImageToNdarray(img)
+        self.assertEqual(view.shape, (3, 4))
+        self.assertTrue((view == a).all())
+        view[1, 2] = 1000
+        self.assertEqual(imaqGetPixel(img, Point(2, 1)).grayscale, 1000)
+
+    @unittest.skipIf(numpy is None, "numpy not installed")
+    def test_ndarray_view_outlives_image(self):
+        img = imaqCreateImage(IMAQ_IMAGE_U8)
+        imaqArrayToImage(img, bytes(range(12)), 4, 3)
+        view = imaqImageToNdarray(img, Rect(1, 1, 2, 2))
+        del img
+        self.assertEqual(view.tolist(), [[5, 6], [9, 10]])
+
+    def test_get_line(self):
+        img = imaqCreateImage(IMAQ_IMAGE_U8)
+        imaqArrayToImage(img, bytes(range(12)), 4, 3)
+        line = imaqGetLine(img, Point(0, 1), Point(3, 1))
+        self.assertEqual(list(line), [4, 5, 6, 7])
+
+    @unittest.skipIf(numpy is None, "numpy not installed")
+    def test_complex_plane_ndarray(self):
+        img = imaqCreateImage(IMAQ_IMAGE_COMPLEX)
+        imaqSetImageSize(img, 4, 3)
+        arr, rows, cols = imaqComplexPlaneToArray(img, IMAQ_REAL, IMAQ_NO_RECT)
+        a = numpy.asarray(arr)
+        self.assertEqual(a.shape, (3, 4))
+        self.assertEqual(a.dtype, numpy.float32)
+
+    @unittest.skipIf(numpy is None, "numpy not installed")
+    def test_struct_recarray(self):
+        rects = (Rect*2)(Rect(1, 2, 3, 4), Rect(5, 6, 7, 8))
+        rec = structArrayToRecarray(ImaqArray(rects, 2))
+        self.assertEqual(rec.dtype, Rect._dtype_)
+        self.assertEqual(rec.left.tolist(), [2, 6])
+        self.assertEqual(rec[1].width, 8)
+        view = structArrayToRecarray(ImaqArray(rects, 2), copy=False)
+        rects[0].top = 10
+        self.assertEqual(view.top.tolist(), [10, 5])
+        self.assertEqual(rec.top.tolist(), [1, 5])
+
+    @unittest.skipIf(numpy is None, "numpy not installed")
+    def test_measure_particles_ndarray(self):
+        img = imaqCreateImage(IMAQ_IMAGE_U8)
+        a = numpy.zeros((20, 20), numpy.uint8)
+        a[2:4, 2:5] = 1
+        a[10:15, 10:14] = 1
+        imaqArrayToImage(img, a, 20, 20)
+        pixel, calibrated = imaqMeasureParticlesNdarray(img,
+                IMAQ_CALIBRATION_MODE_PIXEL, [IMAQ_MT_AREA])
+        self.assertEqual(pixel.shape, (2, 1))
+        self.assertEqual(sorted(pixel[:, 0]), [6.0, 20.0])
+        pixel, calibrated = imaqMeasureParticlesNdarray(img,
+                IMAQ_CALIBRATION_MODE_PIXEL, [IMAQ_MT_AREA], columns=True)
+        self.assertEqual(sorted(pixel[IMAQ_MT_AREA]), [6.0, 20.0])
+
+    def test_flatten_roundtrip(self):
+        img = imaqCreateImage(IMAQ_IMAGE_U8)
+        imaqArrayToImage(img, bytes(range(256))*12, 64, 48)
+        data = imaqFlatten(img, IMAQ_FLATTEN_IMAGE, IMAQ_COMPRESSION_NONE, 0)
+        self.assertIsInstance(data, memoryview)
+        self.assertEqual(data.format, "B")
+        for buf in (data, bytes(data), bytearray(data)):
+            img2 = imaqCreateImage(IMAQ_IMAGE_U8)
+            imaqUnflatten(img2, buf)
+            self.assertEqual(imaqImageToArray(img2), imaqImageToArray(img))
+
+def suite():
+    return unittest.makeSuite(ArrayTestCase)
+
+if __name__ == "__main__":
+    unittest.TextTestRunner().run(suite())
@@ -0,0 +1,74 @@
+import unittest
+import os
+import tempfile
+from nivision import *
+
+class AVITestCase(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(".avi")
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_roundtrip(self):
+        image = imaqCreateImage(IMAQ_IMAGE_U8)
+        with AVIWriter(self.path, 30, buffers=2) as writer:
+            for n in range(10):
+                imaqArrayToImage(image, bytes([n*10])*(32*24), 32, 24)
+                writer.write(image)
+            writer.flush()
+            self.assertEqual(writer.frames, 10)
+        with AVIReader(self.path, readahead=3) as reader:
+            self.assertEqual(len(reader), 10)
+            numbers = []
+            for n, frame, data in reader:
+                self.assertEqual(imaqGetImageSize(frame), (32, 24))
+                self.assertEqual(imaqImageToArray(frame)[0],
+                                 bytes([n*10])*(32*24))
+                self.assertIsNone(data)
+                numbers.append(n)
+            self.assertEqual(numbers, list(range(10)))
+            # stopping early and iterating again restarts from the start
+            for n, frame, data in reader:
+                break
+            self.assertEqual(n, 0)
+
+    def test_data(self):
+        image = imaqCreateImage(IMAQ_IMAGE_U8)
+        imaqArrayToImage(image, bytes(32*24), 32, 24)
+        with AVIWriter(self.path, 30, maxDataSize=16) as writer:
+            for n in range(5):
+                writer.write(image, b"frame %d" % n)
+        with AVIReader(self.path) as reader:
+            self.assertEqual([data for n, frame, data in reader],
+                             [b"frame %d" % n for n in range(5)])
+
+    def test_write_error(self):
+        image = imaqCreateImage(IMAQ_IMAGE_U8)
+        imaqArrayToImage(image, bytes(32*24), 32, 24)
+        with AVIWriter(self.path, 30, maxDataSize=16) as writer:
+            writer.write(image, 12345)      # not bytes
+            self.assertRaises(TypeError, writer.flush)
+            writer.write(image, b"ok")
+            writer.flush()
+
+    def test_read_error(self):
+        image = imaqCreateImage(IMAQ_IMAGE_U8)
+        imaqArrayToImage(image, bytes(32*24), 32, 24)
+        with AVIWriter(self.path, 30) as writer:
+            for n in range(3):
+                writer.write(image)
+        # reading past the last frame fails on the reader thread
+        with AVIReader(self.path, stop=5) as reader:
+            numbers = []
+            with self.assertRaises(ImaqError):
+                for n, frame, data in reader:
+                    numbers.append(n)
+            self.assertEqual(numbers, [0, 1, 2])
+
+def suite():
+    return unittest.makeSuite(AVITestCase)
+
+if __name__ == "__main__":
+    unittest.TextTestRunner().run(suite())
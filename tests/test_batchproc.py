@@ -0,0 +1,92 @@
+import unittest
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import batchproc
+from nivision import *
+
+topdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class BatchProcTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        for name in ["a/img1.png", "b/img1.png", "b/c/img2.JPG", "notes.txt"]:
+            path = os.path.join(self.dir, "in", name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "wb").close()
+
+    def path(self, *names):
+        return os.path.join(self.dir, *names)
+
+    def test_find_files(self):
+        files = batchproc.find_files([self.path("in")])
+        self.assertEqual(files, [
+            (self.path("in", "a", "img1.png"), os.path.join("a", "img1.png")),
+            (self.path("in", "b", "c", "img2.JPG"),
+                os.path.join("b", "c", "img2.JPG")),
+            (self.path("in", "b", "img1.png"), os.path.join("b", "img1.png")),
+        ])
+        files = batchproc.find_files([self.path("in", "b", "*.png")])
+        self.assertEqual(files, [(self.path("in", "b", "img1.png"),
+                                  "img1.png")])
+
+    def test_output_path(self):
+        relpath = os.path.join("a", "img1.png")
+        self.assertEqual(batchproc.output_path(relpath, "out", ".jpg"),
+                         os.path.join("out", "a", "img1.jpg"))
+        self.assertEqual(batchproc.output_path(relpath, "out", None),
+                         os.path.join("out", "a", "img1.png"))
+
+    def test_plan_outputs(self):
+        files = batchproc.find_files([self.path("in")])
+        self.assertEqual(batchproc.plan_outputs(files, "out", ".bmp"), [
+            os.path.join("out", "a", "img1.bmp"),
+            os.path.join("out", "b", "c", "img2.bmp"),
+            os.path.join("out", "b", "img1.bmp"),
+        ])
+        # same basename from two inputs: refused rather than overwritten
+        files = batchproc.find_files([self.path("in", "a", "img1.png"),
+                                      self.path("in", "b", "img1.png")])
+        self.assertRaises(ValueError, batchproc.plan_outputs, files, "out",
+                          None)
+
+class ProcessTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.input = os.path.join(self.dir, "in.png")
+        self.output = os.path.join(self.dir, "out.png")
+        img = imaqCreateImage(IMAQ_IMAGE_U8)
+        imaqArrayToImage(img, bytes(8*6), 8, 6)
+        imaqWritePNGFile2(img, self.input.encode("utf-8"), 750, None, 0)
+
+    def test_op(self):
+        # in a fresh interpreter, where the wrappers haven't been bound yet
+        code = ("import sys, batchproc, nivision\n"
+                "batchproc.init(['imaqSetImageSize(img, 5, 3)'], None, 'U8', "
+                "750)\n"
+                "print(batchproc.process(sys.argv[1], sys.argv[2])[1])\n"
+                "print(nivision.imaqGetImageSize(batchproc._image))\n")
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join([topdir,
+                                             env.get("PYTHONPATH", "")])
+        out = subprocess.check_output([sys.executable, "-c", code,
+                                       self.input, self.output], env=env,
+                                      universal_newlines=True)
+        self.assertEqual(out.splitlines(), ["None", "(5, 3)"])
+
+    def test_op_error(self):
+        batchproc.init(["missing(img)"], None, "U8", 750)
+        path, error = batchproc.process(self.input, self.output)
+        self.assertTrue(error.startswith("NameError"), error)
+
+def suite():
+    suite = unittest.makeSuite(BatchProcTestCase)
+    suite.addTest(unittest.makeSuite(ProcessTestCase))
+    return suite
+
+if __name__ == "__main__":
+    unittest.TextTestRunner().run(suite())
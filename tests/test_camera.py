@@ -0,0 +1,155 @@
+import unittest
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import asyncio
+from nivision import core, private
+from nivision.camera import *
+from nivision.camera import _cameras
+from nivision.aio import AsyncAxisCamera
+
+# not real JPEG data, but framed like JPEG (SOI ... EOI)
+def fake_jpeg(n):
+    return b"\xff\xd8" + ("frame %d " % n).encode("ascii") * 50 + b"\xff\xd9"
+
+class MJPEGHandler(BaseHTTPRequestHandler):
+    nframes = 5
+    content_length = True
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get("Authorization")))
+        self.send_response(200)
+        self.send_header("Content-Type",
+                         "multipart/x-mixed-replace; boundary=myboundary")
+        self.end_headers()
+        try:
+            for n in range(self.nframes):
+                data = fake_jpeg(n)
+                self.wfile.write(b"--myboundary\r\nContent-Type: image/jpeg\r\n")
+                if self.content_length:
+                    self.wfile.write(b"Content-Length: %d\r\n" % len(data))
+                self.wfile.write(b"\r\n" + data + b"\r\n")
+                self.wfile.flush()
+                time.sleep(0.01)
+            # hold the connection open until the client goes away
+            self.server.done.wait(5)
+        except OSError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+class CameraTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), MJPEGHandler)
+        self.server.requests = []
+        self.server.done = threading.Event()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.port = self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.done.set()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        MJPEGHandler.content_length = True
+
+    def camera(self, **kwargs):
+        return AxisCamera("127.0.0.1", port=self.port, decode=False, **kwargs)
+
+    def select_broken_decoder(self, imagetype=None):
+        """Decode with a decoder that raises RuntimeError; the decoder
+        registry is restored when the test ends."""
+        saved = (dict(private._decoders), dict(private._selected))
+        def restore():
+            private._decoders.clear()
+            private._decoders.update(saved[0])
+            private._selected.clear()
+            private._selected.update(saved[1])
+            private._typeDecoders.clear()
+        self.addCleanup(restore)
+        def broken(image, data):
+            raise RuntimeError("broken decoder")
+        private.registerJPEGDecoder("test_broken", broken, -1000)
+        private.selectJPEGDecoder("test_broken", imagetype)
+
+    def test_latest(self):
+        with self.camera() as camera:
+            while camera.frames_received < MJPEGHandler.nframes:
+                time.sleep(0.01)
+            frame = camera.get()
+            self.assertEqual(frame.seq, MJPEGHandler.nframes)
+            self.assertEqual(frame.data, fake_jpeg(MJPEGHandler.nframes-1))
+            self.assertEqual(camera.frames_dropped, MJPEGHandler.nframes-1)
+            # no new frame: doesn't block
+            self.assertIsNone(camera.get())
+        path, auth = self.server.requests[0]
+        self.assertTrue(path.startswith("/axis-cgi/mjpg/video.cgi?fps=30&"))
+        self.assertIsNone(auth)
+
+    def test_drop_newest(self):
+        with self.camera(maxframes=2, policy=FRAME_DROP_NEWEST) as camera:
+            while camera.frames_received < MJPEGHandler.nframes:
+                time.sleep(0.01)
+            self.assertEqual([camera.get().seq, camera.get().seq], [1, 2])
+            self.assertEqual(camera.frames_dropped, MJPEGHandler.nframes-2)
+
+    def test_no_content_length(self):
+        MJPEGHandler.content_length = False
+        with self.camera(maxframes=MJPEGHandler.nframes) as camera:
+            frames = [camera.get(timeout=2) for n in range(MJPEGHandler.nframes)]
+            self.assertEqual([f.data for f in frames],
+                    [fake_jpeg(n) for n in range(MJPEGHandler.nframes)])
+
+    def test_auth(self):
+        with self.camera(user="FRC", password="FRC") as camera:
+            self.assertIsNotNone(camera.get(timeout=2))
+        path, auth = self.server.requests[0]
+        self.assertEqual(auth, "Basic RlJDOkZSQw==")
+
+    def test_decode_error(self):
+        self.select_broken_decoder(core.IMAQ_IMAGE_U8)
+        camera = AxisCamera("127.0.0.1", port=self.port,
+                            imagetype=core.IMAQ_IMAGE_U8)
+        camera.start()
+        self.assertRaises(RuntimeError, camera.get, 2)
+        self.assertTrue(camera.stopped)
+        self.assertIsNone(camera.get())
+        camera.stop()
+
+    def test_read_close_error(self):
+        self.select_broken_decoder()
+        address = "127.0.0.1"
+        image = core.imaqCreateImage(core.IMAQ_IMAGE_RGB)
+        # imaqCameraRead has no port argument
+        camera = AxisCamera(address, port=self.port)
+        camera.start()
+        _cameras[address] = camera
+        self.addCleanup(_cameras.pop, address, None)
+        # the reader thread stops with the error before it is read
+        deadline = time.monotonic() + 2
+        while not camera.stopped and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertRaises(RuntimeError, imaqCameraRead, image, address,
+                          operation=CAMERA_CLOSE)
+        self.assertNotIn(address, _cameras)
+
+    def test_async(self):
+        async def frames():
+            seqs = []
+            async with AsyncAxisCamera(self.camera(maxframes=10)) as camera:
+                async for frame in camera:
+                    seqs.append(frame.seq)
+                    if len(seqs) == MJPEGHandler.nframes:
+                        break
+            return seqs
+        seqs = asyncio.run(frames())
+        self.assertEqual(seqs, list(range(1, MJPEGHandler.nframes+1)))
+
+def suite():
+    return unittest.makeSuite(CameraTestCase)
+
+if __name__ == "__main__":
+    unittest.TextTestRunner().run(suite())
@@ -0,0 +1,60 @@
+import unittest
+from nivision import *
+
+class CoreSchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = CoreScheduler(cores=8)
+
+    def tearDown(self):
+        self.scheduler.close()
+
+    def pipeline(self):
+        pipe = Pipeline(sourcetype=IMAQ_IMAGE_U8)
+        pipe.step(imaqGetImageSize, Pipeline.SOURCE)
+        return pipe
+
+    def test_throughput(self):
+        a, b = self.pipeline(), self.pipeline()
+        self.scheduler.attach(a)
+        self.scheduler.attach(b, 3)
+        self.assertEqual(imaqGetCores(), 1)
+        self.assertEqual((a.inflight, b.inflight), (2, 6))
+        self.assertIs(a.executor, self.scheduler.executor)
+
+    def test_latency(self):
+        a, b = self.pipeline(), self.pipeline()
+        self.scheduler.attach(a)
+        self.scheduler.attach(b)
+        self.scheduler.set_policy(CORES_LATENCY)
+        self.assertEqual(imaqGetCores(), 4)
+        self.assertEqual((a.inflight, b.inflight), (1, 1))
+
+    def test_fixed(self):
+        a = self.pipeline()
+        self.scheduler.attach(a)
+        self.scheduler.set_policy(CORES_FIXED, 2)
+        self.assertEqual(imaqGetCores(), 2)
+        self.assertEqual(a.inflight, 4)
+        self.scheduler.detach(a)
+
+    def test_invalid_policy(self):
+        a = self.pipeline()
+        self.scheduler.attach(a)
+        self.scheduler.set_policy(CORES_LATENCY)
+        self.assertRaises(ValueError, self.scheduler.set_policy, "fastest")
+        self.assertEqual(self.scheduler.policy, CORES_LATENCY)
+        # rebalancing still works
+        self.scheduler.attach(self.pipeline())
+        self.assertEqual(self.scheduler.imaqcores, 4)
+
+    def test_restore(self):
+        cores = self.scheduler._savedcores
+        self.scheduler.set_policy(CORES_FIXED, 2)
+        self.scheduler.close()
+        self.assertEqual(imaqGetCores(), cores)
+
+def suite():
+    return unittest.makeSuite(CoreSchedulerTestCase)
+
+if __name__ == "__main__":
+    unittest.TextTestRunner().run(suite())
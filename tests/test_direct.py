@@ -0,0 +1,99 @@
+import unittest
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# Generates a package with "gen_wrap.py --direct" and runs it against the
+# stub libraries from benchmarks/stublib.py, so it needs the NI Vision
+# headers (in the directory named by NIVISION_INCLUDE) and a C compiler.
+topdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+hdrpath = os.environ.get("NIVISION_INCLUDE")
+
+class DirectTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = None
+        if not hdrpath:
+            raise unittest.SkipTest("NIVISION_INCLUDE not set")
+        if sys.platform.startswith("win") or shutil.which("cc") is None:
+            raise unittest.SkipTest("stub libraries need cc")
+        sys.path.insert(0, os.path.join(topdir, "benchmarks"))
+        try:
+            import stublib
+            from bench_import import generate
+        finally:
+            del sys.path[0]
+        cls.tmpdir = tempfile.mkdtemp(prefix="nivision_direct_")
+        cls.libdir = os.path.join(cls.tmpdir, "lib")
+        cls.pkgdir = os.path.join(cls.tmpdir, "pkg")
+        stublib.build(hdrpath, cls.libdir)
+        generate(hdrpath, cls.pkgdir, True, True)
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.tmpdir is not None:
+            shutil.rmtree(cls.tmpdir)
+
+    def run_script(self, code):
+        env = dict(os.environ)
+        env["PYTHONPATH"] = self.pkgdir
+        env["LD_LIBRARY_PATH"] = os.pathsep.join(
+                [self.libdir, env.get("LD_LIBRARY_PATH", "")])
+        result = subprocess.run([sys.executable, "-c", "import nivision\n" +
+                code], env=env, cwd=self.tmpdir, stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT, universal_newlines=True)
+        if result.returncode != 0:
+            self.fail(result.stdout)
+
+    def test_outparams(self):
+        self.run_script("""
+img = nivision.imaqCreateImage(nivision.IMAQ_IMAGE_U8)
+nivision.imaqSetImageSize(img, 64, 48)
+assert nivision.imaqGetImageSize(img) == (64, 48), nivision.imaqGetImageSize(img)
+nivision.imaqSetImageSize(img, 32, 16)
+assert nivision.imaqGetImageSize(img) == (32, 16), nivision.imaqGetImageSize(img)
+# a plain Python wrapper rather than a ctypes function with paramflags
+assert type(nivision.imaqGetImageSize).__name__ == "function"
+""")
+
+    def test_error(self):
+        self.run_script("""
+img = nivision.imaqCreateImage(nivision.IMAQ_IMAGE_U8)
+try:
+    nivision.imaqSetImageSize(img, -1, 10)
+except nivision.ImaqError as e:
+    assert e.func == "imaqSetImageSize", e.func
+    assert e.code != 0
+else:
+    raise AssertionError("ImaqError not raised")
+nivision.imaqSetImageSize(img, 8, 8)
+assert nivision.imaqGetImageSize(img) == (8, 8)
+""")
+
+    def test_scratch_per_thread(self):
+        self.run_script("""
+import threading
+results = {}
+def worker(n):
+    img = nivision.imaqCreateImage(nivision.IMAQ_IMAGE_U8)
+    nivision.imaqSetImageSize(img, n, n+1)
+    sizes = set(nivision.imaqGetImageSize(img) for i in range(5000))
+    results[n] = (sizes, nivision.core._scratch.imaqGetImageSize)
+threads = [threading.Thread(target=worker, args=(n,)) for n in range(1, 5)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+for n, (sizes, scratch) in results.items():
+    assert sizes == {(n, n+1)}, (n, sizes)
+# each thread has its own output parameters
+assert len(set(id(scratch[0]) for sizes, scratch in results.values())) == 4
+""")
+
+def suite():
+    return unittest.makeSuite(DirectTestCase)
+
+if __name__ == "__main__":
+    unittest.TextTestRunner().run(suite())
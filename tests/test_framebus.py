@@ -0,0 +1,71 @@
+import unittest
+import os
+import subprocess
+import sys
+from nivision import *
+
+topdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class FrameBusTestCase(unittest.TestCase):
+    def setUp(self):
+        self.bus = FrameBus(create=True, slots=2, slotsize=64*48)
+        self.reader = FrameBus(self.bus.name)
+
+    def tearDown(self):
+        self.reader.close()
+        self.bus.close()
+
+    def image(self, value):
+        image = imaqCreateImage(IMAQ_IMAGE_U8)
+        imaqArrayToImage(image, bytes([value])*(64*48), 64, 48)
+        return image
+
+    def test_read(self):
+        self.assertIsNone(self.reader.read())
+        seq = self.bus.publish(self.image(7))
+        self.assertEqual(seq, 1)
+        seq, image = self.reader.read()
+        self.assertEqual(seq, 1)
+        self.assertEqual(imaqGetImageSize(image), (64, 48))
+        self.assertEqual(imaqImageToArray(image)[0], bytes([7])*(64*48))
+        imagetype, width, height, stride, size, timestamp = \
+                self.reader.header(1)
+        self.assertEqual((imagetype, width, height, stride, size),
+                         (IMAQ_IMAGE_U8, 64, 48, 64, 64*48))
+
+    def test_overwritten(self):
+        for value in range(3):
+            self.bus.publish(self.image(value))
+        self.assertIsNone(self.reader.read(seq=1))
+        image = imaqCreateImage(IMAQ_IMAGE_U8)
+        self.assertEqual(self.reader.read(image, seq=3), (3, image))
+        self.assertIsNone(self.reader.read(image, seq=4, timeout=0.01))
+
+    def test_too_large(self):
+        image = imaqCreateImage(IMAQ_IMAGE_RGB)
+        imaqSetImageSize(image, 64, 48)
+        self.assertRaises(ValueError, self.bus.publish, image)
+
+    def test_independent_reader_exit(self):
+        self.bus.publish(self.image(7))
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join([topdir,
+                                             env.get("PYTHONPATH", "")])
+        result = subprocess.run([sys.executable, "-c",
+                "import sys, nivision\n"
+                "bus = nivision.FrameBus(sys.argv[1])\n"
+                "print(bus.read()[0])\n"
+                "bus.close()\n", self.bus.name], env=env,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                universal_newlines=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout, "1\n")
+        # the reader's exit neither removed the bus nor reported a leak
+        self.assertNotIn("leaked", result.stderr)
+        FrameBus(self.bus.name).close()
+
+def suite():
+    return unittest.makeSuite(FrameBusTestCase)
+
+if __name__ == "__main__":
+    unittest.TextTestRunner().run(suite())
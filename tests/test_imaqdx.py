@@ -0,0 +1,94 @@
+import unittest
+import threading
+from nivision import *
+
+class CameraTestCase(unittest.TestCase):
+    def setUp(self):
+        try:
+            self.id = IMAQdxOpenCamera(b"cam0",
+                                       IMAQdxCameraControlModeController)
+        except ImaqError:
+            self.skipTest("no IMAQdx camera")
+
+    def tearDown(self):
+        IMAQdxCloseCamera(self.id)
+
+class AttributeCacheTestCase(CameraTestCase):
+    def setUp(self):
+        CameraTestCase.setUp(self)
+        self.attrs = IMAQdxAttributeCache(self.id)
+
+    def test_get(self):
+        names = [name for name in self.attrs.names()
+                 if self.attrs.attribute(name).readable and
+                    self.attrs.type(name) != IMAQdxAttributeTypeCommand and
+                    self.attrs.type(name) != IMAQdxAttributeTypeBlob]
+        self.assertTrue(names)
+        values = self.attrs.get_many(names)
+        for name in names[:10]:
+            key = name.encode("utf-8")
+            self.assertIn(key, self.attrs)
+            value = IMAQdxGetAttribute(self.id, key)
+            if self.attrs.type(name) == IMAQdxAttributeTypeEnum:
+                self.assertEqual(values[name].Value, value.Value)
+            elif self.attrs.type(name) != IMAQdxAttributeTypeF64:
+                self.assertEqual(values[name], value)
+
+    def test_set(self):
+        for name in self.attrs.names():
+            attr = self.attrs.attribute(name)
+            if (attr.readable and attr.writable and
+                    attr.type == IMAQdxAttributeTypeU32):
+                break
+        else:
+            self.skipTest("no writable U32 attribute")
+        value = self.attrs[name]
+        self.attrs.set_many({name: value})
+        self.assertEqual(IMAQdxGetAttribute(self.id, attr.key), value)
+        minimum, maximum, increment = self.attrs.limits(name)
+        self.assertTrue(minimum <= value <= maximum)
+
+    def test_snapshot(self):
+        profile = self.attrs.snapshot()
+        self.assertTrue(profile)
+        self.assertEqual(IMAQdxLoadProfile(IMAQdxDumpProfile(profile)),
+                         profile)
+        # nothing differs, so nothing is set
+        self.assertEqual(self.attrs.restore(profile), {})
+        self.assertEqual(self.attrs.snapshot(), profile)
+
+    def test_ring(self):
+        with IMAQdxRingAcquisition(self.id, ring=3) as ring:
+            numbers = [ring.get(5)[0] for i in range(5)]
+            stats = ring.stats()
+        self.assertEqual(numbers, sorted(set(numbers)))
+        self.assertGreaterEqual(stats["frames"], 5)
+        self.assertEqual(len(stats["latency"]), 4)
+
+class FrameDoneTestCase(CameraTestCase):
+    def test_frame_done(self):
+        numbers = []
+        done = threading.Event()
+        def handler(id, bufferNumber):
+            numbers.append(bufferNumber)
+            if len(numbers) == 5:
+                done.set()
+        IMAQdxConfigureAcquisition(self.id, 1, 4)
+        with IMAQdxFrameDispatcher() as dispatcher:
+            dispatcher.register(self.id, handler)
+            IMAQdxStartAcquisition(self.id)
+            try:
+                self.assertTrue(done.wait(5))
+            finally:
+                dispatcher.unregister(self.id)
+                IMAQdxStopAcquisition(self.id)
+                IMAQdxUnconfigureAcquisition(self.id)
+        self.assertEqual(numbers[:5], sorted(numbers[:5]))
+
+def suite():
+    suite = unittest.makeSuite(AttributeCacheTestCase)
+    suite.addTest(unittest.makeSuite(FrameDoneTestCase))
+    return suite
+
+if __name__ == "__main__":
+    unittest.TextTestRunner().run(suite())
@@ -0,0 +1,209 @@
+import unittest
+import threading
+import time
+from nivision import *
+from nivision import private
+
+try:
+    import io
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
+
+def pil_jpeg(mode, color, size=(5, 3)):
+    f = io.BytesIO()
+    PILImage.new(mode, size, color).save(f, "JPEG", quality=100)
+    return f.getvalue()
+
+def fake_decode(image, data):
+    """Test decoder: stores data as a single row of pixels."""
+    if data == b"bad":
+        raise ValueError("bad JPEG")
+    imaqArrayToImage(image, data, len(data), 1)
+
+class DecoderTestCase(unittest.TestCase):
+    """Restores the decoder registry after each test."""
+    def setUp(self):
+        self.saved = (dict(private._decoders), dict(private._selected))
+
+    def tearDown(self):
+        private._decoders.clear()
+        private._decoders.update(self.saved[0])
+        private._selected.clear()
+        private._selected.update(self.saved[1])
+        private._typeDecoders.clear()
+
+class RegistryTestCase(DecoderTestCase):
+    def setUp(self):
+        DecoderTestCase.setUp(self)
+        private._decoders.clear()
+        private._selected.clear()
+        private._typeDecoders.clear()
+        self.calls = []
+
+    def register(self, name, priority=0, types=None):
+        def decode(image, data):
+            if data == b"bad":
+                raise ValueError("bad JPEG")
+            self.calls.append(name)
+        registerJPEGDecoder(name, decode, priority, types)
+
+    def decode(self, imagetype):
+        Priv_ReadJPEGString(imaqCreateImage(imagetype), b"data")
+        return self.calls.pop()
+
+    def test_priority(self):
+        self.register("low", 10)
+        self.register("high", 50)
+        self.register("middle", 30)
+        self.assertEqual(getJPEGDecoders(), ["high", "middle", "low"])
+        self.assertEqual(self.decode(IMAQ_IMAGE_RGB), "high")
+
+    def test_types(self):
+        self.register("u8", 100, [IMAQ_IMAGE_U8])
+        self.register("any", 0)
+        self.assertEqual(getJPEGDecoders(), ["u8", "any"])
+        self.assertEqual(getJPEGDecoders(IMAQ_IMAGE_RGB), ["any"])
+        self.assertEqual(self.decode(IMAQ_IMAGE_U8), "u8")
+        self.assertEqual(self.decode(IMAQ_IMAGE_RGB), "any")
+
+    def test_select_one_type(self):
+        self.register("first", 100)
+        self.register("second", 0)
+        selectJPEGDecoder("second", IMAQ_IMAGE_U8)
+        self.assertEqual(self.decode(IMAQ_IMAGE_U8), "second")
+        self.assertEqual(self.decode(IMAQ_IMAGE_RGB), "first")
+        selectJPEGDecoder(None, IMAQ_IMAGE_U8)
+        self.assertEqual(self.decode(IMAQ_IMAGE_U8), "first")
+
+    def test_select_all(self):
+        self.register("first", 100)
+        self.register("second", 0)
+        selectJPEGDecoder("second")
+        self.assertEqual(self.decode(IMAQ_IMAGE_U8), "second")
+        self.assertEqual(self.decode(IMAQ_IMAGE_RGB), "second")
+        selectJPEGDecoder(None)
+        self.assertEqual(self.decode(IMAQ_IMAGE_RGB), "first")
+        self.assertRaises(KeyError, selectJPEGDecoder, "missing")
+
+    def test_unsupported_type(self):
+        self.register("u8", 0, [IMAQ_IMAGE_U8])
+        self.assertRaises(NotImplementedError, self.decode, IMAQ_IMAGE_RGB)
+
+    def test_any_type_skips_type_lookup(self):
+        self.register("any", 0)
+        def getImageType(image):
+            raise AssertionError("image type looked up")
+        saved = private.imaqGetImageType
+        private.imaqGetImageType = getImageType
+        try:
+            self.assertEqual(self.decode(IMAQ_IMAGE_U8), "any")
+        finally:
+            private.imaqGetImageType = saved
+
+    def test_benchmark(self):
+        def failing(image, data):
+            raise ValueError("bad JPEG")
+        def slow(image, data):
+            time.sleep(0.002)
+            self.calls.append("slow")
+        registerJPEGDecoder("failing", failing, 100)
+        registerJPEGDecoder("slow", slow, 50)
+        self.register("fast", 0)
+        results = benchmarkJPEGDecoders(b"data", IMAQ_IMAGE_U8, runs=3)
+        self.assertEqual(sorted(results), ["fast", "slow"])
+        self.assertEqual(self.decode(IMAQ_IMAGE_U8), "fast")
+        # other types still go by priority
+        self.assertRaises(ValueError, self.decode, IMAQ_IMAGE_RGB)
+
+class DecodePoolTestCase(DecoderTestCase):
+    def setUp(self):
+        DecoderTestCase.setUp(self)
+        registerJPEGDecoder("fake", fake_decode)
+        selectJPEGDecoder("fake", IMAQ_IMAGE_U8)
+        self.pool = JPEGDecodePool(workers=3, imagetype=IMAQ_IMAGE_U8)
+
+    def tearDown(self):
+        self.pool.close()
+        DecoderTestCase.tearDown(self)
+
+    def test_map_order(self):
+        datas = [b"frame %d" % n for n in range(50)]
+        results = list(self.pool.map(lambda image: imaqImageToArray(image)[0],
+                                     datas))
+        self.assertEqual(results, datas)
+
+    def test_images_recycled(self):
+        images = set()
+        lock = threading.Lock()
+        def func(image):
+            with lock:
+                images.add(image.value)
+        list(self.pool.map(func, (b"frame %d" % n for n in range(50))))
+        self.assertLessEqual(len(images), self.pool.workers)
+
+    def test_map_error(self):
+        results = self.pool.map(lambda image: imaqGetImageSize(image),
+                                [b"good", b"bad", b"good"])
+        self.assertEqual(next(results), (4, 1))
+        self.assertRaises(ValueError, next, results)
+
+    def test_decode_into(self):
+        images = [imaqCreateImage(IMAQ_IMAGE_U8) for n in range(4)]
+        datas = [b"x"*(n+1) for n in range(4)]
+        self.pool.decode_into(images, datas)
+        self.assertEqual([imaqGetImageSize(image) for image in images],
+                         [(n+1, 1) for n in range(4)])
+        self.assertRaises(ValueError, self.pool.decode_into, images[:2],
+                          [b"good", b"bad"])
+
+@unittest.skipIf(PILImage is None, "PIL not installed")
+class PILTestCase(DecoderTestCase):
+    def setUp(self):
+        DecoderTestCase.setUp(self)
+        selectJPEGDecoder("pil")
+
+    def assertPixels(self, image, size, pixel, bpp=1):
+        self.assertEqual(imaqGetImageSize(image), size)
+        data, cols, rows = imaqImageToArray(image)
+        self.assertEqual(len(data), size[0]*size[1]*bpp)
+        for n in range(0, len(data), bpp):
+            for value, expected in zip(data[n:n+bpp], pixel):
+                self.assertAlmostEqual(value, expected, delta=2)
+
+    def test_rgb(self):
+        # a border, so the rows in pixel memory are longer than the image
+        image = imaqCreateImage(IMAQ_IMAGE_RGB, 3)
+        Priv_ReadJPEGString(image, pil_jpeg("RGB", (10, 120, 230)))
+        # stored as B, G, R, alpha; alpha is 255 only when decoded straight
+        # into the pixel memory
+        self.assertPixels(image, (5, 3), (230, 120, 10, 255), 4)
+
+    def test_rgb_from_gray(self):
+        image = imaqCreateImage(IMAQ_IMAGE_RGB)
+        Priv_ReadJPEGString(image, pil_jpeg("L", 90))
+        self.assertPixels(image, (5, 3), (90, 90, 90, 255), 4)
+
+    def test_rgb_from_cmyk(self):
+        image = imaqCreateImage(IMAQ_IMAGE_RGB)
+        Priv_ReadJPEGString(image, pil_jpeg("CMYK", (0, 0, 0, 0)))
+        self.assertPixels(image, (5, 3), (255, 255, 255, 0), 4)
+
+    def test_u8(self):
+        image = imaqCreateImage(IMAQ_IMAGE_U8, 3)
+        Priv_ReadJPEGString(image, pil_jpeg("L", 90, (7, 4)))
+        self.assertPixels(image, (7, 4), (90,))
+
+    def test_u8_from_cmyk(self):
+        image = imaqCreateImage(IMAQ_IMAGE_U8)
+        Priv_ReadJPEGString(image, pil_jpeg("CMYK", (0, 0, 0, 0)))
+        self.assertPixels(image, (5, 3), (255,))
+
+def suite():
+    suite = unittest.makeSuite(RegistryTestCase)
+    suite.addTest(unittest.makeSuite(DecodePoolTestCase))
+    suite.addTest(unittest.makeSuite(PILTestCase))
+    return suite
+
+if __name__ == "__main__":
+    unittest.TextTestRunner().run(suite())
@@ -0,0 +1,60 @@
+import unittest
+import importlib
+import os
+import subprocess
+import sys
+import nivision
+from nivision import core
+
+topdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class LazyTestCase(unittest.TestCase):
+    def test_bound_after_call(self):
+        img = nivision.imaqCreateImage(nivision.IMAQ_IMAGE_U8)
+        nivision.imaqGetImageSize(img)
+        for module in (nivision, core):
+            self.assertNotIsInstance(module.imaqCreateImage, core._LazyFunc)
+            self.assertNotIsInstance(module.imaqGetImageSize, core._LazyFunc)
+        self.assertIs(nivision.imaqGetImageSize, core.imaqGetImageSize)
+
+    def test_no_placeholders_exported(self):
+        for name in dir(nivision):
+            self.assertNotIsInstance(getattr(nivision, name), core._LazyFunc,
+                                     name)
+
+    def test_star_import(self):
+        namespace = {}
+        exec("from nivision import *", namespace)
+        self.assertIn("imaqGetImageSize", namespace)
+        self.assertNotIsInstance(namespace["imaqGetImageSize"],
+                                 core._LazyFunc)
+
+    def test_submodule_names(self):
+        for name, names in nivision._submodules.items():
+            module = importlib.import_module("nivision." + name)
+            self.assertIs(getattr(nivision, name), module)
+            if name != "camera":
+                self.assertEqual(sorted(names), sorted(module.__all__))
+            for value in names:
+                self.assertIs(getattr(nivision, value),
+                              getattr(module, value))
+
+    def test_submodules_not_imported(self):
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join([topdir,
+                                             env.get("PYTHONPATH", "")])
+        out = subprocess.check_output([sys.executable, "-c",
+                "import sys, nivision\n"
+                "print(sorted(name for name in sys.modules if name in ("
+                "'concurrent.futures', 'multiprocessing', 'socket', "
+                "'nivision.camera', 'nivision.framebus')))\n"
+                "nivision.FrameBus\n"
+                "print('nivision.framebus' in sys.modules)\n"],
+                env=env, universal_newlines=True)
+        self.assertEqual(out.splitlines(), ["[]", "True"])
+
+def suite():
+    return unittest.makeSuite(LazyTestCase)
+
+if __name__ == "__main__":
+    unittest.TextTestRunner().run(suite())
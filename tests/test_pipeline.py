@@ -0,0 +1,50 @@
+import unittest
+from nivision import *
+
+def blobs(n):
+    # 32x8 U8 image with n separate 2x2 blobs
+    data = bytearray(32*8)
+    for i in range(n):
+        for row in (2, 3):
+            data[row*32+i*4+1:row*32+i*4+3] = b"\xc8\xc8"
+    img = imaqCreateImage(IMAQ_IMAGE_U8)
+    imaqArrayToImage(img, data, 32, 8)
+    return img
+
+class PipelineTestCase(unittest.TestCase):
+    def pipeline(self):
+        pipe = Pipeline(sourcetype=IMAQ_IMAGE_U8, workers=2)
+        pipe.step(imaqThreshold, Pipeline.DEST, Pipeline.SOURCE, 100, 255, 1, 1)
+        pipe.step(imaqCountParticles, Pipeline.PREV, 1)
+        return pipe
+
+    def test_map(self):
+        frames = [blobs(n) for n in (0, 3, 1, 5, 2)]
+        with self.pipeline() as pipe:
+            self.assertEqual(list(pipe.map(frames)), [0, 3, 1, 5, 2])
+
+    def test_intermediates_reused(self):
+        with self.pipeline() as pipe:
+            pipe.run(blobs(1))
+            images = [img.value for ctx in pipe._contexts for img in ctx.values()]
+            self.assertEqual(pipe.run(blobs(2)), 2)
+            self.assertEqual(
+                [img.value for ctx in pipe._contexts for img in ctx.values()],
+                images)
+
+    def test_image_result(self):
+        with self.pipeline() as pipe:
+            pipe.step(imaqDuplicate, Pipeline.DEST, Pipeline.PREV)
+            img = pipe.run(blobs(1))
+            self.assertEqual(imaqGetImageSize(img), (32, 8))
+
+    def test_needs_imagetype(self):
+        pipe = Pipeline()
+        pipe.step(imaqThreshold, Pipeline.DEST, Pipeline.SOURCE, 100, 255, 1, 1)
+        self.assertRaises(ValueError, pipe.build)
+
+def suite():
+    return unittest.makeSuite(PipelineTestCase)
+
+if __name__ == "__main__":
+    unittest.TextTestRunner().run(suite())
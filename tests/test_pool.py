@@ -0,0 +1,80 @@
+import unittest
+import gc
+from nivision import *
+
+class PoolTestCase(unittest.TestCase):
+    def test_reuse(self):
+        pool = ImagePool()
+        img = pool.acquire(IMAQ_IMAGE_U8, 64, 48)
+        self.assertEqual(imaqGetImageSize(img), (64, 48))
+        addr = img.value
+        del img
+        gc.collect()
+        self.assertEqual(len(pool), 1)
+        img = pool.acquire(IMAQ_IMAGE_U8, 64, 48)
+        self.assertEqual(img.value, addr)
+        self.assertEqual((pool.hits, pool.misses), (1, 1))
+
+    def test_key(self):
+        pool = ImagePool()
+        pool.release(pool.acquire(IMAQ_IMAGE_U8, 64, 48))
+        img = pool.acquire(IMAQ_IMAGE_RGB, 64, 48)
+        self.assertEqual(imaqGetImageType(img), IMAQ_IMAGE_RGB)
+        self.assertEqual((pool.hits, pool.misses), (0, 2))
+
+    def test_resized(self):
+        pool = ImagePool()
+        img = pool.acquire(IMAQ_IMAGE_U8, 64, 48)
+        imaqSetImageSize(img, 32, 24)
+        pool.release(img)
+        self.assertIsNone(img.value)
+        pool.acquire(IMAQ_IMAGE_U8, 32, 24)
+        self.assertEqual(pool.hits, 1)
+
+    def test_eviction(self):
+        pool = ImagePool(maxsize=2)
+        imgs = [pool.acquire(IMAQ_IMAGE_U8, 8, n+1) for n in range(3)]
+        for img in imgs:
+            pool.release(img)
+        self.assertEqual(len(pool), 2)
+        self.assertEqual(pool.evictions, 1)
+        # least recently used (height 1) was evicted
+        pool.acquire(IMAQ_IMAGE_U8, 8, 1)
+        self.assertEqual(pool.misses, 4)
+
+    def test_int_type(self):
+        pool = ImagePool()
+        pool.release(pool.acquire(IMAQ_IMAGE_RGB.value, 8, 8))
+        img = pool.acquire(IMAQ_IMAGE_RGB, 8, 8)
+        self.assertEqual(imaqGetImageType(img), IMAQ_IMAGE_RGB)
+        self.assertEqual((pool.hits, pool.misses), (1, 1))
+
+    def test_eviction_after_acquire(self):
+        pool = ImagePool(maxsize=3)
+        imgs = [pool.acquire(IMAQ_IMAGE_U8, 8, 1) for n in range(2)]
+        imgs.append(pool.acquire(IMAQ_IMAGE_U8, 8, 2))
+        for img in imgs:
+            pool.release(img)
+        # height 1 is used again, so height 2 is now least recently used
+        img = pool.acquire(IMAQ_IMAGE_U8, 8, 1)
+        for height in (3, 4):
+            pool.release(pool.acquire(IMAQ_IMAGE_U8, 8, height))
+        self.assertEqual(pool.evictions, 1)
+        pool.acquire(IMAQ_IMAGE_U8, 8, 1)
+        self.assertEqual(pool.hits, 2)
+        pool.acquire(IMAQ_IMAGE_U8, 8, 2)
+        self.assertEqual(pool.hits, 2)
+
+    def test_dispose(self):
+        pool = ImagePool()
+        img = pool.acquire(IMAQ_IMAGE_U8, 8, 8)
+        imaqDispose(img)
+        del img
+        gc.collect()
+        self.assertEqual(len(pool), 0)
+
+def suite():
+    return unittest.makeSuite(PoolTestCase)
+
+if __name__ == "__main__":
+    unittest.TextTestRunner().run(suite())
@@ -0,0 +1,52 @@
+import unittest
+import os
+import tempfile
+from nivision import *
+
+class RecordingTestCase(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(".nivrec")
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def image(self, imagetype, value, width, height):
+        image = imaqCreateImage(imagetype, 2)
+        data = bytes([value])*(width*height*imaqGetBytesPerPixel(image))
+        imaqArrayToImage(image, data, width, height)
+        return image
+
+    def record(self):
+        with FrameRecorder(self.path) as recorder:
+            for n in range(4):
+                recorder.write(self.image(IMAQ_IMAGE_U8, n, 32, 24),
+                               timestamp=n*0.01)
+            recorder.write(self.image(IMAQ_IMAGE_RGB, 9, 16, 8),
+                           timestamp=0.04)
+
+    def test_replay(self):
+        self.record()
+        with FrameReplayer(self.path) as replay:
+            self.assertEqual(len(replay), 5)
+            self.assertEqual((replay[4].width, replay[4].height), (16, 8))
+            frames = [(n, imaqImageToArray(image))
+                      for n, image in replay.frames(realtime=True)]
+        self.assertEqual([n for n, data in frames], list(range(5)))
+        self.assertEqual(frames[2][1], (bytes([2])*(32*24), 32, 24))
+        self.assertEqual(frames[4][1][1:], (16, 8))
+
+    def test_unclosed(self):
+        self.record()
+        with open(self.path, "rb+") as f:
+            f.truncate(os.path.getsize(self.path) - 100)
+        with FrameReplayer(self.path) as replay:
+            self.assertEqual(len(replay), 5)
+            image = replay.read(3)
+            self.assertEqual(imaqImageToArray(image)[0], bytes([3])*(32*24))
+
+def suite():
+    return unittest.makeSuite(RecordingTestCase)
+
+if __name__ == "__main__":
+    unittest.TextTestRunner().run(suite())